@@ -0,0 +1,199 @@
+"""
+Non-blocking alert delivery for the detection loops
+- The frame loop hands alarms to AlertDispatcher.dispatch(), which never waits
+- Every sink runs on its own thread with its own bounded queue, so a slow
+  sink (e.g. an unreachable webhook) never delays frames or other sinks
+- Per-sink cooldowns per (stream, kind) and batching of sends
+- Sinks: audio (sounds decoded once at startup), append-only JSON lines
+  log file and an HTTP webhook to a local collector
+
+Usage:
+    alerts = build_dispatcher(sounds, log_path='alerts.log', webhook_url='http://127.0.0.1:8080/alerts')
+    alerts.dispatch(alert_event(result.alarm, 'main', result))
+"""
+
+import json
+import queue
+import threading
+import time
+import urllib.request
+
+def alert_event(kind, stream, result=None):
+    """Alert event dict for an alarm kind ('drowsiness' or 'absence') of a stream"""
+    event = {'kind': kind, 'stream': stream, 'time': time.time()}
+    if result is not None:
+        event['drowsiness_score'] = round(float(result.drowsiness_score), 3)
+        event['absence_seconds'] = round(float(result.absence_counter), 3)
+    return event
+
+class AlertSink:
+    """Base class: subclasses implement send(events) for a batch of events
+
+    Events of the same (stream, kind) within `cooldown` seconds of the last
+    delivered one are suppressed. After the first event of a batch the sink
+    waits up to `batch_window` seconds for more (at most `max_batch`).
+    """
+    name = 'sink'
+
+    def __init__(self, cooldown=0.0, batch_window=0.0, max_batch=32, queue_size=256):
+        self.cooldown = cooldown
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.last_sent = {}
+        self.counts = {'sent': 0, 'suppressed': 0, 'dropped': 0, 'failed': 0}
+
+    def send(self, events):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def offer(self, event):
+        """Queue an event without blocking, dropping the oldest one when full"""
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.counts['dropped'] += 1
+                except queue.Empty:
+                    pass
+
+    def _admit(self, event):
+        key = (event['stream'], event['kind'])
+        if event['time'] - self.last_sent.get(key, float('-inf')) < self.cooldown:
+            self.counts['suppressed'] += 1
+            return False
+        self.last_sent[key] = event['time']
+        return True
+
+    def run(self, stop):
+        """Sink thread: collect admitted events into batches and send them"""
+        while not (stop.is_set() and self.queue.empty()):
+            try:
+                event = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch = [event] if self._admit(event) else []
+            deadline = time.perf_counter() + self.batch_window
+            while batch and len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    event = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if self._admit(event):
+                    batch.append(event)
+            if not batch:
+                continue
+            try:
+                self.send(batch)
+                self.counts['sent'] += len(batch)
+            except Exception as e:
+                self.counts['failed'] += len(batch)
+                print(f"⚠ Warning: {self.name} alert sink failed - {e}")
+
+class AudioSink(AlertSink):
+    """Plays the in-memory alarm sound of the newest alert in a batch"""
+    name = 'audio'
+
+    def __init__(self, sounds, cooldown=0.0, **kwargs):
+        super().__init__(cooldown, **kwargs)
+        self.sounds = sounds  # {'drowsiness': Sound, 'absence': Sound}, loaded once at startup
+
+    def send(self, events):
+        sound = self.sounds.get(events[-1]['kind'])
+        if sound:
+            try:
+                sound.play()
+            except:
+                pass
+
+class LogSink(AlertSink):
+    """Appends every alert as a JSON line to a log file"""
+    name = 'log'
+
+    def __init__(self, path, cooldown=0.0, batch_window=1.0, **kwargs):
+        super().__init__(cooldown, batch_window, **kwargs)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def send(self, events):
+        self.file.write(''.join(json.dumps(event) + '\n' for event in events))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class WebhookSink(AlertSink):
+    """POSTs batches of alerts as a JSON array to an HTTP collector"""
+    name = 'webhook'
+
+    def __init__(self, url, cooldown=30.0, batch_window=2.0, timeout=5.0, **kwargs):
+        super().__init__(cooldown, batch_window, **kwargs)
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, events):
+        request = urllib.request.Request(self.url, data=json.dumps(events).encode(), method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+class AlertDispatcher:
+    """Fans alert events out to sinks, each delivered on its own thread"""
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+        self.stop = threading.Event()
+        self.threads = [threading.Thread(target=sink.run, args=(self.stop,), daemon=True) for sink in self.sinks]
+        for thread in self.threads:
+            thread.start()
+
+    def dispatch(self, event):
+        """Hand an event to every sink; never blocks the caller"""
+        for sink in self.sinks:
+            sink.offer(event)
+
+    def close(self, timeout=2.0):
+        """Deliver what is queued (bounded by timeout), then stop the sinks; returns the ones still sending"""
+        self.stop.set()
+        deadline = time.perf_counter() + timeout
+        for thread in self.threads:
+            thread.join(max(0.0, deadline - time.perf_counter()))
+        # Closing a sink under its running thread could break the send in progress
+        running = []
+        for sink, thread in zip(self.sinks, self.threads):
+            if thread.is_alive():
+                running.append(sink.name)
+            else:
+                sink.close()
+        if running:
+            print(f"⚠ Warning: Alert sinks still delivering after {timeout:.0f}s, left open: {', '.join(running)}")
+        return running
+
+    def report(self):
+        """Human readable per-sink delivery line"""
+        if not self.sinks:
+            return "Alerts - no sinks configured"
+        parts = [f"{sink.name}: " + ", ".join(f"{count} {name}" for name, count in sink.counts.items())
+                 for sink in self.sinks]
+        return "Alerts - " + "; ".join(parts)
+
+def build_dispatcher(sounds=None, log_path=None, webhook_url=None, audio_cooldown=0.0, webhook_cooldown=30.0):
+    """AlertDispatcher with an audio sink (if any sound loaded), a log and a webhook sink when configured"""
+    sinks = []
+    if sounds and any(sounds.values()):
+        sinks.append(AudioSink(sounds, audio_cooldown))
+    if log_path:
+        try:
+            sinks.append(LogSink(log_path))
+        except OSError as e:
+            print(f"⚠ Warning: Could not open alert log {log_path} - {e}")
+    if webhook_url:
+        sinks.append(WebhookSink(webhook_url, webhook_cooldown))
+    return AlertDispatcher(sinks)
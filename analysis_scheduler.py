@@ -0,0 +1,84 @@
+"""
+State-aware scheduling of the full face/eye/CNN analysis
+- Calm streams (eyes open, low scores) are analyzed every Nth frame
+- Rising scores, closed or missing eyes switch back to every frame at once
+- An optional CPU budget stretches the calm interval further when the
+  measured analysis cost would exceed it, but never delays urgent frames
+  and never leaves more than MAX_FRAME_GAP between analyzed frames
+"""
+
+import math
+from detection_pipeline import MAX_FRAME_GAP
+
+WATCH_LEVEL = 0.3    # Score/threshold ratio from which the interval is halved
+URGENT_LEVEL = 0.6   # Score/threshold ratio from which every frame is analyzed
+CALM_STATUSES = ("Eyes Open (AI)", "Eyes Detected")
+
+class AnalysisScheduler:
+    """Decides which frames of one stream get a full analysis
+
+    `idle_interval` is the analysis interval (in frames) while the student
+    looks awake. `cpu_budget` is the fraction of one CPU core the stream
+    may use for analysis, e.g. 0.25; None disables the budget.
+    """
+
+    def __init__(self, idle_interval=4, cpu_budget=None, watch_level=WATCH_LEVEL, urgent_level=URGENT_LEVEL):
+        self.idle_interval = max(1, int(idle_interval))
+        self.cpu_budget = cpu_budget
+        self.watch_level = watch_level
+        self.urgent_level = urgent_level
+        self.cost = None         # Moving average of one analysis, seconds
+        self.period = None       # Moving average of the time between frames, seconds
+        self.last_timestamp = None
+        self.frames_since = self.idle_interval
+        self.analyzed = 0
+        self.skipped = 0
+
+    def interval(self, state, last_result):
+        """Frames between analyses for the current stream state"""
+        if last_result is None or last_result.alarm is not None or last_result.eye_status not in CALM_STATUSES:
+            return 1
+        level = max(state['drowsiness_score'] / state['drowsiness_threshold'],
+                    state['absence_counter'] / state['absence_threshold'])
+        if level >= self.urgent_level:
+            return 1
+
+        interval = self.idle_interval if level < self.watch_level else max(1, self.idle_interval // 2)
+        if self.cpu_budget and self.cost and self.period:
+            interval = max(interval, math.ceil(self.cost / (self.cpu_budget * self.period)))
+            # Longer gaps would be clipped by MAX_FRAME_GAP and undercount closed-eye time
+            interval = max(1, min(interval, int(MAX_FRAME_GAP / self.period)))
+        return interval
+
+    def should_analyze(self, timestamp, state, last_result):
+        """Call once per frame; True if this frame needs a full analysis"""
+        if self.last_timestamp is not None and timestamp > self.last_timestamp:
+            delta = timestamp - self.last_timestamp
+            self.period = delta if self.period is None else 0.9 * self.period + 0.1 * delta
+        self.last_timestamp = timestamp
+
+        self.frames_since += 1
+        if self.frames_since >= self.interval(state, last_result):
+            self.frames_since = 0
+            self.analyzed += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def record(self, seconds):
+        """Feed back the cost of one full analysis"""
+        self.cost = seconds if self.cost is None else 0.8 * self.cost + 0.2 * seconds
+
+    def report(self):
+        """Human readable analyzed/skipped line"""
+        total = self.analyzed + self.skipped
+        share = self.analyzed / total if total else 1.0
+        budget = f", CPU budget {self.cpu_budget:.0%}" if self.cpu_budget else ""
+        return (f"Scheduler (idle every {self.idle_interval}{budget}) - analyzed {self.analyzed} of {total} "
+                f"frames ({share:.0%})")
+
+def make_scheduler(idle_interval=1, cpu_budget=None):
+    """AnalysisScheduler for the CLI flags, or None when every frame should be analyzed"""
+    if idle_interval <= 1 and not cpu_budget:
+        return None
+    return AnalysisScheduler(idle_interval, cpu_budget)
@@ -0,0 +1,212 @@
+"""
+Per-stage micro-benchmarks of the detection pipeline
+- Runs offline on synthetic frames with eye images from data/valid pasted in
+- Times every stage on its own: cvtColor, face cascade, eye cascades,
+  eye preprocessing, CNN prediction, score update and overlay drawing
+- Reports median/p99 latency and Python-visible allocations per call
+- Saves the results as JSON so runs can be compared across commits
+
+Usage:
+    python benchmark_pipeline.py --backend numpy
+    python benchmark_pipeline.py --compare bench_results/<earlier run>.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from detection_pipeline import (
+    load_cascades, load_eye_predictor, new_stream_state, detect_faces, detect_eyes,
+    update_stream_state, BACKENDS,
+)
+from eye_inference import CLASS_NAMES, preprocess_eye, predict_first_eyes, EyeBatchBuffer
+
+FACE_BOX = (220, 120, 200, 240)  # Synthetic face region in a 640x480 frame
+EYE_PASTE_SIZE = 44              # Eye images are pasted into the face at this size
+
+def load_eye_crops(data_dir, count=2):
+    """Load the first images of every class from an eye dataset as grayscale crops"""
+    crops = []
+    for class_name in CLASS_NAMES:
+        class_dir = os.path.join(data_dir, class_name)
+        for name in sorted(os.listdir(class_dir))[:count]:
+            image = cv2.imread(os.path.join(class_dir, name), cv2.IMREAD_GRAYSCALE)
+            if image is not None:
+                crops.append(image)
+    if not crops:
+        raise FileNotFoundError(f"No eye images found in {data_dir}")
+    return crops
+
+def synthetic_frame(eye_crops, width=640, height=480, seed=0):
+    """Build a noisy BGR frame with two eye images pasted into a face-sized region
+
+    Returns (frame, face_boxes, right_eye_boxes, left_eye_boxes).
+    """
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(60, 180, width, dtype=np.float32)[None, :]
+    gray = np.clip(gradient + rng.normal(0, 20, (height, width)), 0, 255).astype(np.uint8)
+
+    fx, fy, fw, fh = FACE_BOX
+    cv2.ellipse(gray, (fx + fw // 2, fy + fh // 2), (fw // 2, fh // 2), 0, 0, 360, 170, -1)
+    eye_y = fy + fh // 4
+    right_eye = (fx + fw // 4 - EYE_PASTE_SIZE // 2, eye_y, EYE_PASTE_SIZE, EYE_PASTE_SIZE)
+    left_eye = (fx + 3 * fw // 4 - EYE_PASTE_SIZE // 2, eye_y, EYE_PASTE_SIZE, EYE_PASTE_SIZE)
+    for (x, y, w, h), crop in zip((right_eye, left_eye), eye_crops):
+        gray[y:y+h, x:x+w] = cv2.resize(crop, (w, h))
+
+    frame = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    faces = np.array([FACE_BOX], dtype=np.int32)
+    return frame, faces, np.array([right_eye], dtype=np.int32), np.array([left_eye], dtype=np.int32)
+
+def measure(stage, repeats, warmup=3):
+    """Time a zero-argument callable, then measure its allocations in a separate pass"""
+    for _ in range(warmup):
+        stage()
+    times = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        stage()
+        times[i] = time.perf_counter() - start
+
+    # tracemalloc slows everything down, so it never overlaps the timed loop
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        stage()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'repeats': repeats,
+        'median_ms': 1000 * float(np.median(times)),
+        'p99_ms': 1000 * float(np.percentile(times, 99)),
+        'mean_ms': 1000 * float(times.mean()),
+        'peak_alloc_kb': (peak - before) / 1024,
+        'retained_kb': (after - before) / 1024,
+    }
+
+def build_stages(frame, faces, right_eye, left_eye, cascades, predict_batch):
+    """Return an ordered {stage name: zero-argument callable} for one frame"""
+    from enhanced_sleep_detection_with_absence import render, UIPanel
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    state = new_stream_state()
+    state['paused'] = False
+    boxes = [right_eye[0], left_eye[0]]
+    preds = np.array([[0.2, 0.8]], dtype=np.float32)
+    result = update_stream_state(new_stream_state(), faces, left_eye, right_eye, preds, preds, True, 0.0)
+    canvas = frame.copy()
+
+    stages = {
+        'cvtColor': lambda: cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY),
+        'face_cascade': lambda: detect_faces(gray, cascades['face'], params=cascades['params']['face']),
+        'eye_cascades': lambda: detect_eyes(gray, faces, cascades['leye'], cascades['reye'],
+                                            params=cascades['params']['eyes']),
+        'preprocess': lambda: np.stack([preprocess_eye(frame, box) for box in boxes]),
+    }
+    eye_buffer = EyeBatchBuffer()
+    stages['preprocess_buffer'] = lambda: eye_buffer.fill(gray, boxes)
+    if predict_batch is not None:
+        batch = np.stack([preprocess_eye(frame, box) for box in boxes])
+        stages['predict'] = lambda: predict_batch(batch)
+        stages['preprocess+predict'] = lambda: predict_first_eyes(predict_batch, gray, right_eye, left_eye, None,
+                                                                  eye_buffer)
+    stages['score_update'] = lambda: update_stream_state(state, faces, left_eye, right_eye, preds, preds, True, 0.0)
+    panel = UIPanel()
+    stages['overlay'] = lambda: render(canvas, result, state, cv2.FONT_HERSHEY_TRIPLEX, cv2.FONT_HERSHEY_SIMPLEX, panel)
+
+    def overlay_changing():
+        # Worst case for the cached panel: a text field changes on every frame
+        state['absence_counter'] = (state['absence_counter'] + 1) % 100
+        render(canvas, result, state, cv2.FONT_HERSHEY_TRIPLEX, cv2.FONT_HERSHEY_SIMPLEX, panel)
+
+    stages['overlay_changing'] = overlay_changing
+    return stages
+
+def git_commit():
+    """Short hash of the checked out commit, or None outside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def print_table(results, baseline=None):
+    """Print the per-stage results, with median deltas against a baseline run"""
+    header = f"{'stage':<20} {'median':>10} {'p99':>10} {'peak alloc':>12} {'retained':>10}"
+    if baseline:
+        header += f" {'vs base':>9}"
+    print(f"\n📊 {header}")
+    for name, stats in results.items():
+        line = (f"{name:<20} {stats['median_ms']:8.3f}ms {stats['p99_ms']:8.3f}ms "
+                f"{stats['peak_alloc_kb']:9.1f}KiB {stats['retained_kb']:7.1f}KiB")
+        if baseline:
+            base = baseline.get(name)
+            line += f" {stats['median_ms'] / base['median_ms']:8.2f}x" if base else f" {'new':>9}"
+        print(f"   {line}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every detection pipeline stage on its own")
+    parser.add_argument('--data', default='data/valid', help="Eye image dataset pasted into the synthetic frames")
+    parser.add_argument('--repeats', type=int, default=30, help="Timed calls per stage")
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--backend', choices=BACKENDS, default='auto', help="CNN runtime to benchmark")
+    parser.add_argument('--no-ml', action='store_true', help="Skip the CNN stages")
+    parser.add_argument('--output', default='bench_results', help="Directory for the JSON results")
+    parser.add_argument('--compare', metavar='JSON', help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    cascades = load_cascades()
+    print("✓ Haar cascade classifiers loaded successfully")
+
+    predict_batch, model_path = None, None
+    if not args.no_ml:
+        predict_batch, model_path = load_eye_predictor(backend=args.backend)
+        if predict_batch is None:
+            print("⚠ No models could be loaded, skipping the CNN stages")
+        else:
+            print(f"✓ Model loaded successfully: {model_path}")
+
+    frame, faces, right_eye, left_eye = synthetic_frame(load_eye_crops(args.data), args.width, args.height)
+    stages = build_stages(frame, faces, right_eye, left_eye, cascades, predict_batch)
+
+    results = {}
+    for name, stage in stages.items():
+        results[name] = measure(stage, args.repeats)
+        print(f"⏱ {name}: {results[name]['median_ms']:.3f} ms")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['stages']
+    print_table(results, baseline)
+
+    commit = git_commit()
+    run = {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'frame_size': [args.width, args.height],
+        'model': model_path,
+        'stages': results,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{time.strftime('%Y%m%d-%H%M%S')}_{commit or 'nogit'}.json")
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"\n✓ Results saved to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+"""
+Per-Student Monitoring of a Whole Classroom from One Camera
+- Tracks every face in the frame as its own student (IoU matching between
+  frames, stable student ids)
+- Assigns each detected eye to the face box that contains it
+- Classifies the eye crops of all students in one batched CNN call
+- Keeps drowsiness scores, absence counters and alarm cooldowns in NumPy
+  arrays and updates all students in one vectorized step per frame
+- Same time-normalized scoring as detection_pipeline.update_stream_state
+- A new face only counts as a student after `confirm_after` seconds in
+  view, so a spurious detection never raises absence alarms
+- One absence alarm per absence; it re-arms once the student's absence
+  counter has recovered below the threshold
+- Students who stay out of view for `forget_after` seconds are dropped
+
+Usage:
+    python classroom_monitor.py 0
+    python classroom_monitor.py lecture_hall.mp4 --alert-log alerts.log
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+from detection_pipeline import (
+    load_cascades, load_eye_predictor, detect_faces_and_eyes, AdaptiveDetectionScale,
+    DROWSINESS_THRESHOLD, ABSENCE_THRESHOLD, SENSITIVITY, ABSENT_DECAY, ABSENCE_RECOVERY,
+    MAX_FRAME_GAP, ALARM_COOLDOWN, BACKENDS, DEFAULT_CAMERA_SETUP,
+)
+from eye_inference import EyeBatchBuffer
+from face_tracker import FaceTracker, TRACKERS
+from alerts import build_dispatcher, alert_event
+
+MIN_IOU = 0.3              # Overlap a face needs with a student's last box to stay that student
+CONFIRM_AFTER = 1.0        # Seconds a new face has to stay in view before it counts as a student
+FORGET_AFTER = 30.0        # Seconds out of view before a student's slot is freed
+INITIAL_STUDENTS = 32      # Slots allocated up front, doubled when a bigger class shows up
+
+def iou_matrix(a, b):
+    """Intersection over union of every (x, y, w, h) box in a against every box in b"""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(1, -1, 4)
+    iw = np.clip(np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    ih = np.clip(np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = iw * ih
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - inter
+    return inter / np.maximum(union, 1e-9)
+
+def match_boxes(previous, boxes, min_iou=MIN_IOU):
+    """Greedy best-overlap matching, returns (previous indices, box indices) of the matched pairs"""
+    if len(previous) == 0 or len(boxes) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    iou = iou_matrix(previous, boxes)
+    rows, cols = np.nonzero(iou >= min_iou)
+    order = np.argsort(-iou[rows, cols], kind='stable')
+    used_rows, used_cols = set(), set()
+    matched_rows, matched_cols = [], []
+    for r, c in zip(rows[order], cols[order]):
+        if r not in used_rows and c not in used_cols:
+            used_rows.add(r)
+            used_cols.add(c)
+            matched_rows.append(r)
+            matched_cols.append(c)
+    return np.array(matched_rows, dtype=np.intp), np.array(matched_cols, dtype=np.intp)
+
+def assign_eyes(faces, eyes):
+    """Index of the face box containing each eye's center (-1 if none); the smallest such face wins"""
+    if len(eyes) == 0 or len(faces) == 0:
+        return np.full(len(eyes), -1, dtype=np.intp)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 4)
+    eyes = np.asarray(eyes, dtype=np.int64).reshape(-1, 4)
+    cx = (eyes[:, 0] + eyes[:, 2] // 2)[:, None]
+    cy = (eyes[:, 1] + eyes[:, 3] // 2)[:, None]
+    inside = ((cx >= faces[:, 0]) & (cx < faces[:, 0] + faces[:, 2])
+              & (cy >= faces[:, 1]) & (cy < faces[:, 1] + faces[:, 3]))
+    area = np.where(inside, faces[:, 2] * faces[:, 3], np.iinfo(np.int64).max)
+    return np.where(inside.any(axis=1), area.argmin(axis=1), -1)
+
+def pick_eye_per_face(face_count, eyes, owner):
+    """Index of the largest eye assigned to every face (-1 where a face has none)"""
+    chosen = np.full(face_count, -1, dtype=np.intp)
+    valid = np.flatnonzero(owner >= 0)
+    if len(valid):
+        eyes = np.asarray(eyes).reshape(-1, 4)
+        by_size = valid[np.argsort(-(eyes[valid, 2] * eyes[valid, 3]), kind='stable')]
+        faces, first = np.unique(owner[by_size], return_index=True)
+        chosen[faces] = by_size[first]
+    return chosen
+
+class StudentAlarm:
+    """An alarm of one student with the scores that raised it (what alert_event reports)"""
+    __slots__ = ('student', 'kind', 'drowsiness_score', 'absence_counter')
+
+    def __init__(self, student, kind, drowsiness_score, absence_counter):
+        self.student = student
+        self.kind = kind
+        self.drowsiness_score = drowsiness_score
+        self.absence_counter = absence_counter
+
+class ClassroomResult:
+    """Outcome of one frame for every tracked student (arrays ordered like `ids`)"""
+    __slots__ = ('faces', 'ids', 'boxes', 'present', 'eyes', 'right_closed_prob', 'left_closed_prob',
+                 'drowsiness_scores', 'absence_counters', 'alarms')
+
+    def __init__(self, faces, ids, boxes, present, eyes, closed_prob, drowsiness_scores, absence_counters, alarms):
+        self.faces = faces
+        self.ids = ids
+        self.boxes = boxes
+        self.present = present
+        self.eyes = eyes
+        self.right_closed_prob = closed_prob[:, 0]
+        self.left_closed_prob = closed_prob[:, 1]
+        self.drowsiness_scores = drowsiness_scores
+        self.absence_counters = absence_counters
+        self.alarms = alarms  # [StudentAlarm, ...]
+
+class ClassroomDetector:
+    """Detection, batched eye classification and vectorized scoring for every face of one camera
+
+    Student state lives in fixed-size arrays indexed by slot; `active`
+    marks the slots in use. Scores follow update_stream_state per student:
+    closed eyes raise the drowsiness score by `sensitivity` per second,
+    open eyes lower it, and a student whose face or eyes are not found
+    accumulates absence seconds.
+    """
+
+    def __init__(self, cascades=None, predict_batch=None, face_tracker=None,
+                 drowsiness_threshold=DROWSINESS_THRESHOLD, absence_threshold=ABSENCE_THRESHOLD,
+                 sensitivity=SENSITIVITY, alarm_cooldown=ALARM_COOLDOWN, adaptive_scale=True,
+                 min_iou=MIN_IOU, confirm_after=CONFIRM_AFTER, forget_after=FORGET_AFTER,
+                 capacity=INITIAL_STUDENTS):
+        self.cascades = cascades if cascades is not None else load_cascades()
+        self.predict_batch = predict_batch
+        self.face_tracker = face_tracker
+        self.face_scaler = AdaptiveDetectionScale() if adaptive_scale else None
+        if face_tracker is not None:
+            face_tracker.scaler = self.face_scaler
+        self.drowsiness_threshold = drowsiness_threshold
+        self.absence_threshold = absence_threshold
+        self.sensitivity = sensitivity
+        self.alarm_cooldown = alarm_cooldown
+        self.min_iou = min_iou
+        self.confirm_after = confirm_after
+        self.forget_after = forget_after
+        self.eye_buffer = EyeBatchBuffer(capacity)
+        self.last_timestamp = None
+        self.next_id = 1
+        self._allocate(max(1, int(capacity)))
+        # [frames, cascade seconds, CNN seconds, scoring seconds, CNN calls]
+        self.costs = [0, 0.0, 0.0, 0.0, 0]
+        self.cnn_errors = 0
+
+    def _allocate(self, capacity):
+        """(Re)size the per-student arrays, keeping the existing students"""
+        old = getattr(self, 'active', None)
+        n = 0 if old is None else len(old)
+
+        def grow(name, shape, dtype, fill):
+            array = np.full((capacity,) + shape, fill, dtype=dtype)
+            if n:
+                array[:n] = getattr(self, name)
+            setattr(self, name, array)
+
+        grow('active', (), bool, False)
+        grow('ids', (), np.int64, 0)
+        grow('boxes', (4,), np.int32, 0)
+        grow('drowsiness', (), np.float64, 0.0)
+        grow('absence', (), np.float64, 0.0)
+        grow('last_seen', (), np.float64, 0.0)
+        grow('seen_time', (), np.float64, 0.0)
+        grow('last_alarm', (), np.float64, -np.inf)
+        grow('absence_alarmed', (), bool, False)  # The current absence already raised its alarm
+        grow('closed_prob', (2,), np.float32, np.nan)  # [right, left], NaN when not classified
+
+    def _add_student(self, box, timestamp):
+        free = np.flatnonzero(~self.active)
+        if not len(free):
+            free = [len(self.active)]
+            self._allocate(2 * len(self.active))
+        slot = free[0]
+        self.active[slot] = True
+        self.ids[slot] = self.next_id
+        self.next_id += 1
+        self.boxes[slot] = box
+        self.drowsiness[slot] = 0.0
+        self.absence[slot] = 0.0
+        self.last_seen[slot] = timestamp
+        self.seen_time[slot] = 0.0
+        self.last_alarm[slot] = -np.inf
+        self.absence_alarmed[slot] = False
+        return slot
+
+    def reset(self):
+        """Forget every student and the tracked faces"""
+        self.active[:] = False
+        self.last_timestamp = None
+        if self.face_tracker is not None:
+            self.face_tracker.reset()
+
+    def classify_eyes(self, gray, faces, left_eye, right_eye):
+        """(faces, 2) closed probabilities [right, left] from one CNN call, plus eye counts per face"""
+        n = len(faces)
+        right = pick_eye_per_face(n, right_eye, assign_eyes(faces, right_eye))
+        left = pick_eye_per_face(n, left_eye, assign_eyes(faces, left_eye))
+        has_right, has_left = right >= 0, left >= 0
+        eye_counts = has_right.astype(np.int32) + has_left
+        probs = np.full((n, 2), np.nan, dtype=np.float32)
+
+        predict_batch = self.predict_batch
+        boxes = [*np.asarray(right_eye).reshape(-1, 4)[right[has_right]],
+                 *np.asarray(left_eye).reshape(-1, 4)[left[has_left]]]
+        if predict_batch is not None and boxes:
+            if len(boxes) > len(self.eye_buffer.planes):
+                self.eye_buffer = EyeBatchBuffer(2 * len(boxes))
+            try:
+                preds = np.asarray(predict_batch(self.eye_buffer.fill(gray, boxes))).reshape(len(boxes), -1)
+                # Column 0 is 'closed' for the softmax models and the closed probability for a sigmoid
+                split = int(has_right.sum())
+                probs[has_right, 0] = preds[:split, 0]
+                probs[has_left, 1] = preds[split:, 0]
+                self.costs[4] += 1
+            except Exception as e:
+                # Those eyes stay unclassified; logged once so a broken model doesn't flood the console
+                self.cnn_errors += 1
+                if self.cnn_errors == 1:
+                    print(f"⚠ Warning: Eye CNN call failed - {e}")
+        return probs, eye_counts
+
+    def process(self, frame, timestamp=None):
+        """Run detection, one batched CNN call and the vectorized scoring on one BGR frame"""
+        if timestamp is None:
+            timestamp = time.time()
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        faces, left_eye, right_eye = detect_faces_and_eyes(gray, self.cascades, False, self.face_tracker,
+                                                           self.face_scaler)
+        faces = np.asarray(faces, dtype=np.int32).reshape(-1, 4)
+        cascades_done = time.perf_counter()
+
+        probs, eye_counts = self.classify_eyes(gray, faces, left_eye, right_eye)
+        cnn_done = time.perf_counter()
+
+        # Faces keep the student whose last box they overlap most, the rest are new students
+        slots = np.full(len(faces), -1, dtype=np.intp)
+        known = np.flatnonzero(self.active)
+        previous, matched = match_boxes(self.boxes[known], faces, self.min_iou)
+        slots[matched] = known[previous]
+        for i in np.flatnonzero(slots < 0):
+            slots[i] = self._add_student(faces[i], timestamp)
+        self.boxes[slots] = faces
+        self.last_seen[slots] = timestamp
+
+        alarms = self._update(slots, eye_counts, probs, timestamp)
+        result = self._result(len(faces), slots, eye_counts, alarms)
+
+        end = time.perf_counter()
+        self.costs[0] += 1
+        self.costs[1] += cascades_done - start
+        self.costs[2] += cnn_done - cascades_done
+        self.costs[3] += end - cnn_done
+        return result
+
+    def _update(self, slots, eye_counts, probs, timestamp):
+        """Score every active student at once, returns the alarms raised on this frame"""
+        dt = 0.0 if self.last_timestamp is None else min(max(timestamp - self.last_timestamp, 0.0), MAX_FRAME_GAP)
+        self.last_timestamp = timestamp
+
+        capacity = len(self.active)
+        eyes_seen = np.zeros(capacity, dtype=bool)
+        eyes_seen[slots] = eye_counts > 0
+        drowsy = np.zeros(capacity, dtype=bool)
+        if self.predict_batch is not None:
+            # Either eye closed counts, like the single-student detector
+            drowsy[slots] = np.fmax(probs[:, 0], probs[:, 1]) > 0.5
+        else:
+            drowsy[slots] = eye_counts < 2 * 0.7
+        self.closed_prob[:] = np.nan
+        self.closed_prob[slots] = probs
+
+        present = np.zeros(capacity, dtype=bool)
+        present[slots] = True
+        self.seen_time[present] += dt
+        confirmed = self.seen_time >= self.confirm_after
+
+        rate = self.sensitivity * dt
+        self.absence = np.where(eyes_seen, np.maximum(0.0, self.absence - ABSENCE_RECOVERY * dt), self.absence + dt)
+        self.drowsiness = np.where(eyes_seen,
+                                   np.where(drowsy, self.drowsiness + rate, np.maximum(0.0, self.drowsiness - rate)),
+                                   np.maximum(0.0, self.drowsiness - ABSENT_DECAY * dt))
+
+        # Same precedence and per-student cooldown as update_stream_state, but a student who
+        # left only raises one absence alarm instead of one per cooldown until forgotten
+        self.absence_alarmed &= self.absence >= self.absence_threshold
+        ready = self.active & confirmed & (timestamp - self.last_alarm > self.alarm_cooldown)
+        drowsiness_alarm = ready & (self.drowsiness >= self.drowsiness_threshold)
+        absence_alarm = (ready & ~drowsiness_alarm & ~self.absence_alarmed
+                         & (self.absence >= self.absence_threshold))
+        self.last_alarm[drowsiness_alarm | absence_alarm] = timestamp
+        self.absence_alarmed |= absence_alarm
+        alarms = [StudentAlarm(int(self.ids[i]), kind, float(self.drowsiness[i]), float(self.absence[i]))
+                  for kind, raised in (('drowsiness', drowsiness_alarm), ('absence', absence_alarm))
+                  for i in np.flatnonzero(raised)]
+
+        # Unconfirmed faces are dropped as soon as they vanish
+        self.active &= (timestamp - self.last_seen <= self.forget_after) & (confirmed | present)
+        return alarms
+
+    def _result(self, face_count, slots, eye_counts, alarms):
+        active = np.flatnonzero(self.active & (self.seen_time >= self.confirm_after))
+        order = active[np.argsort(self.ids[active])]
+        present = np.zeros(len(self.active), dtype=bool)
+        present[slots] = True
+        eyes = np.zeros(len(self.active), dtype=np.int32)
+        eyes[slots] = eye_counts
+        return ClassroomResult(face_count, self.ids[order], self.boxes[order], present[order], eyes[order],
+                               self.closed_prob[order], self.drowsiness[order], self.absence[order], alarms)
+
+    def report(self):
+        """Human readable per-stage cost line"""
+        frames, cascades, cnn, scoring, calls = self.costs
+        if not frames:
+            return "Classroom detector - no frames processed"
+        per_frame = 1000 / frames
+        students = int((self.active & (self.seen_time >= self.confirm_after)).sum())
+        failed = f", {self.cnn_errors} failed" if self.cnn_errors else ""
+        return (f"Classroom detector - {students} students tracked, "
+                f"{per_frame * (cascades + cnn + scoring):.1f} ms/frame (cascades {per_frame * cascades:.1f}, "
+                f"CNN {per_frame * cnn:.1f} in {calls} batched calls{failed}, scoring {per_frame * scoring:.2f})")
+
+def print_students(result, fps):
+    """Print one line per tracked student"""
+    print(f"\n📊 {result.faces} face(s) in view, {fps:.1f} FPS")
+    print(f"   {'student':<8} {'seen':>5} {'eyes':>5} {'score':>6} {'absence':>8}")
+    for i, student in enumerate(result.ids):
+        print(f"   {student:<8} {'yes' if result.present[i] else 'no':>5} {result.eyes[i]:5d} "
+              f"{result.drowsiness_scores[i]:6.1f} {result.absence_counters[i]:7.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor every student in view of one camera")
+    parser.add_argument('source', help="Webcam index, video file or stream URL")
+    parser.add_argument('--no-ml', action='store_true', help="Skip the CNN and use eye-count detection")
+    parser.add_argument('--backend', choices=BACKENDS, default='auto',
+                        help="CNN runtime: keras, numpy (.npz export), int8 (quantized) or auto")
+    parser.add_argument('--face-tracker', choices=TRACKERS, default='none',
+                        help="Follow faces between full detections ('none' = detect every frame)")
+    parser.add_argument('--face-detect-interval', type=int, default=5, help="Frames between full face detections")
+    parser.add_argument('--full-res-faces', action='store_true',
+                        help="Detect faces at full resolution instead of an adaptive downscale")
+    parser.add_argument('--drowsiness-threshold', type=float, default=DROWSINESS_THRESHOLD,
+                        help="Seconds of closed eyes (at sensitivity 1) before a student's drowsiness alarm")
+    parser.add_argument('--absence-threshold', type=float, default=ABSENCE_THRESHOLD,
+                        help="Seconds without a student's eyes before the absence alarm")
+    parser.add_argument('--forget-after', type=float, default=FORGET_AFTER,
+                        help="Seconds out of view before a student is dropped")
+    parser.add_argument('--report-interval', type=float, default=5.0, help="Seconds between student reports")
+    parser.add_argument('--alert-log', metavar='PATH', help="Append alarms as JSON lines to this file")
+    parser.add_argument('--camera-setup', default=DEFAULT_CAMERA_SETUP,
+                        help="Cascade settings tuned for this camera setup in cascade_config.json (tune_cascades.py)")
+    args = parser.parse_args()
+
+    try:
+        cascades = load_cascades(args.camera_setup)
+        print("✓ Haar cascade classifiers loaded successfully")
+    except Exception as e:
+        print(f"❌ Error loading Haar cascades: {e}")
+        return
+
+    predict_batch = None
+    if not args.no_ml:
+        predict_batch, model_path = load_eye_predictor(backend=args.backend)
+        if predict_batch is None:
+            print("❌ No models could be loaded. Using simple eye detection without ML.")
+        else:
+            print(f"✓ Model loaded successfully: {model_path}")
+
+    drowsy_sound = absence_sound = None
+    try:
+        from enhanced_sleep_detection_with_absence import load_alarm_sounds
+        drowsy_sound, absence_sound = load_alarm_sounds()
+    except Exception as e:
+        print(f"⚠ Warning: Could not load alarm sounds - {e}")
+    alerts = build_dispatcher({'drowsiness': drowsy_sound, 'absence': absence_sound}, args.alert_log)
+
+    cap = cv2.VideoCapture(int(args.source) if args.source.isdigit() else args.source)
+    if not cap.isOpened():
+        print(f"❌ Could not open capture source {args.source}")
+        return
+
+    # A face lost by the tracker is dropped until the next detection instead of re-detecting all of them
+    face_tracker = FaceTracker(args.face_detect_interval, args.face_tracker, drop_lost=True)
+    detector = ClassroomDetector(cascades, predict_batch, face_tracker,
+                                 args.drowsiness_threshold, args.absence_threshold,
+                                 adaptive_scale=not args.full_res_faces, forget_after=args.forget_after)
+    # Files are scored on their own timeline, live sources on the wall clock
+    is_file = not args.source.isdigit() and '://' not in args.source
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    print(f"\n🚀 Monitoring the classroom from {args.source}")
+    print("🔴 Press Ctrl+C to quit")
+    print("-" * 50)
+
+    frames = 0
+    result = None
+    start = last_report = time.perf_counter()
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            result = detector.process(frame, frames / fps if is_file else None)
+            frames += 1
+
+            for alarm in result.alarms:
+                if alarm.kind == 'drowsiness':
+                    print(f"🚨 Student {alarm.student}: DROWSINESS DETECTED!")
+                else:
+                    print(f"🔵 Student {alarm.student}: EYES NOT DETECTED!")
+                alerts.dispatch(alert_event(alarm.kind, f"student{alarm.student}", alarm))
+
+            now = time.perf_counter()
+            if now - last_report >= args.report_interval:
+                print_students(result, frames / (now - start))
+                last_report = now
+
+    except KeyboardInterrupt:
+        print("\n⏹ Monitoring stopped by user")
+    finally:
+        cap.release()
+        alerts.close()
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        if result is not None:
+            print_students(result, frames / elapsed)
+        print(f"🔔 {alerts.report()}")
+        print(f"⏱ {detector.report()}")
+        print(f"⏱ {detector.face_tracker.report()}")
+        if detector.face_scaler is not None:
+            print(f"⏱ {detector.face_scaler.report()}")
+        print("🏁 Classroom monitoring stopped")
+
+if __name__ == "__main__":
+    main()
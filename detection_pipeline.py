@@ -0,0 +1,465 @@
+"""
+Headless detection pipeline shared by the offline and multi-stream tools
+- Loads the Haar cascades and eye CNN without opening a webcam or audio mixer
+- Applies the drowsiness/absence scoring of enhanced_sleep_detection_with_absence.py,
+  driven by frame timestamps so the frame rate never changes when alarms fire
+- Never draws on the frame, so it runs at pure detection speed
+- SleepDetector.process(frame) -> FrameResult is the entry point for UIs and batch jobs
+- An optional AnalysisScheduler (analysis_scheduler.py) skips frames of calm streams
+- An optional PredictionCache (prediction_cache.py) reuses CNN results for unchanged eyes
+- load_cascades() applies detectMultiScale settings tuned by tune_cascades.py
+"""
+
+import collections
+import copy
+import functools
+import json
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from eye_inference import (
+    load_model_safe, make_batch_predictor, predict_first_eyes, is_eye_closed, closed_probability, EyeBatchBuffer,
+)
+from numpy_cnn import NumpyCNN, npz_path_for
+from quantize_cnn import int8_path_for
+
+CASCADE_FILES = {
+    'face': 'haar cascade files/haarcascade_frontalface_alt.xml',
+    'leye': 'haar cascade files/haarcascade_lefteye_2splits.xml',
+    'reye': 'haar cascade files/haarcascade_righteye_2splits.xml',
+}
+# Default detectMultiScale settings; load_cascades() merges a camera setup of
+# CASCADE_CONFIG over them when tune_cascades.py has written one
+CASCADE_CONFIG = 'cascade_config.json'
+DEFAULT_CAMERA_SETUP = 'default'
+FACE_PARAMS = {'scaleFactor': 1.1, 'minNeighbors': 5, 'minSize': 25}
+EYE_PARAMS = {'scaleFactor': 1.1, 'minNeighbors': 3}  # OpenCV's defaults
+# The efficient model (train_eye_cnn.py --architecture efficient) is used when it has been trained
+MODEL_PATHS = ['models/cnn_eye_efficient.h5', 'models/cnn_eye_classification.h5', 'models/cnn.h5']
+BACKENDS = ('auto', 'keras', 'numpy', 'int8')  # auto prefers the float NumPy export and skips TensorFlow
+
+# Same defaults as the interactive detector; scores are seconds, rates are units per second
+DROWSINESS_THRESHOLD = 1.5 # Drowsiness score (seconds of closed eyes at sensitivity 1) that raises the alarm
+ABSENCE_THRESHOLD = 3.0    # Seconds without detected eyes that raise the alarm
+SENSITIVITY = 1            # Drowsiness score gained per second of closed eyes (and lost per second open)
+ABSENT_DECAY = 0.5         # Drowsiness score lost per second while no eyes are detected
+ABSENCE_RECOVERY = 2       # Absence seconds forgiven per second with eyes detected
+MAX_FRAME_GAP = 1.0        # Longest time step credited to one frame (stalls, first frame after a pause)
+ALARM_COOLDOWN = 3         # Seconds between alarms
+
+# Eye search region inside a face box
+EYE_REGION_HEIGHT = 0.6    # Fraction of the face height (from the top) searched for eyes
+EYE_MIN_SIZE = 0.15        # Smallest eye as a fraction of the face width
+EYE_MAX_SIZE = 0.5         # Largest eye as a fraction of the face width
+
+# Adaptive face detection scale
+FACE_WINDOW = 20           # Detection window of the frontal face cascade
+FACE_TARGET_WIDTH = 64     # Downscale until recent faces are about this wide (3x the window)
+MIN_DETECT_SCALE = 0.25    # Never detect on less than a quarter of the resolution
+
+def load_cascade_config(camera=DEFAULT_CAMERA_SETUP, path=CASCADE_CONFIG):
+    """detectMultiScale settings of a camera setup as {'face': ..., 'eyes': ...}
+
+    Tuned settings override FACE_PARAMS / EYE_PARAMS, anything the setup
+    doesn't tune (or a missing setup) keeps the defaults. Only the keys of
+    the defaults are taken; the detectors derive the rest (e.g. the eye
+    minSize/maxSize) from the face box.
+    """
+    params = {'face': dict(FACE_PARAMS), 'eyes': dict(EYE_PARAMS)}
+    try:
+        with open(path) as f:
+            config = json.load(f).get(camera) or {}
+    except (OSError, ValueError):
+        config = {}
+    for key, values in params.items():
+        tuned = config.get(key) or {}
+        ignored = sorted(set(tuned) - set(values))
+        if ignored:
+            print(f"⚠ Warning: Ignoring {', '.join(ignored)} in the '{camera}' {key} settings of {path}")
+        values.update((name, value) for name, value in tuned.items() if name in values)
+    return params
+
+def load_cascades(camera=DEFAULT_CAMERA_SETUP, params=None):
+    """Load the face, left eye and right eye Haar cascades with the camera setup's settings
+
+    The settings are returned under 'params'; pass params to use them
+    instead of a camera setup, camera=None uses the defaults.
+    """
+    if params is None:
+        params = load_cascade_config(camera) if camera is not None else \
+            {'face': dict(FACE_PARAMS), 'eyes': dict(EYE_PARAMS)}
+    cascades = {'params': params}
+    for name, path in CASCADE_FILES.items():
+        cascade = cv2.CascadeClassifier(path)
+        if cascade.empty():
+            raise FileNotFoundError(f"Could not load Haar cascade: {path}")
+        cascades[name] = cascade
+    return cascades
+
+def load_eye_predictor(model_paths=MODEL_PATHS, backend='auto'):
+    """Load the first usable eye CNN and return (predict_batch, model_path)
+
+    The 'numpy' backend runs the .npz export of a model (see numpy_cnn.py)
+    without importing TensorFlow, 'int8' runs its quantized .int8.npz
+    (see quantize_cnn.py), 'keras' loads the .h5 file and 'auto' tries
+    numpy, then keras. int8 only saves memory, it is no faster than the float
+    export, so it has to be asked for. Returns (None, None) when no model can
+    be loaded, in which case the pipeline falls back to eye-count detection.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}', expected one of {BACKENDS}")
+
+    for model_path in model_paths:
+        for npz_backend, npz_path in (('numpy', npz_path_for(model_path)), ('int8', int8_path_for(model_path))):
+            if backend in (npz_backend, 'auto' if npz_backend == 'numpy' else None) and os.path.exists(npz_path):
+                # An export older than its .h5 holds the weights from before the last retrain
+                if os.path.exists(model_path) and os.path.getmtime(npz_path) < os.path.getmtime(model_path):
+                    print(f"⚠ Warning: Skipping {npz_path}, it is older than {model_path}")
+                    continue
+                try:
+                    return NumpyCNN.load(npz_path).predict, npz_path
+                except Exception as e:
+                    print(f"Failed to load model {npz_path}: {e}")
+        if backend in ('auto', 'keras') and os.path.exists(model_path):
+            model = load_model_safe(model_path)
+            if model is not None:
+                return make_batch_predictor(model), model_path
+    return None, None
+
+class BackgroundModelLoader:
+    """Loads the eye CNN on a background thread so monitoring can start at once
+
+    Until the model is ready `predict_batch` is None and callers run the
+    eye-count fallback; the finished predictor is published with a single
+    attribute assignment, so the swap is atomic for readers.
+    """
+
+    def __init__(self, model_paths=MODEL_PATHS, backend='auto'):
+        self.predict_batch = None
+        self.model_path = None
+        self.load_seconds = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(model_paths, backend), daemon=True)
+        self.thread.start()
+
+    def _run(self, model_paths, backend):
+        start = time.perf_counter()
+        try:
+            predict_batch, self.model_path = load_eye_predictor(model_paths, backend)
+        except Exception as e:
+            print(f"❌ Error loading model: {e}")
+            predict_batch = None
+        self.load_seconds = time.perf_counter() - start
+        self.predict_batch = predict_batch
+        self.ready.set()
+
+def new_stream_state(drowsiness_threshold=DROWSINESS_THRESHOLD, absence_threshold=ABSENCE_THRESHOLD):
+    """Create the per-stream scoring state (scores and thresholds in seconds)"""
+    return {
+        'drowsiness_score': 0.0,
+        'absence_counter': 0.0,
+        'drowsiness_threshold': drowsiness_threshold,
+        'absence_threshold': absence_threshold,
+        'last_alarm_time': float('-inf'),
+        'last_timestamp': None,
+    }
+
+def detect_eyes(gray, faces, leye, reye, full_frame=False, params=EYE_PARAMS):
+    """Detect left and right eyes inside the upper region of each face box
+
+    Eye min/max sizes are derived from the face width and the boxes are
+    mapped back to frame coordinates. full_frame=True keeps the old
+    behavior of scanning the whole frame at every scale.
+    """
+    if full_frame:
+        return leye.detectMultiScale(gray, **params), reye.detectMultiScale(gray, **params)
+
+    left_eye, right_eye = [], []
+    for (x, y, w, h) in faces:
+        roi = gray[y:y + int(h * EYE_REGION_HEIGHT), x:x + w]
+        min_size = max(int(w * EYE_MIN_SIZE), 20)  # 20px is the eye cascades' window size
+        max_size = max(int(w * EYE_MAX_SIZE), min_size)
+
+        for cascade, eyes in ((leye, left_eye), (reye, right_eye)):
+            found = cascade.detectMultiScale(roi, minSize=(min_size, min_size), maxSize=(max_size, max_size),
+                                             **params)
+            for (ex, ey, ew, eh) in found:
+                eyes.append((x + ex, y + ey, ew, eh))
+
+    return np.array(left_eye, dtype=np.int32).reshape(-1, 4), np.array(right_eye, dtype=np.int32).reshape(-1, 4)
+
+def detect_faces(gray, face_cascade, scale=1.0, params=FACE_PARAMS):
+    """Run a full Haar face detection, optionally on a downscaled copy of the frame
+
+    Boxes are always returned in full-resolution coordinates, so the eye
+    search and the CNN crops still use every pixel.
+    """
+    min_size = params['minSize']
+    if scale >= 1.0:
+        return face_cascade.detectMultiScale(gray, minNeighbors=params['minNeighbors'],
+                                             scaleFactor=params['scaleFactor'], minSize=(min_size, min_size))
+
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    min_size = max(FACE_WINDOW, int(min_size * scale))
+    faces = face_cascade.detectMultiScale(small, minNeighbors=params['minNeighbors'],
+                                          scaleFactor=params['scaleFactor'], minSize=(min_size, min_size))
+    if len(faces) == 0:
+        return faces
+    return np.round(np.asarray(faces) / scale).astype(np.int32)
+
+class AdaptiveDetectionScale:
+    """Chooses the face detection downscale from the sizes of recently found faces
+
+    The smallest face of the last `history` detections is scaled to about
+    FACE_TARGET_WIDTH pixels, comfortably above the cascade window. After
+    `miss_limit` detections in a row without a face it goes back to full
+    resolution, so small or distant faces are still found.
+    """
+
+    def __init__(self, target_width=FACE_TARGET_WIDTH, min_scale=MIN_DETECT_SCALE, history=10, miss_limit=3):
+        self.target_width = target_width
+        self.min_scale = min_scale
+        self.miss_limit = miss_limit
+        self.face_widths = collections.deque(maxlen=history)
+        self.misses = 0
+        self.scale = 1.0
+        self.detections = 0
+        self.scale_total = 0.0
+        self.saved_seconds = 0.0
+        self.full_cost = None  # Moving average of full-resolution detection time
+        self.metrics = None
+
+    def choose_scale(self):
+        if not self.face_widths or self.misses >= self.miss_limit:
+            return 1.0
+        return float(np.clip(self.target_width / min(self.face_widths), self.min_scale, 1.0))
+
+    def detect(self, gray, face_cascade, params=FACE_PARAMS):
+        """Detect faces at the adaptive scale, returns full-resolution boxes"""
+        self.scale = scale = self.choose_scale()
+        start = time.perf_counter()
+        faces = detect_faces(gray, face_cascade, scale, params)
+        elapsed = time.perf_counter() - start
+
+        if len(faces) > 0:
+            self.face_widths.append(int(min(w for (_, _, w, _) in faces)))
+            self.misses = 0
+        else:
+            self.misses += 1
+
+        # Savings are measured against recent full-resolution detections; until one has
+        # run, estimate them from the number of pixels scanned
+        if scale >= 1.0:
+            self.full_cost = elapsed if self.full_cost is None else 0.8 * self.full_cost + 0.2 * elapsed
+            saved = 0.0
+        elif self.full_cost is not None:
+            saved = max(0.0, self.full_cost - elapsed)
+        else:
+            saved = elapsed * (1 / (scale * scale) - 1)
+        self.detections += 1
+        self.scale_total += scale
+        self.saved_seconds += saved
+        if self.metrics is not None:
+            self.metrics.detect_scale.set(scale)
+            self.metrics.detect_saved.inc(saved)
+        return faces
+
+    def report(self):
+        """Human readable scale/savings line"""
+        average = self.scale_total / self.detections if self.detections else 1.0
+        return (f"Face detection scale - average {average:.2f} over {self.detections} detections, "
+                f"~{self.saved_seconds:.1f}s saved")
+
+def detect_faces_and_eyes(gray, cascades, full_frame_eyes=False, face_tracker=None, face_scaler=None):
+    """Find faces (detected or tracked), then run the eye cascades on them"""
+    params = cascades['params']
+    if face_tracker is not None:
+        faces = face_tracker.update(gray, cascades['face'], params['face'])
+    elif face_scaler is not None:
+        faces = face_scaler.detect(gray, cascades['face'], params['face'])
+    else:
+        faces = detect_faces(gray, cascades['face'], params=params['face'])
+    left_eye, right_eye = detect_eyes(gray, faces, cascades['leye'], cascades['reye'], full_frame_eyes,
+                                      params['eyes'])
+    return faces, left_eye, right_eye
+
+class FrameResult:
+    """Outcome of one analyzed frame (counts, eye states, scores, alarm and boxes)"""
+    __slots__ = ('faces', 'left_eyes', 'right_eyes', 'left_closed', 'right_closed', 'eye_status',
+                 'drowsiness_score', 'absence_counter', 'alarm', 'face_boxes', 'left_eye_boxes', 'right_eye_boxes',
+                 'analyzed', 'left_closed_prob', 'right_closed_prob')
+
+    def __init__(self, face_boxes, left_eye_boxes, right_eye_boxes, left_closed, right_closed, eye_status,
+                 drowsiness_score, absence_counter, alarm, left_closed_prob=float('nan'),
+                 right_closed_prob=float('nan')):
+        self.faces = len(face_boxes)
+        self.left_eyes = len(left_eye_boxes)
+        self.right_eyes = len(right_eye_boxes)
+        self.left_closed = left_closed
+        self.right_closed = right_closed
+        self.eye_status = eye_status
+        self.drowsiness_score = drowsiness_score
+        self.absence_counter = absence_counter
+        self.alarm = alarm
+        self.face_boxes = face_boxes
+        self.left_eye_boxes = left_eye_boxes
+        self.right_eye_boxes = right_eye_boxes
+        self.analyzed = True
+        # CNN closed-eye probabilities, NaN when the eye was not classified
+        self.left_closed_prob = left_closed_prob
+        self.right_closed_prob = right_closed_prob
+
+    def carried_over(self):
+        """Copy of this result for a frame the scheduler skipped (never raises an alarm)"""
+        result = copy.copy(self)
+        result.alarm = None
+        result.analyzed = False
+        return result
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+def update_stream_state(state, faces, left_eye, right_eye, rpred, lpred, use_ml, timestamp,
+                        sensitivity=SENSITIVITY, alarm_cooldown=ALARM_COOLDOWN):
+    """Update drowsiness/absence scores for one frame and return the frame result
+
+    Every frame is credited with the time since the previous one (capped at
+    MAX_FRAME_GAP), so skipped frames and slow hardware don't move alarms.
+    """
+    last_timestamp = state['last_timestamp']
+    dt = 0.0 if last_timestamp is None else min(max(timestamp - last_timestamp, 0.0), MAX_FRAME_GAP)
+    state['last_timestamp'] = timestamp
+
+    left_closed = False
+    right_closed = False
+    left_prob = right_prob = float('nan')
+    eyes_detected = len(left_eye) > 0 or len(right_eye) > 0
+
+    if len(faces) > 0 and eyes_detected:
+        state['absence_counter'] = max(0.0, state['absence_counter'] - ABSENCE_RECOVERY * dt)
+
+        if use_ml:
+            left_closed = is_eye_closed(lpred)
+            right_closed = is_eye_closed(rpred)
+            if len(left_eye) > 0:
+                left_prob = closed_probability(lpred)
+            if len(right_eye) > 0:
+                right_prob = closed_probability(rpred)
+            drowsy = left_closed or right_closed
+            eye_status = "Eyes Closed (AI)" if drowsy else "Eyes Open (AI)"
+        else:
+            expected_eyes = len(faces) * 2
+            detected_eyes = len(left_eye) + len(right_eye)
+            drowsy = detected_eyes < expected_eyes * 0.7
+            eye_status = "Possible Sleepiness" if drowsy else "Eyes Detected"
+
+        if drowsy:
+            state['drowsiness_score'] += sensitivity * dt
+        else:
+            state['drowsiness_score'] = max(0.0, state['drowsiness_score'] - sensitivity * dt)
+    else:
+        state['absence_counter'] += dt
+        state['drowsiness_score'] = max(0.0, state['drowsiness_score'] - ABSENT_DECAY * dt)
+        eye_status = "Eyes Not Detected!"
+
+    # Same alarm precedence and cooldown as the interactive detector
+    alarm = None
+    if timestamp - state['last_alarm_time'] > alarm_cooldown:
+        if state['drowsiness_score'] >= state['drowsiness_threshold']:
+            alarm = 'drowsiness'
+        elif state['absence_counter'] >= state['absence_threshold']:
+            alarm = 'absence'
+    if alarm is not None:
+        state['last_alarm_time'] = timestamp
+
+    return FrameResult(faces, left_eye, right_eye, left_closed, right_closed, eye_status,
+                       state['drowsiness_score'], state['absence_counter'], alarm, left_prob, right_prob)
+
+class SleepDetector:
+    """Detection, eye classification and drowsiness/absence scoring for one stream
+
+    Never draws anything, so UIs render the returned FrameResult themselves
+    and headless consumers only pay for the compute. `predict_batch` may be
+    swapped at any time (None runs eye-count detection) and `state` holds
+    the scores and thresholds, which UIs are free to adjust. With
+    adaptive_scale faces are detected on a downscaled frame (see
+    AdaptiveDetectionScale), also when a face tracker runs the detections.
+    With a scheduler, frames it skips return the previous result (marked
+    analyzed=False) without touching the scores. With a prediction_cache,
+    eye crops that barely changed since a recent frame skip the CNN.
+    """
+
+    def __init__(self, cascades=None, predict_batch=None, face_tracker=None,
+                 drowsiness_threshold=DROWSINESS_THRESHOLD, absence_threshold=ABSENCE_THRESHOLD,
+                 sensitivity=SENSITIVITY, alarm_cooldown=ALARM_COOLDOWN, full_frame_eyes=False, metrics=None,
+                 adaptive_scale=True, scheduler=None, prediction_cache=None):
+        self.cascades = cascades if cascades is not None else load_cascades()
+        self.predict_batch = predict_batch
+        self.face_tracker = face_tracker
+        self.face_scaler = AdaptiveDetectionScale() if adaptive_scale else None
+        if self.face_scaler is not None:
+            self.face_scaler.metrics = metrics
+            if face_tracker is not None:
+                face_tracker.scaler = self.face_scaler
+        self.sensitivity = sensitivity
+        self.alarm_cooldown = alarm_cooldown
+        self.full_frame_eyes = full_frame_eyes
+        self.metrics = metrics
+        self.scheduler = scheduler
+        self.prediction_cache = prediction_cache
+        if prediction_cache is not None:
+            prediction_cache.metrics = metrics
+        self.last_result = None
+        self.eye_buffer = EyeBatchBuffer()
+        self.state = new_stream_state(drowsiness_threshold, absence_threshold)
+
+    def reset_tracking(self):
+        """Re-detect faces from scratch on the next frame (e.g. after a pause)
+
+        The paused time is not credited to the scores either.
+        """
+        self.state['last_timestamp'] = None
+        if self.face_tracker is not None:
+            self.face_tracker.reset()
+
+    def process(self, frame, timestamp=None):
+        """Run detection, eye classification and scoring on one BGR frame"""
+        if timestamp is None:
+            timestamp = time.time()
+        metrics = self.metrics
+        predict_batch = self.predict_batch
+        scheduler = self.scheduler
+        if scheduler is not None and not scheduler.should_analyze(timestamp, self.state, self.last_result):
+            if metrics is not None:
+                metrics.skipped.inc()
+            return self.last_result.carried_over()
+
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        faces, left_eye, right_eye = detect_faces_and_eyes(gray, self.cascades, self.full_frame_eyes,
+                                                           self.face_tracker, self.face_scaler)
+        cascades_done = time.perf_counter()
+
+        use_ml = predict_batch is not None
+        if use_ml and self.prediction_cache is not None:
+            predict_batch = functools.partial(self.prediction_cache.predict, predict_batch)
+        rpred, lpred = [0.5, 0.5], [0.5, 0.5]
+        if use_ml and len(faces) > 0:
+            try:
+                rpred, lpred = predict_first_eyes(predict_batch, gray, right_eye, left_eye, rpred, self.eye_buffer)
+            except:
+                rpred, lpred = [0.5, 0.5], [0.5, 0.5]
+            if metrics is not None:
+                metrics.stages['cnn'].observe(time.perf_counter() - cascades_done)
+
+        result = update_stream_state(self.state, faces, left_eye, right_eye, rpred, lpred, use_ml, timestamp,
+                                     self.sensitivity, self.alarm_cooldown)
+        if scheduler is not None:
+            scheduler.record(time.perf_counter() - start)
+        if metrics is not None:
+            metrics.stages['cascades'].observe(cascades_done - start)
+            metrics.observe_result(result)
+        self.last_result = result
+        return result
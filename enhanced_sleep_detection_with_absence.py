@@ -11,23 +11,29 @@ import os
 import numpy as np
 from pygame import mixer
 import time
-
-def load_model_safe(model_path):
-    """Safely load Keras model with compatibility fixes"""
-    try:
-        import tensorflow as tf
-        return tf.keras.models.load_model(model_path)
-    except Exception as e1:
-        try:
-            from keras.models import load_model
-            return load_model(model_path, compile=False)
-        except Exception as e2:
-            try:
-                import tensorflow as tf
-                return tf.keras.models.load_model(model_path, compile=False)
-            except Exception as e3:
-                print(f"Failed to load model {model_path}: {e3}")
-                return None
+from concurrent.futures import ThreadPoolExecutor
+from detection_pipeline import MODEL_PATHS, load_cascades, BackgroundModelLoader, SleepDetector
+from face_tracker import FaceTracker
+from prediction_cache import PredictionCache
+from alerts import build_dispatcher, alert_event
+from session_recorder import SessionRecorder
+
+# Control panel layout, buttons are (x, y, width, height)
+PANEL_HEIGHT = 120
+PANEL_COLOR = (40, 40, 40)
+TEXT_LINE_HEIGHT = 22      # Pixel rows a panel text line can touch (16 above the baseline, 6 below)
+PAUSE_BUTTON = (10, 10, 80, 30)
+SENSITIVITY_UP_BUTTON = (100, 10, 30, 30)
+SENSITIVITY_DOWN_BUTTON = (140, 10, 30, 30)
+BUTTONS = (PAUSE_BUTTON, SENSITIVITY_UP_BUTTON, SENSITIVITY_DOWN_BUTTON)
+
+STATUS_COLORS = {
+    "Eyes Closed (AI)": (0, 0, 255),
+    "Eyes Open (AI)": (0, 255, 0),
+    "Possible Sleepiness": (0, 165, 255),
+    "Eyes Detected": (0, 255, 0),
+    "Eyes Not Detected!": (0, 0, 255),
+}
 
 def draw_button(frame, text, x, y, width, height, color, text_color=(255, 255, 255)):
     """Draw a button on the frame"""
@@ -60,37 +66,131 @@ def mouse_callback(event, x, y, flags, param):
             state['paused'] = not state['paused']
         elif is_point_in_button(x, y, sensitivity_up):
             # Increase sensitivity (lower threshold)
-            if state['absence_threshold'] > 5:
-                state['absence_threshold'] -= 5
+            if state['absence_threshold'] > 0.5:
+                state['absence_threshold'] -= 0.5
         elif is_point_in_button(x, y, sensitivity_down):
             # Decrease sensitivity (higher threshold)
-            if state['absence_threshold'] < 100:
-                state['absence_threshold'] += 5
-
-def main():
-    # Configuration
-    DROWSINESS_THRESHOLD = 15  # Score threshold for drowsiness (eyes closed)
-    ABSENCE_THRESHOLD = 30     # Frames threshold for eye absence detection
-    SENSITIVITY = 1            # How quickly score increases/decreases
-    
-    # State variables
-    state = {
-        'paused': False,
-        'absence_threshold': ABSENCE_THRESHOLD,
-        'drowsiness_threshold': DROWSINESS_THRESHOLD
-    }
-    
-    # Initialize pygame mixer for audio
+            if state['absence_threshold'] < 10:
+                state['absence_threshold'] += 0.5
+
+class UIPanel:
+    """Top control panel kept as a cached layer
+
+    The background and buttons are drawn once; on each frame only the text
+    fields whose value changed are re-rendered into the layer, which is
+    then copied onto the frame in one vectorized step.
+    """
+
+    def __init__(self, font_small=cv2.FONT_HERSHEY_SIMPLEX):
+        self.font_small = font_small
+        self.base = None   # Background and buttons only, used to erase old text
+        self.layer = None  # Base plus the current text fields
+        self.values = {}
+
+    def _build(self, width):
+        # +1 row: the panel used to be drawn with cv2.rectangle, which includes its bottom edge
+        self.base = np.full((PANEL_HEIGHT + 1, width, 3), PANEL_COLOR, dtype=np.uint8)
+        draw_button(self.base, "+", *SENSITIVITY_UP_BUTTON, (0, 100, 0))
+        draw_button(self.base, "-", *SENSITIVITY_DOWN_BUTTON, (100, 0, 0))
+        self.layer = self.base.copy()
+        self.values = {}
+
+    def _fields(self, state, width):
+        """{field: (text, origin, font scale, color)} of every text field in the panel"""
+        paused = state['paused']
+        return {
+            'score': (f"Drowsiness Score: {state['drowsiness_score']:.1f}/{state['drowsiness_threshold']:.1f}",
+                      (10, 55), 0.6, (255, 255, 255)),
+            'absence': (f"Absence: {state['absence_counter']:.1f}s/{state['absence_threshold']:.1f}s",
+                        (10, 75), 0.6, (255, 255, 255)),
+            'status': (f"Status: {'PAUSED' if paused else 'MONITORING'}",
+                       (10, 95), 0.6, (255, 255, 0) if paused else (0, 255, 0)),
+            'sensitivity': (f"Absence Sensitivity: {state['absence_threshold']:.1f}s",
+                            (width - 250, 30), 0.5, (255, 255, 255)),
+        }
+
+    def draw(self, frame, state):
+        """Composite the panel onto the top of a frame"""
+        width = frame.shape[1]
+        if self.layer is None or self.layer.shape[1] != width:
+            self._build(width)
+
+        paused = state['paused']
+        if self.values.get('pause') != paused:
+            for layer in (self.base, self.layer):
+                draw_button(layer, "RESUME" if paused else "PAUSE", *PAUSE_BUTTON,
+                            (0, 150, 0) if paused else (0, 0, 150))
+            self.values['pause'] = paused
+
+        fields = self._fields(state, width)
+        redraw = {field for field, (text, *_) in fields.items() if self.values.get(field) != text}
+        # Adjacent lines share a few pixel rows, so erasing one line means redrawing its neighbours
+        while True:
+            overlapping = {field for field, (_, (_, y), _, _) in fields.items()
+                           if any(abs(y - fields[other][1][1]) < TEXT_LINE_HEIGHT for other in redraw)}
+            if overlapping <= redraw:
+                break
+            redraw |= overlapping
+
+        for field in redraw:
+            x, y = fields[field][1]
+            self.layer[y - 16:y + 6, x:] = self.base[y - 16:y + 6, x:]
+        for field in redraw:
+            text, origin, scale, color = fields[field]
+            cv2.putText(self.layer, text, origin, self.font_small, scale, color, 1, cv2.LINE_AA)
+            self.values[field] = text
+
+        # The panel is opaque, so compositing is a single block copy
+        np.copyto(frame[:PANEL_HEIGHT + 1], self.layer)
+
+def render(frame, result, state, font, font_small, panel):
+    """Draw the cached UI panel and the detection overlays"""
+    height, width = frame.shape[:2]
+    panel.draw(frame, state)
+
+    if result is None:
+        cv2.putText(frame, "DETECTION PAUSED", (width//2 - 150, height//2), font, 1.5, (255, 255, 0), 3, cv2.LINE_AA)
+        cv2.putText(frame, "Click RESUME to continue", (width//2 - 120, height//2 + 50), font_small, 0.8, (255, 255, 255), 2, cv2.LINE_AA)
+    else:
+        for (x, y, w, h) in result.face_boxes:
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 255, 0), 2)
+            cv2.putText(frame, 'Face', (x, y-10), font_small, 0.5, (255, 255, 0), 1)
+        for (x, y, w, h) in result.right_eye_boxes[:1]:
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
+            cv2.putText(frame, 'R', (x, y-5), font_small, 0.5, (255, 0, 0), 1)
+        for (x, y, w, h) in result.left_eye_boxes[:1]:
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+            cv2.putText(frame, 'L', (x, y-5), font_small, 0.5, (0, 255, 0), 1)
+
+        status_color = STATUS_COLORS.get(result.eye_status, (255, 255, 255))
+        cv2.putText(frame, result.eye_status, (10, height - 40), font_small, 0.6, status_color, 1, cv2.LINE_AA)
+        if result.faces == 0:
+            cv2.putText(frame, "No Face Detected!", (10, height - 60), font_small, 0.6, (255, 0, 0), 1, cv2.LINE_AA)
+
+        if result.alarm == 'drowsiness':
+            cv2.putText(frame, "DROWSINESS DETECTED!", (50, 200), font, 1.2, (0, 0, 255), 3, cv2.LINE_AA)
+            cv2.putText(frame, "WAKE UP!", (50, 250), font, 1.5, (0, 0, 255), 4, cv2.LINE_AA)
+            cv2.rectangle(frame, (0, 0), (width, height), (0, 0, 255), 10)
+        elif result.alarm == 'absence':
+            cv2.putText(frame, "EYES NOT DETECTED!", (50, 200), font, 1.2, (255, 0, 0), 3, cv2.LINE_AA)
+            cv2.putText(frame, "LOOK AT CAMERA!", (50, 250), font, 1.2, (255, 0, 0), 3, cv2.LINE_AA)
+            cv2.rectangle(frame, (0, 0), (width, height), (255, 0, 0), 8)
+        elif result.drowsiness_score >= state['drowsiness_threshold'] * 0.7:
+            cv2.putText(frame, "Getting Sleepy...", (50, 200), font, 1, (0, 165, 255), 2, cv2.LINE_AA)
+        elif result.absence_counter >= state['absence_threshold'] * 0.7:
+            cv2.putText(frame, "Eyes Missing...", (50, 200), font, 1, (255, 165, 0), 2, cv2.LINE_AA)
+
+def load_alarm_sounds():
+    """Initialize the audio mixer and load the drowsiness and absence alarms"""
     mixer.init()
-    
-    # Load alarm sounds
+
     try:
         drowsy_sound = mixer.Sound('alarm2.wav')
         print("✓ Drowsiness alarm loaded successfully")
     except Exception as e:
         print(f"⚠ Warning: Could not load drowsiness alarm - {e}")
         drowsy_sound = None
-    
+
     try:
         # Try to load a different alarm for absence (or use the same one)
         absence_sound = mixer.Sound('TFALARM.WAV') if os.path.exists('TFALARM.WAV') else drowsy_sound
@@ -99,51 +199,83 @@ def main():
         print(f"⚠ Warning: Using same alarm for absence detection")
         absence_sound = drowsy_sound
 
-    # Load Haar cascade classifiers
+    return drowsy_sound, absence_sound
+
+def open_webcam():
+    """Open the default webcam"""
+    cap = cv2.VideoCapture(0)
+    if not cap.isOpened():
+        cap.release()
+        raise IOError("Could not open webcam")
+    return cap
+
+def main():
+    # Configuration
+    DROWSINESS_THRESHOLD = 1.5 # Score threshold for drowsiness (seconds of closed eyes at sensitivity 1)
+    ABSENCE_THRESHOLD = 3.0    # Seconds without detected eyes before the absence alarm
+    SENSITIVITY = 1            # Score gained/lost per second of closed/open eyes
+    FULL_FRAME_EYES = False    # Scan the whole frame for eyes instead of only the face region
+    FACE_TRACKER = 'none'      # Face tracker between detections: 'template', 'flow' or 'none' (off)
+    CAMERA_SETUP = 'default'   # Cascade settings from cascade_config.json (written by tune_cascades.py)
+    FACE_DETECT_INTERVAL = 5   # Run a full face detection every N frames
+    ADAPTIVE_SCALE = True      # Detect faces on a downscaled frame sized from recent faces
+    PREDICTION_CACHE = 0       # Recent eye crops whose CNN result is reused, e.g. 32 (0 = run the CNN every frame)
+    MODEL_BACKEND = 'auto'     # CNN runtime: 'keras', 'numpy' (exported .npz), 'int8' or 'auto'
+    ALERT_LOG = None           # Append alarms as JSON lines to this file, e.g. 'alerts.log'
+    ALERT_WEBHOOK = None       # POST alarms to a local collector, e.g. 'http://127.0.0.1:8080/alerts'
+    RECORD_DIR = None          # Record every frame's result under this folder, e.g. 'recordings' (None = off)
+    
+    startup_start = time.perf_counter()
+
+    # Load the CNN in the background; monitoring starts with basic eye detection meanwhile
+    # (an exported .npz model runs without TensorFlow)
+    model_loader = BackgroundModelLoader(MODEL_PATHS, backend=MODEL_BACKEND)
+
+    # Initialize audio, Haar cascades and webcam in parallel
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        sounds_task = pool.submit(load_alarm_sounds)
+        cascades_task = pool.submit(load_cascades, CAMERA_SETUP)
+        webcam_task = pool.submit(open_webcam)
+
     try:
-        face = cv2.CascadeClassifier('haar cascade files/haarcascade_frontalface_alt.xml')
-        leye = cv2.CascadeClassifier('haar cascade files/haarcascade_lefteye_2splits.xml')
-        reye = cv2.CascadeClassifier('haar cascade files/haarcascade_righteye_2splits.xml')
-        print("✓ Haar cascade classifiers loaded successfully")
+        drowsy_sound, absence_sound = sounds_task.result()
     except Exception as e:
-        print(f"❌ Error loading Haar cascades: {e}")
-        return
+        print(f"⚠ Warning: Could not initialize audio - {e}")
+        drowsy_sound, absence_sound = None, None
 
-    # Initialize video capture
     try:
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
-            print("❌ Error: Could not open webcam")
-            return
+        cap = webcam_task.result()
         print("✓ Webcam initialized successfully")
     except Exception as e:
         print(f"❌ Error initializing webcam: {e}")
         return
 
-    # Load the pre-trained CNN model
-    model = None
-    model_paths = ['models/cnn_eye_classification.h5', 'models/cnn.h5']
-    
-    for model_path in model_paths:
-        if os.path.exists(model_path):
-            print(f"Trying to load model: {model_path}")
-            model = load_model_safe(model_path)
-            if model is not None:
-                print(f"✓ Model loaded successfully: {model_path}")
-                break
-            else:
-                print(f"❌ Failed to load model: {model_path}")
-    
-    use_ml = model is not None
+    try:
+        cascades = cascades_task.result()
+        print("✓ Haar cascade classifiers loaded successfully")
+    except Exception as e:
+        print(f"❌ Error loading Haar cascades: {e}")
+        cap.release()
+        return
 
-    # Initialize variables
-    drowsiness_score = 0
-    absence_counter = 0
+    # Alarms are delivered by background sinks, so a slow sink never holds up a frame
+    alerts = build_dispatcher({'drowsiness': drowsy_sound, 'absence': absence_sound}, ALERT_LOG, ALERT_WEBHOOK)
+
+    print("🧠 Loading CNN model in the background, using basic eye detection until it is ready")
+    model_announced = False
+    first_frame_logged = False
+
+    # Detection and scoring run in SleepDetector, this script only draws and dispatches alarms
+    face_tracker = FaceTracker(FACE_DETECT_INTERVAL, FACE_TRACKER)
+    detector = SleepDetector(cascades, None, face_tracker, DROWSINESS_THRESHOLD, ABSENCE_THRESHOLD,
+                             SENSITIVITY, full_frame_eyes=FULL_FRAME_EYES, adaptive_scale=ADAPTIVE_SCALE,
+                             prediction_cache=PredictionCache(PREDICTION_CACHE) if PREDICTION_CACHE else None)
+    state = detector.state
+    state['paused'] = False
+    recorder = SessionRecorder(RECORD_DIR, 'main') if RECORD_DIR else None
     font = cv2.FONT_HERSHEY_TRIPLEX
     font_small = cv2.FONT_HERSHEY_SIMPLEX
-    last_alarm_time = 0
-    alarm_cooldown = 3  # seconds between alarms
-    
+
     print(f"\n🚀 Starting enhanced sleep detection...")
     print(f"📷 Make sure you're visible in the webcam")
     print(f"👁 Drowsiness detection: ON")
@@ -153,9 +285,11 @@ def main():
     print(f"🔴 Press 'q' to quit")
     print("-" * 50)
 
-    # Create window and set mouse callback
+    # Create window and set mouse callback (the buttons never move, so once is enough)
     window_name = 'Enhanced Sleep Detection with Eye Absence Alert'
     cv2.namedWindow(window_name)
+    cv2.setMouseCallback(window_name, mouse_callback, BUTTONS + (state,))
+    panel = UIPanel(font_small)
     
     try:
         while True:
@@ -165,213 +299,37 @@ def main():
                 print("❌ Error reading frame from webcam")
                 break
 
-            height, width = frame.shape[:2]
-            thicc = 2
-            current_time = time.time()
-
-            # Draw UI panel at the top
-            ui_height = 120
-            cv2.rectangle(frame, (0, 0), (width, ui_height), (40, 40, 40), -1)
-            
-            # Draw buttons
-            pause_text = "RESUME" if state['paused'] else "PAUSE"
-            pause_color = (0, 150, 0) if state['paused'] else (0, 0, 150)
-            pause_button = draw_button(frame, pause_text, 10, 10, 80, 30, pause_color)
-            
-            sensitivity_up = draw_button(frame, "+", 100, 10, 30, 30, (0, 100, 0))
-            sensitivity_down = draw_button(frame, "-", 140, 10, 30, 30, (100, 0, 0))
-            
-            # Set mouse callback with button parameters
-            cv2.setMouseCallback(window_name, mouse_callback, (pause_button, sensitivity_up, sensitivity_down, state))
-            
-            # Display status information
-            status_y = 55
-            cv2.putText(frame, f"Drowsiness Score: {drowsiness_score}/{state['drowsiness_threshold']}", 
-                       (10, status_y), font_small, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
-            cv2.putText(frame, f"Absence Counter: {absence_counter}/{state['absence_threshold']}", 
-                       (10, status_y + 20), font_small, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
-            cv2.putText(frame, f"Status: {'PAUSED' if state['paused'] else 'MONITORING'}", 
-                       (10, status_y + 40), font_small, 0.6, (255, 255, 0) if state['paused'] else (0, 255, 0), 1, cv2.LINE_AA)
-
-            if not state['paused']:
-                # Convert frame to grayscale for detection
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-                # Detect faces and eyes
-                faces = face.detectMultiScale(gray, minNeighbors=5, scaleFactor=1.1, minSize=(25, 25))
-                left_eye = leye.detectMultiScale(gray)
-                right_eye = reye.detectMultiScale(gray)
-
-                # Draw detected faces
-                for (x, y, w, h) in faces:
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 255, 0), 2)
-                    cv2.putText(frame, 'Face', (x, y-10), font_small, 0.5, (255, 255, 0), 1)
-
-                # Check if eyes are present
-                eyes_detected = len(left_eye) > 0 or len(right_eye) > 0
-                
-                if len(faces) > 0 and eyes_detected:
-                    # Reset absence counter when eyes are detected
-                    absence_counter = max(0, absence_counter - 2)
-                    
-                    if use_ml and model is not None:
-                        # Use ML model for drowsiness detection
-                        rpred = [0.5, 0.5]
-                        lpred = [0.5, 0.5]
-
-                        # Process right eye
-                        for (x, y, w, h) in right_eye:
-                            r_eye = frame[y:y+h, x:x+w]
-                            r_eye = cv2.cvtColor(r_eye, cv2.COLOR_BGR2GRAY)
-                            r_eye = cv2.resize(r_eye, (24, 24))
-                            r_eye = r_eye / 255
-                            r_eye = r_eye.reshape(24, 24, -1)
-                            r_eye = np.expand_dims(r_eye, axis=0)
-                            try:
-                                rpred = model.predict(r_eye, verbose=0)
-                            except:
-                                rpred = [0.5, 0.5]
-                            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-                            cv2.putText(frame, 'R', (x, y-5), font_small, 0.5, (255, 0, 0), 1)
-                            break
-
-                        # Process left eye
-                        for (x, y, w, h) in left_eye:
-                            l_eye = frame[y:y+h, x:x+w]
-                            l_eye = cv2.cvtColor(l_eye, cv2.COLOR_BGR2GRAY)
-                            l_eye = cv2.resize(l_eye, (24, 24))
-                            l_eye = l_eye / 255
-                            l_eye = l_eye.reshape(24, 24, -1)
-                            l_eye = np.expand_dims(l_eye, axis=0)
-                            try:
-                                lpred = model.predict(l_eye, verbose=0)
-                            except:
-                                lpred = [0.5, 0.5]
-                            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                            cv2.putText(frame, 'L', (x, y-5), font_small, 0.5, (0, 255, 0), 1)
-                            break
-
-                        # Determine eye states
-                        left_closed = False
-                        right_closed = False
-                        
-                        try:
-                            if len(lpred) > 0:
-                                if hasattr(lpred[0], '__len__') and len(lpred[0]) > 1:
-                                    left_closed = lpred[0][0] > lpred[0][1]
-                                else:
-                                    left_closed = float(lpred[0]) > 0.5
-                        except:
-                            left_closed = False
-                            
-                        try:
-                            if len(rpred) > 0:
-                                if hasattr(rpred[0], '__len__') and len(rpred[0]) > 1:
-                                    right_closed = rpred[0][0] > rpred[0][1]
-                                else:
-                                    right_closed = float(rpred[0]) > 0.5
-                        except:
-                            right_closed = False
-
-                        # Update drowsiness score
-                        if left_closed or right_closed:
-                            drowsiness_score += SENSITIVITY
-                            eye_status = "Eyes Closed (AI)"
-                            status_color = (0, 0, 255)
-                        else:
-                            drowsiness_score = max(0, drowsiness_score - SENSITIVITY)
-                            eye_status = "Eyes Open (AI)"
-                            status_color = (0, 255, 0)
-                    else:
-                        # Simple detection without ML
-                        expected_eyes = len(faces) * 2
-                        detected_eyes = len(left_eye) + len(right_eye)
-                        
-                        if detected_eyes < expected_eyes * 0.7:
-                            drowsiness_score += SENSITIVITY
-                            eye_status = "Possible Sleepiness"
-                            status_color = (0, 165, 255)
-                        else:
-                            drowsiness_score = max(0, drowsiness_score - SENSITIVITY)
-                            eye_status = "Eyes Detected"
-                            status_color = (0, 255, 0)
-
-                        # Draw detected eyes
-                        for (x, y, w, h) in right_eye:
-                            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-                            cv2.putText(frame, 'R', (x, y-5), font_small, 0.5, (255, 0, 0), 1)
-                        for (x, y, w, h) in left_eye:
-                            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                            cv2.putText(frame, 'L', (x, y-5), font_small, 0.5, (0, 255, 0), 1)
-
-                    # Display eye status
-                    cv2.putText(frame, eye_status, (10, height - 40), font_small, 0.6, status_color, 1, cv2.LINE_AA)
-
+            # Swap in the CNN as soon as the background loader has finished
+            detector.predict_batch = model_loader.predict_batch
+            if model_loader.ready.is_set() and not model_announced:
+                model_announced = True
+                if detector.predict_batch is not None:
+                    print(f"✓ Model loaded successfully: {model_loader.model_path} "
+                          f"({model_loader.load_seconds:.1f}s), switching to AI detection")
                 else:
-                    # No face detected or no eyes detected
-                    absence_counter += 1
-                    eye_status = "Eyes Not Detected!"
-                    status_color = (0, 0, 255)
-                    
-                    # Gradually reduce drowsiness score when no eyes detected
-                    drowsiness_score = max(0, drowsiness_score - 0.5)
-                    
-                    # Display warning
-                    cv2.putText(frame, eye_status, (10, height - 40), font_small, 0.6, status_color, 1, cv2.LINE_AA)
-                    if len(faces) == 0:
-                        cv2.putText(frame, "No Face Detected!", (10, height - 60), font_small, 0.6, (255, 0, 0), 1, cv2.LINE_AA)
-
-                # Check for alerts (only if alarm cooldown has passed)
-                should_alarm = current_time - last_alarm_time > alarm_cooldown
-
-                # Check for drowsiness (eyes closed)
-                if drowsiness_score >= state['drowsiness_threshold'] and should_alarm:
-                    cv2.putText(frame, "DROWSINESS DETECTED!", (50, 200), font, 1.2, (0, 0, 255), 3, cv2.LINE_AA)
-                    cv2.putText(frame, "WAKE UP!", (50, 250), font, 1.5, (0, 0, 255), 4, cv2.LINE_AA)
-                    
-                    if drowsy_sound:
-                        try:
-                            drowsy_sound.play()
-                            last_alarm_time = current_time
-                        except:
-                            pass
-
-                    # Create red border
-                    cv2.rectangle(frame, (0, 0), (width, height), (0, 0, 255), 10)
-
-                # Check for eye absence (looking away or sleeping)
-                elif absence_counter >= state['absence_threshold'] and should_alarm:
-                    cv2.putText(frame, "EYES NOT DETECTED!", (50, 200), font, 1.2, (255, 0, 0), 3, cv2.LINE_AA)
-                    cv2.putText(frame, "LOOK AT CAMERA!", (50, 250), font, 1.2, (255, 0, 0), 3, cv2.LINE_AA)
-                    
-                    if absence_sound:
-                        try:
-                            absence_sound.play()
-                            last_alarm_time = current_time
-                        except:
-                            pass
-
-                    # Create blue border for absence detection
-                    cv2.rectangle(frame, (0, 0), (width, height), (255, 0, 0), 8)
-
-                # Warning levels
-                elif drowsiness_score >= state['drowsiness_threshold'] * 0.7:
-                    cv2.putText(frame, "Getting Sleepy...", (50, 200), font, 1, (0, 165, 255), 2, cv2.LINE_AA)
-                elif absence_counter >= state['absence_threshold'] * 0.7:
-                    cv2.putText(frame, "Eyes Missing...", (50, 200), font, 1, (255, 165, 0), 2, cv2.LINE_AA)
+                    print("❌ No models could be loaded. Using simple eye detection without ML.")
 
+            result = None
+            if state['paused']:
+                # Re-detect faces from scratch after resuming
+                detector.reset_tracking()
             else:
-                # Paused state
-                cv2.putText(frame, "DETECTION PAUSED", (width//2 - 150, height//2), font, 1.5, (255, 255, 0), 3, cv2.LINE_AA)
-                cv2.putText(frame, "Click RESUME to continue", (width//2 - 120, height//2 + 50), font_small, 0.8, (255, 255, 255), 2, cv2.LINE_AA)
+                timestamp = time.time()
+                result = detector.process(frame, timestamp)
+                if result.alarm:
+                    alerts.dispatch(alert_event(result.alarm, 'main', result))
+                if recorder is not None:
+                    recorder.record(result, timestamp)
 
-            # Always display current settings
-            cv2.putText(frame, f"Absence Sensitivity: {state['absence_threshold']}", 
-                       (width - 250, 30), font_small, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+            render(frame, result, state, font, font_small, panel)
 
             # Display the frame
             cv2.imshow(window_name, frame)
 
+            if not first_frame_logged:
+                first_frame_logged = True
+                print(f"⏱ First frame processed {time.perf_counter() - startup_start:.2f}s after startup")
+
             # Exit on 'q' key press
             key = cv2.waitKey(1) & 0xFF
             if key == ord('q'):
@@ -387,6 +345,16 @@ def main():
         # Clean up
         cap.release()
         cv2.destroyAllWindows()
+        alerts.close()
+        print(f"🔔 {alerts.report()}")
+        if recorder is not None:
+            recorder.close()
+            print(f"💾 {recorder.report()}")
+        print(f"⏱ {face_tracker.report()}")
+        if detector.face_scaler is not None:
+            print(f"⏱ {detector.face_scaler.report()}")
+        if detector.prediction_cache is not None:
+            print(f"⏱ {detector.prediction_cache.report()}")
         print("🏁 Enhanced sleep detection system stopped")
 
 if __name__ == "__main__":
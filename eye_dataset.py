@@ -0,0 +1,182 @@
+"""
+Preprocessed, memory-mapped eye image datasets for training
+- Decodes and resizes every image of a closed/open folder once
+- Stores them as one contiguous uint8 (N, size, size, 1) .npy plus labels
+- A manifest of file names, sizes and mtimes rebuilds the cache when the
+  folder changes
+- stream_batches() shuffles and prepares float batches on a background
+  thread, so training never waits for JPEG decoding
+
+Usage:
+    python eye_dataset.py data/train data/valid
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from eye_inference import CLASS_NAMES, EYE_SIZE
+
+CACHE_VERSION = 1
+
+def cache_dir_for(data_dir, size=EYE_SIZE):
+    """Default cache location, kept outside the class folders: data/.cache/<split>_<size>"""
+    data_dir = os.path.normpath(data_dir)
+    return os.path.join(os.path.dirname(data_dir), '.cache', f"{os.path.basename(data_dir)}_{size}")
+
+def scan_files(data_dir):
+    """[relative path, bytes, mtime_ns] of every image, class by class in CLASS_NAMES order"""
+    files = []
+    for class_name in CLASS_NAMES:
+        class_dir = os.path.join(data_dir, class_name)
+        for name in sorted(os.listdir(class_dir)):
+            stat = os.stat(os.path.join(class_dir, name))
+            files.append([f"{class_name}/{name}", stat.st_size, stat.st_mtime_ns])
+    return files
+
+def _decode(path, size):
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    return cv2.resize(image, (size, size))
+
+def build_cache(data_dir, cache_dir=None, size=EYE_SIZE, workers=None):
+    """Decode every image of data_dir into cache_dir, returns the manifest"""
+    cache_dir = cache_dir or cache_dir_for(data_dir, size)
+    os.makedirs(cache_dir, exist_ok=True)
+    files = scan_files(data_dir)
+
+    # OpenCV releases the GIL while decoding, so threads are enough
+    paths = [os.path.join(data_dir, relpath) for relpath, _, _ in files]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        decoded = list(pool.map(lambda path: _decode(path, size), paths, chunksize=64))
+
+    keep = [i for i, image in enumerate(decoded) if image is not None]
+    # The manifest is written last, so an interrupted build is never mistaken for a valid cache
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    images = np.lib.format.open_memmap(os.path.join(cache_dir, 'images.npy'), mode='w+', dtype=np.uint8,
+                                       shape=(len(keep), size, size, 1))
+    for row, index in enumerate(keep):
+        images[row, :, :, 0] = decoded[index]
+    images.flush()
+    del images
+    labels = np.array([CLASS_NAMES.index(files[i][0].split('/')[0]) for i in keep], dtype=np.uint8)
+    np.save(os.path.join(cache_dir, 'labels.npy'), labels)
+
+    manifest = {
+        'version': CACHE_VERSION,
+        'size': size,
+        'classes': CLASS_NAMES,
+        'count': len(keep),
+        'skipped': [files[i][0] for i in range(len(files)) if decoded[i] is None],
+        'files': files,
+    }
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    return manifest
+
+def cache_is_valid(data_dir, cache_dir, size=EYE_SIZE):
+    """True if cache_dir holds a complete cache of the current data_dir contents"""
+    try:
+        with open(os.path.join(cache_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (manifest.get('version') == CACHE_VERSION and manifest.get('size') == size
+            and manifest.get('classes') == CLASS_NAMES and manifest.get('files') == scan_files(data_dir))
+
+def load_dataset(data_dir, cache_dir=None, size=EYE_SIZE, rebuild=False):
+    """Return (uint8 (N, size, size, 1) memory-mapped images, uint8 labels), building the cache if stale"""
+    cache_dir = cache_dir or cache_dir_for(data_dir, size)
+    if rebuild or not cache_is_valid(data_dir, cache_dir, size):
+        start = time.perf_counter()
+        manifest = build_cache(data_dir, cache_dir, size)
+        print(f"✓ Cached {manifest['count']} images from {data_dir} in {time.perf_counter() - start:.1f}s "
+              f"-> {cache_dir}")
+        if manifest['skipped']:
+            print(f"⚠ Warning: {len(manifest['skipped'])} unreadable image(s) skipped")
+    images = np.load(os.path.join(cache_dir, 'images.npy'), mmap_mode='r')
+    labels = np.load(os.path.join(cache_dir, 'labels.npy'))
+    return images, labels
+
+def stream_batches(images, labels, batch_size=32, shuffle=True, epochs=None, prefetch=4, seed=None,
+                   one_hot=True):
+    """Yield (float32 inputs scaled to 0..1, labels) batches prepared on a background thread
+
+    Runs for `epochs` passes (None = forever, as Keras expects with
+    steps_per_epoch) and reshuffles every pass. Labels are one-hot float32
+    for categorical cross-entropy unless one_hot=False.
+    """
+    batches = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    rng = np.random.default_rng(seed)
+    targets = np.eye(len(CLASS_NAMES), dtype=np.float32)[labels] if one_hot else np.asarray(labels)
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        epoch = 0
+        try:
+            while epochs is None or epoch < epochs:
+                order = rng.permutation(len(images)) if shuffle else np.arange(len(images))
+                for start in range(0, len(order), batch_size):
+                    # Sorted indices read the memory map front to back
+                    index = np.sort(order[start:start + batch_size])
+                    if not put((images[index].astype(np.float32) * (1 / 255), targets[index])):
+                        return
+                epoch += 1
+            put(None)
+        except Exception as e:
+            put(e)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+    finally:
+        stop.set()
+
+def steps_per_epoch(images, batch_size=32):
+    """Batches in one pass over a dataset (the last one may be short)"""
+    return -(-len(images) // batch_size)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the memory-mapped eye dataset caches")
+    parser.add_argument('data_dirs', nargs='+', help="Folders with closed/ and open/ eye images")
+    parser.add_argument('--size', type=int, default=EYE_SIZE, help="Side length the images are resized to")
+    parser.add_argument('--rebuild', action='store_true', help="Rebuild even if the manifest matches")
+    args = parser.parse_args()
+
+    for data_dir in args.data_dirs:
+        images, labels = load_dataset(data_dir, size=args.size, rebuild=args.rebuild)
+        counts = ', '.join(f"{name} {int((labels == i).sum())}" for i, name in enumerate(CLASS_NAMES))
+        print(f"📊 {data_dir}: {images.shape} uint8 ({images.nbytes / 1e6:.1f} MB) - {counts}")
+
+        start = time.perf_counter()
+        for _ in stream_batches(images, labels, epochs=1):
+            pass
+        print(f"⏱ One shuffled pass: {1000 * (time.perf_counter() - start):.1f} ms")
+
+if __name__ == "__main__":
+    main()
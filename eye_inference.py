@@ -0,0 +1,164 @@
+"""
+Eye state inference helpers shared by the sleep detection scripts
+- Converts eye crops into the 24x24 grayscale input the CNN was trained on
+- Classifies every eye crop of a frame in a single batched forward pass
+- EyeBatchBuffer preprocesses crops of the grayscale frame straight into a
+  preallocated float32 batch, without allocating per frame
+- Calls the model directly (compiled with tf.function when available)
+  instead of paying model.predict's per-call setup for tiny batches
+"""
+
+import os
+import cv2
+import numpy as np
+
+EYE_SIZE = 24
+CLASS_NAMES = ['closed', 'open']  # Alphabetical, same order flow_from_directory used in training
+
+def load_model_safe(model_path):
+    """Safely load Keras model with compatibility fixes"""
+    try:
+        import tensorflow as tf
+        return tf.keras.models.load_model(model_path)
+    except Exception as e1:
+        try:
+            from keras.models import load_model
+            return load_model(model_path, compile=False)
+        except Exception as e2:
+            try:
+                import tensorflow as tf
+                return tf.keras.models.load_model(model_path, compile=False)
+            except Exception as e3:
+                print(f"Failed to load model {model_path}: {e3}")
+                return None
+
+def preprocess_eye(frame, box):
+    """Crop an eye box from a BGR frame and turn it into a (24, 24, 1) CNN input"""
+    x, y, w, h = box
+    eye = frame[y:y+h, x:x+w]
+    eye = cv2.cvtColor(eye, cv2.COLOR_BGR2GRAY)
+    eye = cv2.resize(eye, (EYE_SIZE, EYE_SIZE))
+    eye = eye.astype(np.float32) / 255
+    return eye.reshape(EYE_SIZE, EYE_SIZE, -1)
+
+class EyeBatchBuffer:
+    """Preallocated float32 CNN input batch, refilled in place every frame
+
+    Crops come from the grayscale frame the cascades already ran on, are
+    resized into a reused uint8 scratch image, copied into the batch and
+    divided by 255 there in float32, giving exactly the inputs of
+    preprocess_eye. One buffer per stream: the returned batch is only
+    valid until the next fill().
+    """
+
+    def __init__(self, capacity=2, size=EYE_SIZE):
+        self.size = size
+        self.batch = np.empty((capacity, size, size, 1), dtype=np.float32)
+        self.planes = [self.batch[i, :, :, 0] for i in range(capacity)]
+        self.views = [self.batch[:n] for n in range(capacity + 1)]
+        self.resized = np.empty((size, size), dtype=np.uint8)
+        self.scale = np.float32(255)
+
+    def fill(self, gray, boxes):
+        """Preprocess eye boxes of a grayscale frame, returns an (len(boxes), size, size, 1) view"""
+        dsize = (self.size, self.size)
+        for plane, (x, y, w, h) in zip(self.planes, boxes):
+            cv2.resize(gray[y:y+h, x:x+w], dsize, dst=self.resized)
+            # Cast, then divide in place: a mixed-type divide would allocate a casting buffer
+            np.copyto(plane, self.resized)
+            np.divide(plane, self.scale, out=plane)
+        return self.views[len(boxes)]
+
+def load_eye_images(directory):
+    """Load a closed/open eye image folder as (float32 (N, 24, 24, 1) inputs, int labels)"""
+    images, labels = [], []
+    for label, class_name in enumerate(CLASS_NAMES):
+        class_dir = os.path.join(directory, class_name)
+        for name in sorted(os.listdir(class_dir)):
+            image = cv2.imread(os.path.join(class_dir, name), cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                continue
+            images.append(cv2.resize(image, (EYE_SIZE, EYE_SIZE)))
+            labels.append(label)
+    inputs = np.array(images, dtype=np.float32).reshape(-1, EYE_SIZE, EYE_SIZE, 1) / 255
+    return inputs, np.array(labels, dtype=np.int64)
+
+def make_batch_predictor(model):
+    """Build a callable mapping an (N, 24, 24, 1) batch to an (N, classes) array"""
+    warmup = np.zeros((1, EYE_SIZE, EYE_SIZE, 1), dtype=np.float32)
+
+    try:
+        import tensorflow as tf
+
+        compiled = tf.function(
+            lambda batch: model(batch, training=False),
+            input_signature=[tf.TensorSpec(shape=(None, EYE_SIZE, EYE_SIZE, 1), dtype=tf.float32)],
+        )
+
+        def predict_batch(batch):
+            return compiled(tf.convert_to_tensor(batch, dtype=tf.float32)).numpy()
+
+        # Trace once now so the first monitored frame doesn't pay for it
+        predict_batch(warmup)
+        return predict_batch
+    except Exception:
+        pass
+
+    def predict_batch(batch):
+        return np.asarray(model(batch.astype(np.float32), training=False))
+
+    return predict_batch
+
+def predict_first_eyes(predict_batch, frame, right_eye, left_eye, default, buffer=None):
+    """Classify the first right and first left eye of a frame in one CNN call
+
+    Returns (rpred, lpred) shaped like model.predict output for a single
+    crop; an eye that was not detected keeps `default`. With an
+    EyeBatchBuffer, `frame` is the grayscale frame and the crops are
+    preprocessed into the buffer.
+    """
+    boxes = []
+    if len(right_eye) > 0:
+        boxes.append(right_eye[0])
+    if len(left_eye) > 0:
+        boxes.append(left_eye[0])
+
+    rpred, lpred = default, default
+    if not boxes:
+        return rpred, lpred
+
+    if buffer is not None:
+        batch = buffer.fill(frame, boxes)
+    else:
+        batch = np.stack([preprocess_eye(frame, box) for box in boxes])
+    preds = predict_batch(batch)
+
+    index = 0
+    if len(right_eye) > 0:
+        rpred = preds[0:1]
+        index = 1
+    if len(left_eye) > 0:
+        lpred = preds[index:index+1]
+    return rpred, lpred
+
+def is_eye_closed(pred):
+    """Interpret a single-crop prediction the same way the detector loops do"""
+    try:
+        if len(pred) > 0:
+            if hasattr(pred[0], '__len__') and len(pred[0]) > 1:
+                return bool(pred[0][0] > pred[0][1])
+            return float(pred[0]) > 0.5
+    except:
+        pass
+    return False
+
+def closed_probability(pred):
+    """Closed-eye probability of a single-crop prediction (NaN if it has none)"""
+    try:
+        if len(pred) > 0:
+            if hasattr(pred[0], '__len__') and len(pred[0]) > 1:
+                return float(pred[0][0])
+            return float(pred[0])
+    except:
+        pass
+    return float('nan')
@@ -0,0 +1,172 @@
+"""
+Face tracking between periodic Haar detections
+- Runs a full face detection every K frames
+- Follows each face in between with a cheap tracker in a search window
+  around its last box (template matching or Lucas-Kanade optical flow)
+- Falls back to a full detection as soon as tracking confidence drops
+- Keeps per-mode timing so detection and tracking cost can be compared
+- Full detections can go through an AdaptiveDetectionScale (downscaled frames)
+"""
+
+import time
+import cv2
+import numpy as np
+from detection_pipeline import detect_faces, FACE_PARAMS
+
+TRACKERS = ('none', 'template', 'flow')
+TEMPLATE_WIDTH = 32     # Faces are matched at this width to keep matching cheap
+SEARCH_MARGIN = 0.5     # Search window padding as a fraction of the face size
+FLOW_MAX_POINTS = 30    # Corner features followed per face by the flow tracker
+FLOW_MAX_FB_ERROR = 2.0 # Forward-backward error (pixels) at which flow confidence reaches zero
+
+class FaceTracker:
+    """Follows faces between full detections and re-detects when confidence drops"""
+
+    def __init__(self, detect_interval=5, method='none', min_confidence=0.6, drop_lost=False):
+        if method not in TRACKERS:
+            raise ValueError(f"Unknown face tracker '{method}', expected one of {TRACKERS}")
+        self.detect_interval = max(1, int(detect_interval))
+        self.method = method
+        self.min_confidence = min_confidence
+        self.drop_lost = drop_lost
+        self.scaler = None  # Optional detection_pipeline.AdaptiveDetectionScale
+        self.reset()
+        # Per-mode [frames, total seconds]
+        self.costs = {'detect': [0, 0.0], 'track': [0, 0.0]}
+
+    def reset(self):
+        """Forget the tracked faces so the next frame runs a full detection"""
+        self.faces = np.empty((0, 4), dtype=np.int32)
+        self.templates = []
+        self.prev_gray = None
+        self.frames_since_detect = 0
+        self.confidence = 0.0
+
+    def update(self, gray, face_cascade, params=FACE_PARAMS):
+        """Return the face boxes for this frame, detecting or tracking as needed"""
+        start = time.perf_counter()
+        tracked = None
+        if (self.method != 'none' and len(self.faces) > 0
+                and self.frames_since_detect < self.detect_interval):
+            tracked = self._track(gray)
+
+        if tracked is not None:
+            mode = 'track'
+            self.faces = tracked
+            self.frames_since_detect += 1
+        else:
+            mode = 'detect'
+            self._detect(gray, face_cascade, params)
+
+        self.prev_gray = gray
+        cost = self.costs[mode]
+        cost[0] += 1
+        cost[1] += time.perf_counter() - start
+        return self.faces
+
+    def cost_summary(self):
+        """Return {mode: (frames, average ms per frame)} for detection and tracking"""
+        return {mode: (frames, 1000 * total / frames if frames else 0.0)
+                for mode, (frames, total) in self.costs.items()}
+
+    def report(self):
+        """Human readable per-mode cost line"""
+        parts = [f"{mode}: {frames} frames, {avg_ms:.2f} ms/frame"
+                 for mode, (frames, avg_ms) in self.cost_summary().items()]
+        return f"Face {self.method} tracker (every {self.detect_interval}) - " + ", ".join(parts)
+
+    def _detect(self, gray, face_cascade, params):
+        if self.scaler is not None:
+            faces = self.scaler.detect(gray, face_cascade, params)
+        else:
+            faces = detect_faces(gray, face_cascade, params=params)
+        self.faces = np.array(faces, dtype=np.int32).reshape(-1, 4)
+        self.frames_since_detect = 1
+        self.confidence = 1.0
+        if self.method == 'template':
+            self.templates = [self._make_template(gray, box) for box in self.faces]
+
+    def _track(self, gray):
+        """Track every face, or return None if any of them lost confidence
+
+        With drop_lost a face that lost confidence is dropped instead, and
+        only losing all of them forces a detection; with many faces in view
+        one of them is nearly always lost. Dropped faces that are still
+        there come back with the next periodic detection.
+        """
+        track_one = self._track_template if self.method == 'template' else self._track_flow
+        boxes = []
+        kept = []
+        confidence = 1.0
+        for index, box in enumerate(self.faces):
+            result = track_one(gray, index, box)
+            if result is None or result[1] < self.min_confidence:
+                if not self.drop_lost:
+                    return None
+                continue
+            new_box, box_confidence = result
+            confidence = min(confidence, box_confidence)
+            boxes.append(new_box)
+            kept.append(index)
+        if not boxes:
+            return None
+        if self.method == 'template' and len(kept) < len(self.faces):
+            self.templates = [self.templates[i] for i in kept]
+        self.confidence = confidence
+        return np.array(boxes, dtype=np.int32).reshape(-1, 4)
+
+    @staticmethod
+    def _search_window(gray, box):
+        x, y, w, h = box
+        mx, my = int(w * SEARCH_MARGIN), int(h * SEARCH_MARGIN)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(gray.shape[1], x + w + mx), min(gray.shape[0], y + h + my)
+        return x0, y0, x1, y1
+
+    @staticmethod
+    def _make_template(gray, box):
+        x, y, w, h = box
+        scale = TEMPLATE_WIDTH / float(w)
+        template = cv2.resize(gray[y:y+h, x:x+w], (TEMPLATE_WIDTH, max(1, int(round(h * scale)))))
+        return template, scale
+
+    def _track_template(self, gray, index, box):
+        template, scale = self.templates[index]
+        x0, y0, x1, y1 = self._search_window(gray, box)
+        search = cv2.resize(gray[y0:y1, x0:x1], (max(1, int(round((x1 - x0) * scale))),
+                                                 max(1, int(round((y1 - y0) * scale)))))
+        if search.shape[0] < template.shape[0] or search.shape[1] < template.shape[1]:
+            return None
+
+        scores = cv2.matchTemplate(search, template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        w, h = box[2], box[3]
+        new_box = (x0 + int(round(bx / scale)), y0 + int(round(by / scale)), w, h)
+        return new_box, best
+
+    def _track_flow(self, gray, index, box):
+        x, y, w, h = box
+        prev_roi = self.prev_gray[y:y+h, x:x+w]
+        points = cv2.goodFeaturesToTrack(prev_roi, maxCorners=FLOW_MAX_POINTS, qualityLevel=0.01, minDistance=5)
+        if points is None or len(points) < 4:
+            return None
+        points = points.astype(np.float32) + np.array([x, y], dtype=np.float32)
+
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, points, None,
+                                                    winSize=(15, 15), maxLevel=2)
+        # Track the points back again: points that really stayed on the face return where they started
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, moved, None,
+                                                        winSize=(15, 15), maxLevel=2)
+        fb_error = np.linalg.norm((back - points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < FLOW_MAX_FB_ERROR)
+        if good.sum() < 4:
+            return None
+
+        dx, dy = np.median((moved - points)[good].reshape(-1, 2), axis=0)
+        x0, y0, x1, y1 = self._search_window(gray, box)
+        new_x = int(np.clip(round(x + dx), x0, x1 - w))
+        new_y = int(np.clip(round(y + dy), y0, y1 - h))
+        # Confidence falls with the median forward-backward error of all the points, lost ones included
+        fb_error[~np.isfinite(fb_error) | (status.ravel() != 1) | (back_status.ravel() != 1)] = FLOW_MAX_FB_ERROR
+        confidence = max(0.0, 1.0 - float(np.median(fb_error)) / FLOW_MAX_FB_ERROR)
+        return (new_x, new_y, w, h), confidence
@@ -0,0 +1,186 @@
+"""
+Live detection metrics in the Prometheus text format
+- Counters, gauges and fixed-bucket latency histograms
+- Histogram buckets are allocated once, observing a value only bumps a slot
+- Optional local HTTP endpoint (standard library only) for scraping
+- StreamMetrics bundles the standard series of one monitored stream
+
+Usage:
+    registry = MetricsRegistry()
+    registry.serve(9100)          # then: curl http://127.0.0.1:9100/metrics
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Seconds, tuned for per-stage frame latencies (1 ms ... 2.5 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+STAGES = ('capture', 'cascades', 'cnn', 'render')
+ALARM_KINDS = ('drowsiness', 'absence')
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+class Counter:
+    """Monotonically increasing value"""
+    kind = 'counter'
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name):
+        yield f"{name}{_label_text(self.labels)} {self.value}"
+
+class Gauge:
+    """Value that can go up and down"""
+    kind = 'gauge'
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name):
+        yield f"{name}{_label_text(self.labels)} {self.value}"
+
+class Histogram:
+    """Latency histogram with buckets fixed and allocated at creation"""
+    kind = 'histogram'
+
+    def __init__(self, labels, buckets=LATENCY_BUCKETS):
+        self.labels = labels
+        self.bounds = tuple(buckets)
+        # One slot per bound plus +Inf; cumulative counts are only built when scraped
+        self.counts = np.zeros(len(self.bounds) + 1, dtype=np.int64)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def samples(self, name):
+        cumulative = np.cumsum(self.counts)
+        for bound, count in zip(self.bounds + ('+Inf',), cumulative):
+            labels = dict(self.labels, le=bound)
+            yield f"{name}_bucket{_label_text(labels)} {count}"
+        yield f"{name}_sum{_label_text(self.labels)} {self.sum}"
+        yield f"{name}_count{_label_text(self.labels)} {cumulative[-1]}"
+
+class MetricsRegistry:
+    """Holds every metric series and renders them for scraping"""
+
+    def __init__(self):
+        self.families = {}  # name -> (help, kind, {label tuple: metric})
+        self.lock = threading.Lock()
+        self.server = None
+
+    def _get(self, cls, name, help_text, labels, *args):
+        labels = dict(labels or {})
+        with self.lock:
+            family = self.families.setdefault(name, (help_text, cls.kind, {}))
+            if family[1] != cls.kind:
+                raise ValueError(f"Metric {name} is already registered as a {family[1]}")
+            key = tuple(sorted(labels.items()))
+            if key not in family[2]:
+                family[2][key] = cls(labels, *args)
+            return family[2][key]
+
+    def counter(self, name, help_text, labels=None):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=None):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=None, buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, labels, buckets)
+
+    def render(self):
+        """Prometheus text exposition of every registered series"""
+        lines = []
+        with self.lock:
+            families = [(name, help_text, kind, list(series.values()))
+                        for name, (help_text, kind, series) in self.families.items()]
+        for name, help_text, kind, series in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in series:
+                lines.extend(metric.samples(name))
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve /metrics from a daemon thread, returns the HTTP server"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+class StreamMetrics:
+    """The standard detection-loop series of one stream, created up front"""
+
+    def __init__(self, registry, stream='main'):
+        labels = {'stream': stream}
+        self.frames = registry.counter('sleep_frames_processed_total', "Frames run through detection", labels)
+        self.dropped = registry.counter('sleep_frames_dropped_total', "Frames skipped because processing fell behind", labels)
+        self.skipped = registry.counter('sleep_frames_scheduled_skip_total',
+                                        "Frames the analysis scheduler left out on a calm stream", labels)
+        self.stages = {
+            stage: registry.histogram('sleep_stage_latency_seconds', "Per-stage frame latency",
+                                      dict(labels, stage=stage))
+            for stage in STAGES
+        }
+        self.detect_scale = registry.gauge('sleep_face_detect_scale', "Downscale factor of the last face detection", labels)
+        self.detect_saved = registry.counter('sleep_face_detect_saved_seconds_total',
+                                             "Estimated face detection time saved by downscaling", labels)
+        self.detect_scale.set(1.0)
+        self.cache_hits = registry.counter('sleep_eye_cache_hits_total',
+                                           "Eye crops answered from the prediction cache", labels)
+        self.cache_misses = registry.counter('sleep_eye_cache_misses_total',
+                                             "Eye crops that went through the CNN with the cache enabled", labels)
+        self.drowsiness = registry.gauge('sleep_drowsiness_score', "Current drowsiness score", labels)
+        self.absence = registry.gauge('sleep_absence_seconds', "Current eye absence counter in seconds", labels)
+        self.alarms = {
+            kind: registry.counter('sleep_alarms_total', "Alarms raised", dict(labels, kind=kind))
+            for kind in ALARM_KINDS
+        }
+
+    def observe_result(self, result):
+        """Record the FrameResult of one analyzed frame"""
+        self.frames.inc()
+        self.drowsiness.set(result.drowsiness_score)
+        self.absence.set(result.absence_counter)
+        if result.alarm is not None:
+            self.alarms[result.alarm].inc()
@@ -0,0 +1,368 @@
+"""
+Multi-Camera Sleep Monitoring from a Single Process
+- Monitors N capture sources (webcam indices, video files or stream URLs)
+- Loads the eye CNN once and shares it between all streams
+- Keeps separate drowsiness/absence state for every stream
+- Spreads detection over a worker thread pool (OpenCV releases the GIL),
+  one SleepDetector with its own cascades per stream
+- Batches eye crops from all streams into shared CNN calls
+- Reports per-stream FPS and latency so you can size a monitoring box
+- Optionally analyzes calm streams at a reduced rate to host more of them
+- Optionally serves per-stream Prometheus metrics over HTTP
+- Alarms go to background sinks (sound, JSON lines log, webhook), so a
+  slow sink never holds up the result loop
+- Optionally records every frame's result per stream (session_recorder.py)
+
+Usage:
+    python multi_camera_monitor.py 0 1 rtsp://room3/stream --workers 4
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from detection_pipeline import (
+    load_cascades, load_eye_predictor, SleepDetector,
+    DROWSINESS_THRESHOLD, ABSENCE_THRESHOLD, BACKENDS, DEFAULT_CAMERA_SETUP,
+)
+from face_tracker import FaceTracker, TRACKERS
+from analysis_scheduler import make_scheduler
+from prediction_cache import PredictionCache
+from alerts import build_dispatcher, alert_event
+from session_recorder import SessionRecorder
+from metrics import MetricsRegistry, StreamMetrics
+
+class EyeBatcher:
+    """Collects eye crops from all streams and classifies them in shared CNN calls"""
+
+    def __init__(self, predict_batch, max_batch=32, max_wait=0.004):
+        self.predict_batch = predict_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.calls = 0
+        self.crops = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def __call__(self, batch):
+        """Classify a batch of crops, blocking until the shared call has run"""
+        future = Future()
+        self.requests.put((batch, future))
+        return future.result()
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            pending = [request]
+            size = len(request[0])
+
+            # Give the other streams a moment to add their crops
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)
+                    break
+                pending.append(request)
+                size += len(request[0])
+
+            batch = np.concatenate([crops for crops, _ in pending])
+            try:
+                preds = self.predict_batch(batch)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            self.calls += 1
+            self.crops += len(batch)
+            start = 0
+            for crops, future in pending:
+                future.set_result(preds[start:start + len(crops)])
+                start += len(crops)
+
+class CameraStream:
+    """Capture thread that always keeps only the newest frame of one source"""
+
+    def __init__(self, name, source, metrics=None):
+        self.name = name
+        self.source = source
+        self.metrics = metrics
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open capture source {source}")
+
+        # Files are played back at their own frame rate, live sources as fast as they deliver
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+        self.frame_interval = 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or 30.0) if self.is_file else 0.0
+
+        self.lock = threading.Lock()
+        self.frame = None
+        self.frame_time = 0.0
+        self.frame_id = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running:
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if self.metrics is not None:
+                self.metrics.stages['capture'].observe(time.perf_counter() - start)
+            if not ret:
+                break
+            with self.lock:
+                self.frame = frame
+                self.frame_time = time.perf_counter()
+                self.frame_id += 1
+            if self.frame_interval:
+                time.sleep(self.frame_interval)
+        self.running = False
+
+    def latest(self):
+        """Return (frame_id, frame, capture_time) of the newest frame"""
+        with self.lock:
+            return self.frame_id, self.frame, self.frame_time
+
+    def release(self):
+        self.running = False
+        self.thread.join(timeout=1)
+        self.cap.release()
+
+def new_stream_stats():
+    """Create the per-stream throughput/latency counters for one report window"""
+    return {'frames': 0, 'latencies': [], 'window_start': time.perf_counter()}
+
+def parse_source(source):
+    """Treat plain integers as webcam indices"""
+    return int(source) if source.isdigit() else source
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor several cameras with one shared model")
+    parser.add_argument('sources', nargs='+', help="Webcam indices, video files or stream URLs")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help="Detection worker threads")
+    parser.add_argument('--report-interval', type=float, default=5.0, help="Seconds between stats reports")
+    parser.add_argument('--max-batch', type=int, default=32, help="Max eye crops per shared CNN call")
+    parser.add_argument('--no-ml', action='store_true', help="Skip the CNN and use eye-count detection")
+    parser.add_argument('--backend', choices=BACKENDS, default='auto',
+                        help="CNN runtime: keras (.h5), numpy (.npz, no TensorFlow), int8 (.int8.npz) or auto")
+    parser.add_argument('--full-frame-eyes', action='store_true', help="Scan the whole frame for eyes (old behavior)")
+    parser.add_argument('--face-tracker', choices=TRACKERS, default='none',
+                        help="Follow faces between detections ('none' detects every frame)")
+    parser.add_argument('--face-detect-interval', type=int, default=5, help="Frames between full face detections")
+    parser.add_argument('--full-res-faces', action='store_true',
+                        help="Detect faces at full resolution instead of an adaptively downscaled frame")
+    parser.add_argument('--idle-interval', type=int, default=1,
+                        help="Analyze every Nth frame of a stream while the student looks awake (1 = every frame)")
+    parser.add_argument('--cpu-budget', type=float,
+                        help="Fraction of a CPU core each calm stream may spend on analysis, e.g. 0.25")
+    parser.add_argument('--prediction-cache', type=int, default=0, metavar='N',
+                        help="Reuse CNN results of each stream's N most recent near-identical eye crops (0 = off)")
+    parser.add_argument('--drowsiness-threshold', type=float, default=DROWSINESS_THRESHOLD,
+                        help="Seconds of closed eyes (at sensitivity 1) before the drowsiness alarm")
+    parser.add_argument('--absence-threshold', type=float, default=ABSENCE_THRESHOLD,
+                        help="Seconds without detected eyes before the absence alarm")
+    parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on this local port")
+    parser.add_argument('--camera-setup', nargs='+', default=[DEFAULT_CAMERA_SETUP],
+                        help="Cascade settings tuned for this camera setup in cascade_config.json (tune_cascades.py), "
+                             "one for every source or one per source")
+    parser.add_argument('--alert-log', metavar='PATH', help="Append alarms as JSON lines to this file")
+    parser.add_argument('--alert-webhook', metavar='URL', help="POST batched alarms as JSON to this collector")
+    parser.add_argument('--webhook-cooldown', type=float, default=30.0,
+                        help="Seconds between webhook alerts of the same kind for one stream")
+    parser.add_argument('--record', metavar='DIR', help="Record every frame's result per stream under this folder")
+    args = parser.parse_args()
+    camera_setups = args.camera_setup * len(args.sources) if len(args.camera_setup) == 1 else args.camera_setup
+    if len(camera_setups) != len(args.sources):
+        parser.error(f"--camera-setup needs one setup or {len(args.sources)}, got {len(args.camera_setup)}")
+
+    try:
+        load_cascades(camera_setups[0])
+        print("✓ Haar cascade classifiers loaded successfully")
+    except Exception as e:
+        print(f"❌ Error loading Haar cascades: {e}")
+        return
+
+    batcher = None
+    if not args.no_ml:
+        predict_batch, model_path = load_eye_predictor(backend=args.backend)
+        if predict_batch is None:
+            print("❌ No models could be loaded. Using simple eye detection without ML.")
+        else:
+            batcher = EyeBatcher(predict_batch, max_batch=args.max_batch)
+            print(f"✓ Model loaded successfully: {model_path} (shared by all streams)")
+
+    # Load the alarm sounds once for every stream
+    drowsy_sound = absence_sound = None
+    try:
+        from enhanced_sleep_detection_with_absence import load_alarm_sounds
+        drowsy_sound, absence_sound = load_alarm_sounds()
+    except Exception as e:
+        print(f"⚠ Warning: Could not load alarm sounds - {e}")
+    alerts = build_dispatcher({'drowsiness': drowsy_sound, 'absence': absence_sound}, args.alert_log,
+                              args.alert_webhook, webhook_cooldown=args.webhook_cooldown)
+
+    registry = MetricsRegistry()
+    if args.metrics_port is not None:
+        try:
+            registry.serve(args.metrics_port)
+            print(f"📊 Metrics available at http://127.0.0.1:{args.metrics_port}/metrics")
+        except OSError as e:
+            print(f"⚠ Warning: Could not start metrics endpoint - {e}")
+
+    streams = []
+    stream_metrics = {}
+    stream_setups = {}
+    for index, source in enumerate(args.sources):
+        name = f"cam{index}"
+        stream_metrics[name] = StreamMetrics(registry, name)
+        stream_setups[name] = camera_setups[index]
+        try:
+            streams.append(CameraStream(name, parse_source(source), stream_metrics[name]))
+            print(f"✓ {name}: opened {source}")
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+    if not streams:
+        return
+
+    # Cascade evaluators keep per-image state, so every stream gets its own copy; with only one
+    # frame in flight per stream no two workers ever share one
+    detectors = {
+        s.name: SleepDetector(load_cascades(stream_setups[s.name]), batcher,
+                              FaceTracker(args.face_detect_interval, args.face_tracker),
+                              args.drowsiness_threshold, args.absence_threshold,
+                              full_frame_eyes=args.full_frame_eyes, metrics=stream_metrics[s.name],
+                              adaptive_scale=not args.full_res_faces,
+                              scheduler=make_scheduler(args.idle_interval, args.cpu_budget),
+                              prediction_cache=PredictionCache(args.prediction_cache) if args.prediction_cache else None)
+        for s in streams
+    }
+    session = time.strftime('%Y%m%d-%H%M%S')
+    recorders = {s.name: SessionRecorder(args.record, s.name, session=session,
+                                         metadata={'source': s.source})
+                 for s in streams} if args.record else {}
+    stats = {s.name: new_stream_stats() for s in streams}
+    pending = {}
+    last_seen = {s.name: 0 for s in streams}
+
+    def process(stream, frame, capture_time):
+        # Score on the stream's capture time, not on when a worker picked the frame up
+        timestamp = time.time() - (time.perf_counter() - capture_time)
+        result = detectors[stream.name].process(frame, timestamp)
+        # One frame in flight per stream, so every recorder is only ever written by one worker at a time
+        if recorders:
+            recorders[stream.name].record(result, timestamp)
+        return result, time.perf_counter() - capture_time
+
+    print(f"\n🚀 Monitoring {len(streams)} stream(s) with {args.workers} worker(s)")
+    print("🔴 Press Ctrl+C to quit")
+    print("-" * 50)
+
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    last_report = time.perf_counter()
+    try:
+        while any(s.running for s in streams) or pending:
+            idle = True
+            for stream in streams:
+                # Collect the finished frame of this stream
+                future = pending.get(stream.name)
+                if future is not None:
+                    if not future.done():
+                        continue
+                    del pending[stream.name]
+                    try:
+                        result, latency = future.result()
+                    except Exception as e:
+                        print(f"❌ {stream.name}: detection error {e}")
+                        continue
+                    stats[stream.name]['frames'] += 1
+                    stats[stream.name]['latencies'].append(latency)
+                    if result.alarm == 'drowsiness':
+                        print(f"🚨 {stream.name}: DROWSINESS DETECTED! (score {result.drowsiness_score:.1f})")
+                    elif result.alarm == 'absence':
+                        print(f"🔵 {stream.name}: EYES NOT DETECTED! (absent {result.absence_counter:.1f}s)")
+                    if result.alarm:
+                        alerts.dispatch(alert_event(result.alarm, stream.name, result))
+
+                # One frame in flight per stream keeps its state updates in order
+                frame_id, frame, capture_time = stream.latest()
+                if frame is not None and frame_id != last_seen[stream.name]:
+                    # Frames overwritten while the previous one was processed never get analyzed
+                    stream_metrics[stream.name].dropped.inc(frame_id - last_seen[stream.name] - 1)
+                    last_seen[stream.name] = frame_id
+                    pending[stream.name] = pool.submit(process, stream, frame, capture_time)
+                    idle = False
+
+            now = time.perf_counter()
+            if now - last_report >= args.report_interval:
+                report(streams, stats, detectors, batcher)
+                last_report = now
+
+            if idle:
+                time.sleep(0.002)
+
+    except KeyboardInterrupt:
+        print("\n⏹ Monitoring stopped by user")
+    finally:
+        pool.shutdown(wait=True)
+        for stream in streams:
+            stream.release()
+        if batcher is not None:
+            batcher.close()
+        registry.close()
+        alerts.close()
+        for recorder in recorders.values():
+            recorder.close()
+        report(streams, stats, detectors, batcher)
+        print(f"   🔔 {alerts.report()}")
+        for recorder in recorders.values():
+            print(f"   💾 {recorder.report()}")
+        for stream in streams:
+            detector = detectors[stream.name]
+            print(f"   ⏱ {stream.name}: {detector.face_tracker.report()}")
+            if detector.face_scaler is not None:
+                print(f"   ⏱ {stream.name}: {detector.face_scaler.report()}")
+            if detector.scheduler is not None:
+                print(f"   ⏱ {stream.name}: {detector.scheduler.report()}")
+            if detector.prediction_cache is not None:
+                print(f"   ⏱ {stream.name}: {detector.prediction_cache.report()}")
+        print("🏁 Multi-camera monitoring stopped")
+
+def report(streams, stats, detectors, batcher):
+    """Print per-stream FPS and latency for the last window, then reset it"""
+    now = time.perf_counter()
+    print(f"\n📊 {'stream':<8} {'fps':>6} {'lat avg':>9} {'lat p95':>9} {'score':>6} {'absence':>8}")
+    for stream in streams:
+        window = stats[stream.name]
+        elapsed = max(now - window['window_start'], 1e-6)
+        latencies = window['latencies']
+        mean_ms = 1000 * np.mean(latencies) if latencies else 0.0
+        p95_ms = 1000 * np.percentile(latencies, 95) if latencies else 0.0
+        state = detectors[stream.name].state
+        print(f"   {stream.name:<8} {window['frames'] / elapsed:6.1f} {mean_ms:7.1f}ms {p95_ms:7.1f}ms "
+              f"{state['drowsiness_score']:6.1f} {state['absence_counter']:7.1f}s")
+        stats[stream.name] = new_stream_stats()
+    if batcher is not None and batcher.calls:
+        print(f"   🧠 shared CNN calls: {batcher.calls}, avg crops per call: {batcher.crops / batcher.calls:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Helpers for preallocated .npy files
+- Arrays written through np.lib.format.open_memmap with a generous first
+  axis can be cut down to the rows actually filled, in place
+- The file stays a plain .npy that np.load() reads (and memory-maps)
+
+Usage:
+    rows = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(capacity,))
+    ...
+    rows.flush()
+    rows = None
+    truncate_npy(path, count)
+"""
+
+import numpy as np
+
+def truncate_npy(path, count):
+    """Rewrite an .npy header to hold `count` rows along the first axis and cut off the rest of the file"""
+    with open(path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+            write_header = np.lib.format.write_array_header_1_0
+        elif version == (2, 0):
+            shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+            write_header = np.lib.format.write_array_header_2_0
+        else:
+            raise ValueError(f"Unsupported .npy version {version} in {path}")
+        offset = f.tell()
+
+        # NumPy pads the header for a growing first axis, so the new one has the same length
+        f.seek(0)
+        write_header(f, {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False,
+                         'shape': (count,) + shape[1:]})
+        if f.tell() != offset:
+            raise ValueError(f"Header of {path} changed length, the file was not truncated")
+        f.truncate(offset + count * int(np.prod(shape[1:])) * dtype.itemsize)
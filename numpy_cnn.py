@@ -0,0 +1,264 @@
+"""
+TensorFlow-free NumPy inference engine for the eye CNN
+- Exports the weights of a Keras .h5 eye classifier to a compact .npz file
+- Runs the exported network with batched im2col + matmul convolutions
+  (depthwise-separable convolutions as shifted multiply-adds + a 1x1 matmul)
+- Only needs NumPy at runtime, so low-end machines skip the TensorFlow import
+- Also runs int8 quantized exports written by quantize_cnn.py
+
+Usage:
+    python numpy_cnn.py models/cnn_eye_classification.h5 --verify data/valid
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+def _activation(name, x):
+    if name == 'relu':
+        return np.maximum(x, 0, out=x)
+    if name == 'softmax':
+        x = x - x.max(axis=-1, keepdims=True)
+        np.exp(x, out=x)
+        x /= x.sum(axis=-1, keepdims=True)
+        return x
+    if name == 'sigmoid':
+        return 1 / (1 + np.exp(-x))
+    if name in ('linear', None):
+        return x
+    raise ValueError(f"Unsupported activation '{name}'")
+
+def _quantize(x, scale):
+    """Round activations onto the int8 grid of a calibrated scale (kept as float32 for BLAS)"""
+    q = np.rint(x / scale).astype(np.float32, copy=False)
+    return np.clip(q, -127, 127, out=q)
+
+def _conv2d(x, kernel, strides, padding):
+    """Channels-last 2D convolution as a single im2col matmul over the whole batch"""
+    kh, kw, channels, filters = kernel.shape
+    if padding == 'same':
+        ph, pw = kh - 1, kw - 1
+        x = np.pad(x, ((0, 0), (ph // 2, ph - ph // 2), (pw // 2, pw - pw // 2), (0, 0)))
+
+    # (N, Ho, Wo, C, kh, kw) view -> (N*Ho*Wo, kh*kw*C) rows in Keras kernel order
+    windows = np.lib.stride_tricks.sliding_window_view(x, (kh, kw), axis=(1, 2))
+    windows = windows[:, ::strides[0], ::strides[1]]
+    n, out_h, out_w = windows.shape[:3]
+    columns = windows.transpose(0, 1, 2, 4, 5, 3).reshape(n * out_h * out_w, kh * kw * channels)
+
+    out = columns @ kernel.reshape(kh * kw * channels, filters)
+    return out.reshape(n, out_h, out_w, filters)
+
+def _depthwise_conv2d(x, kernel, strides, padding):
+    """Channels-last depthwise 2D convolution (depth multiplier 1), one shifted multiply-add per tap"""
+    kh, kw = kernel.shape[:2]
+    if padding == 'same':
+        ph, pw = kh - 1, kw - 1
+        x = np.pad(x, ((0, 0), (ph // 2, ph - ph // 2), (pw // 2, pw - pw // 2), (0, 0)))
+    sh, sw = strides
+    out_h = (x.shape[1] - kh) // sh + 1
+    out_w = (x.shape[2] - kw) // sw + 1
+    out = np.zeros((len(x), out_h, out_w, x.shape[3]), dtype=np.float32)
+    for i in range(kh):
+        for j in range(kw):
+            out += x[:, i:i + sh * (out_h - 1) + 1:sh, j:j + sw * (out_w - 1) + 1:sw] * kernel[i, j, :, 0]
+    return out
+
+def _max_pool(x, pool_size, strides):
+    ph, pw = pool_size
+    if (ph, pw) == (1, 1) and tuple(strides) == (1, 1):
+        return x
+    if tuple(strides) == (ph, pw):
+        # Non-overlapping pooling is a reshape + max
+        n, h, w, c = x.shape
+        x = x[:, :h - h % ph, :w - w % pw]
+        return x.reshape(n, h // ph, ph, w // pw, pw, c).max(axis=(2, 4))
+    windows = np.lib.stride_tricks.sliding_window_view(x, (ph, pw), axis=(1, 2))
+    return windows[:, ::strides[0], ::strides[1]].max(axis=(-2, -1))
+
+class NumpyCNN:
+    """Batched forward pass of an exported eye classifier using only NumPy
+
+    Layers with an `input_scale` are int8 quantized: their inputs are rounded
+    onto the int8 grid and multiplied with the integer kernel, and the result
+    is rescaled per output channel. The kernels stay int8 in memory; NumPy
+    has no int8 GEMM, so each one is widened to float32 only for its own
+    matmul to keep it on BLAS.
+    """
+
+    def __init__(self, layers, input_shape):
+        self.layers = layers
+        self.input_shape = tuple(input_shape)
+
+    @classmethod
+    def load(cls, path):
+        """Load an engine from an .npz file written by export_npz"""
+        with np.load(path, allow_pickle=False) as data:
+            spec = json.loads(str(data['architecture']))
+            if spec.get('format_version') != FORMAT_VERSION:
+                raise ValueError(f"{path} was exported with an unsupported format version")
+            layers = []
+            for index, layer in enumerate(spec['layers']):
+                layer = dict(layer)
+                for name in layer.pop('weights', []):
+                    value = data[f"layer{index}_{name}"]
+                    layer[name] = value if value.dtype == np.int8 else value.astype(np.float32)
+                if 'input_scale' in layer:
+                    layer['output_scale'] = (layer['input_scale'] * layer.pop('kernel_scale')).astype(np.float32)
+                layers.append(layer)
+        return cls(layers, spec['input_shape'])
+
+    def save(self, path):
+        """Write the engine to an .npz file, array entries of a layer become its weights"""
+        arrays = {}
+        layers = []
+        for index, layer in enumerate(self.layers):
+            spec = {}
+            for name, value in layer.items():
+                if isinstance(value, np.ndarray):
+                    spec.setdefault('weights', []).append(name)
+                    arrays[f"layer{index}_{name}"] = value
+                else:
+                    spec[name] = value
+            layers.append(spec)
+
+        architecture = {
+            'format_version': FORMAT_VERSION,
+            'input_shape': list(self.input_shape),
+            'layers': layers,
+        }
+        np.savez_compressed(path, architecture=np.array(json.dumps(architecture)), **arrays)
+
+    def run_layer(self, layer, x):
+        """Apply a single layer to a float32 batch"""
+        kind = layer['type']
+        if kind in ('Conv2D', 'Dense'):
+            kernel = layer['kernel']
+            if 'input_scale' in layer:
+                x = _quantize(x, layer['input_scale'])
+                kernel = kernel.astype(np.float32)
+            if kind == 'Conv2D':
+                out = _conv2d(x, kernel, layer['strides'], layer['padding'])
+            else:
+                out = x @ kernel
+            if 'output_scale' in layer:
+                out *= layer['output_scale']
+            out += layer['bias']
+            return _activation(layer['activation'], out)
+        if kind == 'SeparableConv2D':
+            out = _depthwise_conv2d(x, layer['depthwise_kernel'], layer['strides'], layer['padding'])
+            n, h, w, channels = out.shape
+            out = (out.reshape(n * h * w, channels) @ layer['pointwise_kernel'][0, 0]).reshape(n, h, w, -1)
+            out += layer['bias']
+            return _activation(layer['activation'], out)
+        if kind == 'MaxPooling2D':
+            return _max_pool(x, layer['pool_size'], layer['strides'])
+        if kind == 'Flatten':
+            return x.reshape(len(x), -1)
+        if kind == 'Dropout':
+            return x
+        raise ValueError(f"Unsupported layer type '{kind}'")
+
+    def predict(self, batch):
+        """Map an (N, H, W, C) batch to an (N, classes) float32 probability array"""
+        x = np.asarray(batch, dtype=np.float32)
+        for layer in self.layers:
+            x = self.run_layer(layer, x)
+        return x
+
+    __call__ = predict
+
+def from_keras(model):
+    """Build a float32 engine from the weights and layer configuration of a Keras model"""
+    layers = []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        config = layer.get_config()
+        spec = {'type': kind}
+        if kind in ('Conv2D', 'SeparableConv2D'):
+            spec.update(strides=list(config['strides']), padding=config['padding'], activation=config['activation'])
+            if kind == 'SeparableConv2D' and config['depth_multiplier'] != 1:
+                raise ValueError(f"Layer {layer.name}: only depth_multiplier=1 is supported by the NumPy engine")
+        elif kind == 'MaxPooling2D':
+            spec.update(pool_size=list(config['pool_size']), strides=list(config['strides'] or config['pool_size']))
+        elif kind == 'Dense':
+            spec.update(activation=config['activation'])
+        elif kind not in ('Flatten', 'Dropout', 'InputLayer'):
+            raise ValueError(f"Layer {layer.name} ({kind}) is not supported by the NumPy engine")
+        if kind == 'InputLayer':
+            continue
+
+        weights = layer.get_weights()
+        if kind == 'SeparableConv2D':
+            spec['depthwise_kernel'] = weights[0].astype(np.float32)
+            spec['pointwise_kernel'] = weights[1].astype(np.float32)
+            spec['bias'] = weights[2].astype(np.float32)
+        elif weights:
+            spec['kernel'] = weights[0].astype(np.float32)
+            spec['bias'] = weights[1].astype(np.float32)
+        layers.append(spec)
+    return NumpyCNN(layers, model.input_shape[1:])
+
+def export_npz(model, path):
+    """Write the weights and layer configuration of a Keras model to an .npz file"""
+    from_keras(model).save(path)
+
+def npz_path_for(model_path):
+    """Default .npz location next to an .h5 model"""
+    return os.path.splitext(model_path)[0] + '.npz'
+
+def verify(model, engine, data_dir, atol):
+    """Compare Keras and NumPy outputs on an eye dataset, returns True within tolerance"""
+    from eye_inference import load_eye_images
+
+    inputs, labels = load_eye_images(data_dir)
+    start = time.perf_counter()
+    keras_out = np.asarray(model(inputs, training=False))
+    keras_time = time.perf_counter() - start
+    start = time.perf_counter()
+    numpy_out = engine.predict(inputs)
+    numpy_time = time.perf_counter() - start
+
+    max_diff = float(np.abs(keras_out - numpy_out).max())
+    agreement = float((keras_out.argmax(axis=1) == numpy_out.argmax(axis=1)).mean())
+    keras_acc = float((keras_out.argmax(axis=1) == labels).mean())
+    numpy_acc = float((numpy_out.argmax(axis=1) == labels).mean())
+    print(f"📊 {len(inputs)} images from {data_dir}")
+    print(f"   max |keras - numpy| = {max_diff:.2e} (tolerance {atol:.0e})")
+    print(f"   class agreement {agreement:.2%}, accuracy keras {keras_acc:.2%} / numpy {numpy_acc:.2%}")
+    print(f"   batch time keras {keras_time * 1000:.1f} ms / numpy {numpy_time * 1000:.1f} ms")
+    return max_diff <= atol
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a Keras eye CNN to the NumPy .npz format")
+    parser.add_argument('model', help="Keras .h5 model to export")
+    parser.add_argument('-o', '--output', help="Output .npz path (default: next to the model)")
+    parser.add_argument('--verify', metavar='DATA_DIR', help="Compare outputs on an eye dataset, e.g. data/valid")
+    parser.add_argument('--atol', type=float, default=1e-4, help="Max allowed absolute output difference")
+    args = parser.parse_args()
+
+    from eye_inference import load_model_safe
+
+    model = load_model_safe(args.model)
+    if model is None:
+        print(f"❌ Could not load {args.model}")
+        raise SystemExit(1)
+
+    output = args.output or npz_path_for(args.model)
+    export_npz(model, output)
+    print(f"✓ Exported {args.model} -> {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+
+    if args.verify:
+        if verify(model, NumpyCNN.load(output), args.verify, args.atol):
+            print("✅ NumPy engine matches Keras within tolerance")
+        else:
+            print("❌ NumPy engine output differs from Keras")
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Pipelined Student Sleep Detection
+- Capture, detection/inference and rendering run as separate stages
+- Stages are linked by bounded queues that drop the oldest frame when full,
+  so a slow CNN never backs up the camera buffer with stale frames
+- Alarms are dispatched from the detection stage on the freshest frame available,
+  audio, log and webhook delivery run on background threads (alerts.py)
+- Same pause/sensitivity controls as enhanced_sleep_detection_with_absence.py
+- Optional Prometheus metrics endpoint with per-stage latency histograms
+"""
+
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+from detection_pipeline import load_cascades, BackgroundModelLoader, SleepDetector
+from enhanced_sleep_detection_with_absence import (
+    render, mouse_callback, load_alarm_sounds, open_webcam, UIPanel, BUTTONS,
+)
+from face_tracker import FaceTracker
+from prediction_cache import PredictionCache
+from alerts import build_dispatcher, alert_event
+from session_recorder import SessionRecorder
+from metrics import MetricsRegistry, StreamMetrics
+
+class DropOldestQueue:
+    """Bounded queue that discards its oldest item instead of blocking the producer"""
+
+    def __init__(self, maxsize, dropped_counter=None):
+        self.items = collections.deque(maxlen=maxsize)
+        self.cond = threading.Condition()
+        self.dropped = 0
+        self.dropped_counter = dropped_counter
+
+    def put(self, item):
+        with self.cond:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+                if self.dropped_counter is not None:
+                    self.dropped_counter.inc()
+            self.items.append(item)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """Return the oldest queued item, or None if nothing arrived in time"""
+        with self.cond:
+            if not self.items:
+                self.cond.wait(timeout)
+            return self.items.popleft() if self.items else None
+
+def capture_stage(cap, frames, stop, counters, metrics):
+    """Read frames as fast as the camera delivers them"""
+    capture_latency = metrics.stages['capture']
+    while not stop.is_set():
+        start = time.perf_counter()
+        ret, frame = cap.read()
+        capture_latency.observe(time.perf_counter() - start)
+        if not ret:
+            print("❌ Error reading frame from webcam")
+            stop.set()
+            break
+        counters['captured'] += 1
+        frames.put((frame, time.perf_counter()))
+
+def detection_stage(frames, results, detector, model_loader, alerts, recorder, stop, counters):
+    """Run detection, CNN and scoring, and dispatch alarms straight from fresh frames"""
+    model_announced = False
+    while not stop.is_set():
+        item = frames.get(timeout=0.1)
+        if item is None:
+            continue
+        frame, capture_time = item
+
+        # Eye-count detection runs until the background loader publishes the CNN
+        detector.predict_batch = model_loader.predict_batch
+        if model_loader.ready.is_set() and not model_announced:
+            model_announced = True
+            if detector.predict_batch is None:
+                print("❌ No models could be loaded. Using simple eye detection without ML.")
+            else:
+                print(f"✓ Model loaded successfully: {model_loader.model_path} "
+                      f"({model_loader.load_seconds:.1f}s), switching to AI detection")
+
+        result = None
+        if detector.state['paused']:
+            detector.reset_tracking()
+        else:
+            # Score on the capture time, not on when the frame left the queue
+            timestamp = time.time() - (time.perf_counter() - capture_time)
+            result = detector.process(frame, timestamp)
+            if result.alarm:
+                alerts.dispatch(alert_event(result.alarm, 'main', result))
+            if recorder is not None:
+                recorder.record(result, timestamp)
+
+        counters['processed'] += 1
+        if counters['first_frame'] is None:
+            counters['first_frame'] = time.perf_counter()
+        results.put((frame, result, capture_time))
+
+def main():
+    # Configuration
+    FACE_TRACKER = 'none'      # Face tracker between detections: 'template', 'flow' or 'none' (off)
+    CAMERA_SETUP = 'default'   # Cascade settings from cascade_config.json (written by tune_cascades.py)
+    FACE_DETECT_INTERVAL = 5   # Run a full face detection every N frames
+    ADAPTIVE_SCALE = True      # Detect faces on a downscaled frame sized from recent faces
+    PREDICTION_CACHE = 0       # Recent eye crops whose CNN result is reused, e.g. 32 (0 = run the CNN every frame)
+    MODEL_BACKEND = 'auto'     # CNN runtime: 'keras', 'numpy' (exported .npz), 'int8' or 'auto'
+    CAPTURE_QUEUE_SIZE = 2     # Frames waiting for detection before the oldest is dropped
+    RENDER_QUEUE_SIZE = 2      # Processed frames waiting for display before the oldest is dropped
+    METRICS_PORT = None        # Serve Prometheus metrics on http://127.0.0.1:<port>/metrics (None = off)
+    ALERT_LOG = None           # Append alarms as JSON lines to this file, e.g. 'alerts.log'
+    ALERT_WEBHOOK = None       # POST alarms to a local collector, e.g. 'http://127.0.0.1:8080/alerts'
+    RECORD_DIR = None          # Record every frame's result under this folder, e.g. 'recordings' (None = off)
+
+    startup_start = time.perf_counter()
+    model_loader = BackgroundModelLoader(backend=MODEL_BACKEND)
+
+    # Audio, cascades and webcam don't depend on each other, so open them together
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        sounds_task = pool.submit(load_alarm_sounds)
+        cascades_task = pool.submit(load_cascades, CAMERA_SETUP)
+        webcam_task = pool.submit(open_webcam)
+
+    try:
+        drowsy_sound, absence_sound = sounds_task.result()
+    except Exception as e:
+        print(f"⚠ Warning: Could not initialize audio - {e}")
+        drowsy_sound, absence_sound = None, None
+
+    try:
+        cap = webcam_task.result()
+    except Exception as e:
+        print(f"❌ Error initializing webcam: {e}")
+        return
+    # We always want the newest frame, so keep the driver's own buffer minimal
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    print("✓ Webcam initialized successfully")
+
+    try:
+        cascades = cascades_task.result()
+        print("✓ Haar cascade classifiers loaded successfully")
+    except Exception as e:
+        print(f"❌ Error loading Haar cascades: {e}")
+        cap.release()
+        return
+
+    print("🧠 Loading CNN model in the background, using basic eye detection until it is ready")
+
+    registry = MetricsRegistry()
+    metrics = StreamMetrics(registry)
+    if METRICS_PORT is not None:
+        try:
+            registry.serve(METRICS_PORT)
+            print(f"📊 Metrics available at http://127.0.0.1:{METRICS_PORT}/metrics")
+        except OSError as e:
+            print(f"⚠ Warning: Could not start metrics endpoint - {e}")
+
+    frames = DropOldestQueue(CAPTURE_QUEUE_SIZE, metrics.dropped)
+    # Render drops are processed frames the display skipped, not frames that missed detection
+    render_dropped = registry.counter('sleep_render_frames_dropped_total',
+                                      "Processed frames replaced before the display showed them", {'stream': 'main'})
+    results = DropOldestQueue(RENDER_QUEUE_SIZE, render_dropped)
+    stop = threading.Event()
+    counters = {'captured': 0, 'processed': 0, 'rendered': 0, 'first_frame': None}
+    face_tracker = FaceTracker(FACE_DETECT_INTERVAL, FACE_TRACKER)
+    detector = SleepDetector(cascades, None, face_tracker, metrics=metrics, adaptive_scale=ADAPTIVE_SCALE,
+                             prediction_cache=PredictionCache(PREDICTION_CACHE) if PREDICTION_CACHE else None)
+    state = detector.state
+    state['paused'] = False
+
+    alerts = build_dispatcher({'drowsiness': drowsy_sound, 'absence': absence_sound}, ALERT_LOG, ALERT_WEBHOOK)
+    recorder = SessionRecorder(RECORD_DIR, 'main') if RECORD_DIR else None
+    stages = [
+        threading.Thread(target=capture_stage, args=(cap, frames, stop, counters, metrics), daemon=True),
+        threading.Thread(target=detection_stage, daemon=True,
+                         args=(frames, results, detector, model_loader, alerts, recorder, stop, counters)),
+    ]
+
+    print(f"\n🚀 Starting pipelined sleep detection...")
+    print(f"⏸️ Click 'PAUSE' button to pause/resume")
+    print(f"🔧 Use +/- buttons to adjust sensitivity")
+    print(f"🔴 Press 'q' to quit")
+    print("-" * 50)
+
+    window_name = 'Pipelined Sleep Detection'
+    cv2.namedWindow(window_name)
+    font = cv2.FONT_HERSHEY_TRIPLEX
+    font_small = cv2.FONT_HERSHEY_SIMPLEX
+    cv2.setMouseCallback(window_name, mouse_callback, BUTTONS + (state,))
+    panel = UIPanel(font_small)
+    latency_total = 0.0
+    start = time.perf_counter()
+
+    for stage in stages:
+        stage.start()
+
+    # The render/UI stage stays on the main thread, which HighGUI requires
+    try:
+        while not stop.is_set():
+            item = results.get(timeout=0.1)
+            if item is not None:
+                frame, result, capture_time = item
+                render_start = time.perf_counter()
+                render(frame, result, state, font, font_small, panel)
+                cv2.imshow(window_name, frame)
+                metrics.stages['render'].observe(time.perf_counter() - render_start)
+                counters['rendered'] += 1
+                latency_total += time.perf_counter() - capture_time
+
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
+                break
+            elif key == ord(' '):
+                state['paused'] = not state['paused']
+
+    except KeyboardInterrupt:
+        print("\n⏹ Detection stopped by user")
+    finally:
+        stop.set()
+        for stage in stages:
+            stage.join(timeout=1)
+        # The capture stage may still be blocked in cap.read()
+        if stages[0].is_alive():
+            print("⚠ Warning: Capture stage still running, webcam left open")
+        else:
+            cap.release()
+        cv2.destroyAllWindows()
+        registry.close()
+        # The detection stage dispatches alerts and records frames, so both stay open while it runs
+        if stages[1].is_alive():
+            print("⚠ Warning: Detection stage still running, alerts and recorder left open")
+        else:
+            alerts.close()
+            if recorder is not None:
+                recorder.close()
+
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        rendered = max(counters['rendered'], 1)
+        print(f"📊 Captured {counters['captured']} frames ({counters['captured'] / elapsed:.1f} FPS), "
+              f"processed {counters['processed']} ({counters['processed'] / elapsed:.1f} FPS), "
+              f"rendered {counters['rendered']}")
+        print(f"📊 Dropped {frames.dropped} stale capture frames and {results.dropped} render frames, "
+              f"mean capture-to-display latency {1000 * latency_total / rendered:.1f} ms")
+        if counters['first_frame'] is not None:
+            print(f"⏱ First frame processed {counters['first_frame'] - startup_start:.2f}s after startup")
+        print(f"🔔 {alerts.report()}")
+        if recorder is not None:
+            print(f"💾 {recorder.report()}")
+        print(f"⏱ {face_tracker.report()}")
+        if detector.face_scaler is not None:
+            print(f"⏱ {detector.face_scaler.report()}")
+        if detector.prediction_cache is not None:
+            print(f"⏱ {detector.prediction_cache.report()}")
+        print("🏁 Pipelined sleep detection system stopped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Temporal cache of eye CNN predictions
+- Fingerprints every preprocessed crop with an 8x8 average hash
+- A crop whose hash matches a recent entry, and whose 8x8 thumbnail is
+  within a small tolerance of it, reuses that entry's prediction
+- Bounded LRU: the least recently used entry is evicted when full
+- Only the crops that miss go through the CNN, in one batched call
+- Cleared whenever the predictor changes (e.g. the background model swap)
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+HASH_SIZE = 8            # Crops are averaged down to HASH_SIZE x HASH_SIZE for the fingerprint
+MAX_THUMB_DIFF = 0.02    # Largest per-cell difference (0..1 scale, ~5 gray levels) counted as the same crop
+
+class PredictionCache:
+    """Reuses CNN predictions for near-identical eye crops of one stream"""
+
+    def __init__(self, capacity=32, max_diff=MAX_THUMB_DIFF, hash_size=HASH_SIZE):
+        self.capacity = max(1, int(capacity))
+        self.max_diff = max_diff
+        self.hash_size = hash_size
+        self.entries = OrderedDict()  # hash bytes -> (thumbnail, prediction row)
+        self.predictor = None
+        self.metrics = None  # Optional metrics.StreamMetrics
+        self.hits = 0
+        self.misses = 0
+        self.saved_calls = 0
+
+    def clear(self):
+        self.entries.clear()
+
+    def fingerprints(self, batch):
+        """(thumbnails (N, hash_size, hash_size), hash keys) of an (N, H, W, 1) crop batch"""
+        n, h, w = batch.shape[:3]
+        s = self.hash_size
+        thumbs = batch.reshape(n, s, h // s, s, w // s).mean(axis=(2, 4))
+        bits = thumbs > thumbs.mean(axis=(1, 2), keepdims=True)
+        return thumbs, [row.tobytes() for row in np.packbits(bits.reshape(n, -1), axis=1)]
+
+    def predict(self, predict_batch, batch):
+        """Drop-in for predict_batch(batch) that only runs the CNN on uncached crops"""
+        if predict_batch is not self.predictor:
+            self.clear()
+            self.predictor = predict_batch
+
+        thumbs, keys = self.fingerprints(batch)
+        preds = [None] * len(batch)
+        misses = []
+        for i, key in enumerate(keys):
+            entry = self.entries.get(key)
+            if entry is not None and np.abs(entry[0] - thumbs[i]).max() <= self.max_diff:
+                self.entries.move_to_end(key)
+                preds[i] = entry[1]
+            else:
+                misses.append(i)
+
+        if misses:
+            fresh = np.asarray(predict_batch(batch[misses] if len(misses) < len(batch) else batch))
+            for row, i in zip(fresh, misses):
+                preds[i] = row
+                self.entries[keys[i]] = (thumbs[i], row)
+                self.entries.move_to_end(keys[i])
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        else:
+            self.saved_calls += 1
+
+        hits = len(batch) - len(misses)
+        self.hits += hits
+        self.misses += len(misses)
+        if self.metrics is not None:
+            self.metrics.cache_hits.inc(hits)
+            self.metrics.cache_misses.inc(len(misses))
+        return np.stack(preds)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self):
+        """Human readable hit rate line"""
+        return (f"Prediction cache ({self.capacity} entries) - hit rate {self.hit_rate():.0%} "
+                f"({self.hits} of {self.hits + self.misses} crops), {self.saved_calls} CNN calls saved")
@@ -0,0 +1,258 @@
+"""
+Headless Offline Video Processing for Recorded Lectures
+- Scores video files (or directories of them) without windows or overlays
+- Decodes frames on a background thread while the main thread runs detection
+- Writes a per-frame drowsiness/absence timeline CSV for every video
+- Reports frames per second processed so batch jobs can be sized
+- Optionally analyzes only every Nth frame while the student looks awake
+
+Usage:
+    python process_videos.py lecture1.mp4 recordings/ --output timelines --workers 4
+"""
+
+import argparse
+import collections
+import csv
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import cv2
+from detection_pipeline import (
+    load_cascades, load_eye_predictor, SleepDetector,
+    DROWSINESS_THRESHOLD, ABSENCE_THRESHOLD, BACKENDS, DEFAULT_CAMERA_SETUP,
+)
+from face_tracker import FaceTracker, TRACKERS
+from analysis_scheduler import make_scheduler
+from prediction_cache import PredictionCache
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.webm', '.wmv')
+TIMELINE_FIELDS = [
+    'frame', 'time_s', 'faces', 'left_eyes', 'right_eyes', 'left_closed', 'right_closed',
+    'eye_status', 'drowsiness_score', 'absence_counter', 'alarm', 'analyzed',
+]
+
+# Loaded once per worker process
+_cascades = None
+_predict_batch = None
+_full_frame_eyes = False
+_face_tracking = ('none', 5)
+_adaptive_scale = True
+_scheduling = (1, None)
+_prediction_cache = 0
+
+def find_videos(paths):
+    """Expand files and directories into a sorted list of video files"""
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in files:
+                    if name.lower().endswith(VIDEO_EXTENSIONS):
+                        videos.append(os.path.join(root, name))
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"⚠ Warning: Skipping missing path {path}")
+    return sorted(videos)
+
+def timeline_paths(videos, output_dir):
+    """Timeline CSV path per video, <stem>_timeline.csv unless another video has the same stem
+
+    Such videos are named after their path below the common folder of the
+    inputs (e.g. monday_lecture_timeline.csv), with a number if that still
+    collides.
+    """
+    stems = [os.path.splitext(os.path.basename(video))[0] for video in videos]
+    counts = collections.Counter(stems)
+    try:
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(video)) for video in videos])
+    except ValueError:  # Videos on different drives
+        root = None
+
+    paths, used = [], set()
+    for video, stem in zip(videos, stems):
+        if counts[stem] > 1 and root is not None:
+            stem = os.path.splitext(os.path.relpath(os.path.abspath(video), root))[0].replace(os.sep, '_')
+        name = f"{stem}_timeline.csv"
+        number = 2
+        while name in used:
+            name = f"{stem}_{number}_timeline.csv"
+            number += 1
+        used.add(name)
+        paths.append(os.path.join(output_dir, name))
+    return paths
+
+def init_worker(backend, full_frame_eyes=False, face_tracking=('none', 5), adaptive_scale=True,
+                scheduling=(1, None), prediction_cache=0, camera_setup=DEFAULT_CAMERA_SETUP):
+    """Load the cascades and CNN once for this process (backend None skips the CNN)"""
+    global _cascades, _predict_batch, _full_frame_eyes, _face_tracking, _adaptive_scale, _scheduling
+    global _prediction_cache
+    _cascades = load_cascades(camera_setup)
+    _full_frame_eyes = full_frame_eyes
+    _face_tracking = face_tracking
+    _adaptive_scale = adaptive_scale
+    _scheduling = scheduling
+    _prediction_cache = prediction_cache
+    _predict_batch = None
+    if backend is not None:
+        _predict_batch, model_path = load_eye_predictor(backend=backend)
+        if _predict_batch is None:
+            print("⚠ Warning: No CNN model could be loaded, using eye-count detection")
+        else:
+            print(f"✓ Model loaded successfully: {model_path}")
+
+def read_frames(cap, frames, stop):
+    """Decode frames into a bounded queue so decoding overlaps detection"""
+    while not stop.is_set():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.put(frame)
+    frames.put(None)
+
+def process_video(video_path, csv_path, drowsiness_threshold, absence_threshold):
+    """Score one video and write its timeline, returns (frames, seconds, csv path, tracker report)"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {video_path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    method, interval = _face_tracking
+    face_tracker = FaceTracker(interval, method)
+    detector = SleepDetector(_cascades, _predict_batch, face_tracker, drowsiness_threshold, absence_threshold,
+                             full_frame_eyes=_full_frame_eyes, adaptive_scale=_adaptive_scale,
+                             scheduler=make_scheduler(*_scheduling),
+                             prediction_cache=PredictionCache(_prediction_cache) if _prediction_cache else None)
+
+    frames = queue.Queue(maxsize=64)
+    stop = threading.Event()
+    reader = threading.Thread(target=read_frames, args=(cap, frames, stop), daemon=True)
+
+    frame_index = 0
+    start = time.perf_counter()
+    reader.start()
+    try:
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=TIMELINE_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            while True:
+                frame = frames.get()
+                if frame is None:
+                    break
+                timestamp = frame_index / fps
+                row = detector.process(frame, timestamp).as_dict()
+                row['frame'] = frame_index
+                row['time_s'] = round(timestamp, 3)
+                row['drowsiness_score'] = round(row['drowsiness_score'], 3)
+                row['absence_counter'] = round(row['absence_counter'], 3)
+                row['alarm'] = row['alarm'] or ''
+                writer.writerow(row)
+                frame_index += 1
+    finally:
+        stop.set()
+        # Unblock the reader if it is waiting on a full queue
+        while reader.is_alive():
+            try:
+                frames.get_nowait()
+            except queue.Empty:
+                pass
+            reader.join(timeout=0.1)
+        cap.release()
+
+    tracker_report = face_tracker.report()
+    if detector.face_scaler is not None:
+        tracker_report += f"\n   ⏱ {detector.face_scaler.report()}"
+    if detector.scheduler is not None:
+        tracker_report += f"\n   ⏱ {detector.scheduler.report()}"
+    if detector.prediction_cache is not None:
+        tracker_report += f"\n   ⏱ {detector.prediction_cache.report()}"
+    return frame_index, time.perf_counter() - start, csv_path, tracker_report
+
+def process_video_job(job):
+    """Worker entry point: process one video and catch its errors"""
+    video_path, csv_path, drowsiness_threshold, absence_threshold = job
+    try:
+        frames, seconds, csv_path, tracker_report = process_video(
+            video_path, csv_path, drowsiness_threshold, absence_threshold)
+        return video_path, frames, seconds, csv_path, tracker_report, None
+    except Exception as e:
+        return video_path, 0, 0.0, None, None, str(e)
+
+def report(video_path, frames, seconds, csv_path, tracker_report, error):
+    """Print the result line for one processed video"""
+    if error:
+        print(f"❌ {video_path}: {error}")
+        return
+    fps = frames / seconds if seconds > 0 else 0.0
+    print(f"✓ {video_path}: {frames} frames in {seconds:.1f}s ({fps:.1f} FPS) -> {csv_path}")
+    print(f"   ⏱ {tracker_report}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Score recorded lecture videos without a display")
+    parser.add_argument('paths', nargs='+', help="Video files or directories containing videos")
+    parser.add_argument('--output', default='timelines', help="Directory for the timeline CSV files")
+    parser.add_argument('--workers', type=int, default=1, help="Videos processed in parallel (one process each)")
+    parser.add_argument('--no-ml', action='store_true', help="Skip the CNN and use eye-count detection")
+    parser.add_argument('--backend', choices=BACKENDS, default='auto',
+                        help="CNN runtime: keras (.h5), numpy (.npz, no TensorFlow), int8 (.int8.npz) or auto")
+    parser.add_argument('--full-frame-eyes', action='store_true', help="Scan the whole frame for eyes (old behavior)")
+    parser.add_argument('--face-tracker', choices=TRACKERS, default='none',
+                        help="Follow faces between detections ('none' detects every frame)")
+    parser.add_argument('--face-detect-interval', type=int, default=5, help="Frames between full face detections")
+    parser.add_argument('--full-res-faces', action='store_true',
+                        help="Detect faces at full resolution instead of an adaptively downscaled frame")
+    parser.add_argument('--idle-interval', type=int, default=1,
+                        help="Analyze every Nth frame while the student looks awake (1 = every frame)")
+    parser.add_argument('--cpu-budget', type=float,
+                        help="Fraction of a CPU core each video may spend on analysis while calm, e.g. 0.5")
+    parser.add_argument('--prediction-cache', type=int, default=0, metavar='N',
+                        help="Reuse CNN results of the N most recent near-identical eye crops (0 = off)")
+    parser.add_argument('--drowsiness-threshold', type=float, default=DROWSINESS_THRESHOLD,
+                        help="Seconds of closed eyes (at sensitivity 1) before the drowsiness alarm")
+    parser.add_argument('--absence-threshold', type=float, default=ABSENCE_THRESHOLD,
+                        help="Seconds without detected eyes before the absence alarm")
+    parser.add_argument('--camera-setup', default=DEFAULT_CAMERA_SETUP,
+                        help="Cascade settings tuned for this camera setup in cascade_config.json (tune_cascades.py)")
+    args = parser.parse_args()
+
+    videos = find_videos(args.paths)
+    if not videos:
+        print("❌ No video files found")
+        return
+
+    os.makedirs(args.output, exist_ok=True)
+    face_tracking = (args.face_tracker, args.face_detect_interval)
+    backend = None if args.no_ml else args.backend
+    worker_args = (backend, args.full_frame_eyes, face_tracking, not args.full_res_faces,
+                   (args.idle_interval, args.cpu_budget), args.prediction_cache, args.camera_setup)
+    jobs = [(video, csv_path, args.drowsiness_threshold, args.absence_threshold)
+            for video, csv_path in zip(videos, timeline_paths(videos, args.output))]
+
+    print(f"🎬 Processing {len(videos)} video(s) with {args.workers} worker(s)")
+    print("-" * 50)
+
+    start = time.perf_counter()
+    total_frames = 0
+    if args.workers <= 1:
+        init_worker(*worker_args)
+        for result in map(process_video_job, jobs):
+            report(*result)
+            total_frames += result[1]
+    else:
+        # Spawn keeps TensorFlow from being forked into the workers
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=get_context('spawn'),
+                                 initializer=init_worker, initargs=worker_args) as pool:
+            for result in pool.map(process_video_job, jobs):
+                report(*result)
+                total_frames += result[1]
+
+    elapsed = time.perf_counter() - start
+    print("-" * 50)
+    print(f"🏁 {total_frames} frames in {elapsed:.1f}s ({total_frames / elapsed:.1f} FPS overall)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Post-training int8 quantization of the eye CNN
+- Calibrates per-layer activation ranges on the training images
+- Stores Conv2D/Dense kernels as int8 with one scale per output channel
+- Runs on the NumPy engine (numpy_cnn.py), no TensorFlow needed at runtime
+- Gates the result on validation accuracy and reports size and speed
+
+Usage:
+    python quantize_cnn.py models/cnn_eye_classification.h5 --calibrate data/train --validate data/valid
+"""
+
+import argparse
+import io
+import os
+import time
+
+import numpy as np
+from numpy_cnn import NumpyCNN, from_keras
+
+QUANTIZED_LAYERS = ('Conv2D', 'Dense')
+
+def int8_path_for(model_path):
+    """Default int8 .npz location next to an .h5 or float .npz model"""
+    return os.path.splitext(model_path)[0] + '.int8.npz'
+
+def calibrate(engine, inputs, batch_size=256):
+    """Return {layer index: max |input|} for every quantizable layer"""
+    ranges = {}
+    for start in range(0, len(inputs), batch_size):
+        x = inputs[start:start + batch_size]
+        for index, layer in enumerate(engine.layers):
+            if layer['type'] in QUANTIZED_LAYERS:
+                ranges[index] = max(ranges.get(index, 0.0), float(np.abs(x).max()))
+            x = engine.run_layer(layer, x)
+    return ranges
+
+def quantize(engine, calibration_inputs):
+    """Build an int8 engine from a float engine and calibration images"""
+    ranges = calibrate(engine, calibration_inputs)
+    layers = []
+    for index, layer in enumerate(engine.layers):
+        layer = dict(layer)
+        if index in ranges:
+            kernel = layer['kernel']
+            kernel_scale = np.abs(kernel).max(axis=tuple(range(kernel.ndim - 1))) / 127
+            kernel_scale[kernel_scale == 0] = 1.0
+            layer['kernel'] = np.clip(np.rint(kernel / kernel_scale), -127, 127).astype(np.int8)
+            layer['kernel_scale'] = kernel_scale.astype(np.float32)
+            layer['input_scale'] = ranges[index] / 127 or 1.0
+        layers.append(layer)
+    return NumpyCNN(layers, engine.input_shape)
+
+def load_float_engine(model_path):
+    """Load a float engine from a Keras .h5 or an exported .npz"""
+    if model_path.endswith('.npz'):
+        return NumpyCNN.load(model_path)
+
+    from eye_inference import load_model_safe
+
+    model = load_model_safe(model_path)
+    if model is None:
+        raise IOError(f"Could not load {model_path}")
+    # Round-trip through the file format so both engines run exactly what gets saved
+    buffer = io.BytesIO()
+    from_keras(model).save(buffer)
+    buffer.seek(0)
+    return NumpyCNN.load(buffer)
+
+def npz_size(engine):
+    """Bytes the engine takes up as a compressed .npz"""
+    buffer = io.BytesIO()
+    engine.save(buffer)
+    return buffer.tell()
+
+def median_ms(predict, batch, repeats=50):
+    """Median wall time of one predict call in milliseconds"""
+    predict(batch)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(batch)
+        times.append(time.perf_counter() - start)
+    return 1000 * float(np.median(times))
+
+def accuracy_gate(float_engine, int8_engine, data_dir, max_drop):
+    """Compare both engines on an eye dataset, returns True if the accuracy drop is within max_drop"""
+    from eye_inference import load_eye_images
+
+    inputs, labels = load_eye_images(data_dir)
+    float_pred = float_engine.predict(inputs).argmax(axis=1)
+    int8_pred = int8_engine.predict(inputs).argmax(axis=1)
+    float_acc = float((float_pred == labels).mean())
+    int8_acc = float((int8_pred == labels).mean())
+    drop = float_acc - int8_acc
+    print(f"📊 {len(inputs)} images from {data_dir}")
+    print(f"   accuracy float {float_acc:.2%} / int8 {int8_acc:.2%} (drop {drop:+.2%}, limit {max_drop:.2%})")
+    print(f"   class agreement {(float_pred == int8_pred).mean():.2%}")
+    return drop <= max_drop
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the eye CNN to int8 with an accuracy gate")
+    parser.add_argument('model', help="Keras .h5 model or float .npz export")
+    parser.add_argument('-o', '--output', help="Output path (default: <model>.int8.npz)")
+    parser.add_argument('--calibrate', default='data/train', metavar='DATA_DIR',
+                        help="Images used to calibrate activation ranges")
+    parser.add_argument('--validate', default='data/valid', metavar='DATA_DIR',
+                        help="Images used for the accuracy gate")
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.01,
+                        help="Largest allowed validation accuracy drop (0.01 = 1 point)")
+    args = parser.parse_args()
+
+    from eye_inference import load_eye_images
+
+    try:
+        float_engine = load_float_engine(args.model)
+    except Exception as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+    calibration_inputs, _ = load_eye_images(args.calibrate)
+    print(f"✓ Calibrating on {len(calibration_inputs)} images from {args.calibrate}")
+
+    output = args.output or int8_path_for(args.model)
+    quantize(float_engine, calibration_inputs).save(output)
+    int8_engine = NumpyCNN.load(output)
+
+    float_size, int8_size = npz_size(float_engine), os.path.getsize(output)
+    print(f"✓ Wrote {output}: {int8_size / 1e6:.2f} MB vs {float_size / 1e6:.2f} MB float "
+          f"({float_size / int8_size:.1f}x smaller)")
+
+    for batch_size in (2, 64):
+        batch = calibration_inputs[:batch_size]
+        float_ms = median_ms(float_engine.predict, batch)
+        int8_ms = median_ms(int8_engine.predict, batch)
+        print(f"⏱ batch {batch_size:>2}: float {float_ms:.2f} ms / int8 {int8_ms:.2f} ms "
+              f"({float_ms / int8_ms:.2f}x speedup)")
+
+    if accuracy_gate(float_engine, int8_engine, args.validate, args.max_accuracy_drop):
+        print("✅ int8 model passed the accuracy gate")
+    else:
+        os.remove(output)
+        print(f"❌ int8 model lost too much accuracy, removed {output}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
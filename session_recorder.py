@@ -0,0 +1,183 @@
+"""
+Compact per-frame session recorder
+- Appends one fixed-size binary record per frame (timestamp, face and eye
+  counts, first face/eye boxes, closed-eye probabilities, scores and alarm
+  flags) to a preallocated, memory-mapped NumPy structured array
+- Rolls over to a new part file when a part reaches max_bytes
+- Parts are plain .npy files: closing a part rewrites its header with the
+  exact record count, and a part left behind by a crash is trimmed on load
+- load_session() returns a whole session as one structured array whose
+  fields are columns, without parsing anything
+
+Usage:
+    recorder = SessionRecorder('recordings', stream='main')
+    recorder.record(result, timestamp)
+    python session_recorder.py recordings/20261018-101500_main
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+from npy_files import truncate_npy
+
+RECORD_VERSION = 1
+MAX_PART_BYTES = 64 * 1024 * 1024  # ~1.2M frames, over 11 hours at 30 FPS
+
+# Bits of the 'flags' field
+FLAG_RECORDED = 1           # Set on every written record, unwritten (preallocated) rows stay zero
+FLAG_ANALYZED = 2           # False for frames the analysis scheduler carried over
+FLAG_LEFT_CLOSED = 4
+FLAG_RIGHT_CLOSED = 8
+FLAG_DROWSINESS_ALARM = 16
+FLAG_ABSENCE_ALARM = 32
+
+# Boxes are (x, y, w, h) in frame pixels, NO_BOX when nothing was detected
+NO_BOX = (-1, -1, -1, -1)
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('faces', '<u2'),
+    ('left_eyes', 'u1'),
+    ('right_eyes', 'u1'),
+    ('face_box', '<i2', (4,)),
+    ('left_eye_box', '<i2', (4,)),
+    ('right_eye_box', '<i2', (4,)),
+    ('left_closed_prob', '<f4'),   # NaN when the eye was not classified
+    ('right_closed_prob', '<f4'),
+    ('drowsiness_score', '<f4'),
+    ('absence_counter', '<f4'),
+    ('flags', 'u1'),
+])
+ALARM_FLAGS = {'drowsiness': FLAG_DROWSINESS_ALARM, 'absence': FLAG_ABSENCE_ALARM}
+
+def part_path(session_path, part):
+    return os.path.join(session_path, f"part_{part:04d}.npy")
+
+def _first_box(boxes):
+    return tuple(int(v) for v in boxes[0]) if len(boxes) > 0 else NO_BOX
+
+class SessionRecorder:
+    """Writes the FrameResult of every frame of one stream to memory-mapped part files"""
+
+    def __init__(self, root='recordings', stream='main', max_bytes=MAX_PART_BYTES, session=None, metadata=None):
+        self.session = session or time.strftime('%Y%m%d-%H%M%S')
+        self.stream = stream
+        self.path = os.path.join(root, f"{self.session}_{stream}")
+        self.capacity = max(1, int(max_bytes) // RECORD_DTYPE.itemsize)
+        self.records = None
+        self.count = 0   # Records in the current part
+        self.parts = 0
+        self.total = 0
+
+        os.makedirs(self.path, exist_ok=True)
+        info = {'version': RECORD_VERSION, 'stream': stream, 'started': time.time(),
+                'record_bytes': RECORD_DTYPE.itemsize, 'fields': list(RECORD_DTYPE.names)}
+        info.update(metadata or {})
+        with open(os.path.join(self.path, 'session.json'), 'w') as f:
+            json.dump(info, f, indent=2)
+        self._open_part()
+
+    def _open_part(self):
+        self.records = np.lib.format.open_memmap(part_path(self.path, self.parts), mode='w+',
+                                                 dtype=RECORD_DTYPE, shape=(self.capacity,))
+        self.parts += 1
+        self.count = 0
+
+    def _close_part(self):
+        self.records.flush()
+        # The mapping has to be gone before the file can be truncated (Windows)
+        self.records = None
+        truncate_npy(part_path(self.path, self.parts - 1), self.count)
+
+    def record(self, result, timestamp=None):
+        """Append one frame result"""
+        if self.count == self.capacity:
+            self._close_part()
+            self._open_part()
+
+        flags = FLAG_RECORDED | ALARM_FLAGS.get(result.alarm, 0)
+        if result.analyzed:
+            flags |= FLAG_ANALYZED
+        if result.left_closed:
+            flags |= FLAG_LEFT_CLOSED
+        if result.right_closed:
+            flags |= FLAG_RIGHT_CLOSED
+        # One tuple assignment writes the whole record
+        self.records[self.count] = (
+            time.time() if timestamp is None else timestamp,
+            min(result.faces, 65535), min(result.left_eyes, 255), min(result.right_eyes, 255),
+            _first_box(result.face_boxes), _first_box(result.left_eye_boxes), _first_box(result.right_eye_boxes),
+            result.left_closed_prob, result.right_closed_prob,
+            result.drowsiness_score, result.absence_counter, flags,
+        )
+        self.count += 1
+        self.total += 1
+
+    def close(self):
+        if self.records is not None:
+            self._close_part()
+
+    def report(self):
+        """Human readable size line"""
+        return (f"Session recorder - {self.total} frames in {self.parts} part(s), "
+                f"{self.total * RECORD_DTYPE.itemsize / 1e6:.1f} MB -> {self.path}")
+
+def load_part(path, mmap=True):
+    """Records of one part file, without the unwritten rows of a part that was never closed"""
+    records = np.load(path, mmap_mode='r' if mmap else None)
+    if len(records) and not records[-1]['flags'] & FLAG_RECORDED:
+        written = np.flatnonzero(records['flags'] & FLAG_RECORDED)
+        records = records[:written[-1] + 1 if len(written) else 0]
+    return records
+
+def load_session(session_path, mmap=True):
+    """All records of a session as one RECORD_DTYPE array (a memory map if it has a single part)"""
+    parts = [load_part(path, mmap) for path in sorted(glob.glob(os.path.join(session_path, 'part_*.npy')))]
+    if not parts:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    if len(parts) == 1:
+        return parts[0]
+    return np.concatenate(parts)
+
+def session_info(session_path):
+    """The session.json metadata written when the recording started"""
+    with open(os.path.join(session_path, 'session.json')) as f:
+        return json.load(f)
+
+def summarize(records):
+    """Frame count, duration, alarm counts and closed-eye share of a loaded session"""
+    flags = records['flags']
+    analyzed = (flags & FLAG_ANALYZED) > 0
+    closed = (flags & (FLAG_LEFT_CLOSED | FLAG_RIGHT_CLOSED)) > 0
+    return {
+        'frames': len(records),
+        'duration_s': float(records['timestamp'][-1] - records['timestamp'][0]) if len(records) else 0.0,
+        'analyzed': int(analyzed.sum()),
+        'no_face': int((records['faces'] == 0).sum()),
+        'eyes_closed': int((closed & analyzed).sum()),
+        'drowsiness_alarms': int(((flags & FLAG_DROWSINESS_ALARM) > 0).sum()),
+        'absence_alarms': int(((flags & FLAG_ABSENCE_ALARM) > 0).sum()),
+        'max_drowsiness_score': float(records['drowsiness_score'].max()) if len(records) else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize recorded sessions")
+    parser.add_argument('sessions', nargs='+', help="Session directories written by SessionRecorder")
+    args = parser.parse_args()
+
+    for session_path in args.sessions:
+        start = time.perf_counter()
+        records = load_session(session_path)
+        load_ms = 1000 * (time.perf_counter() - start)
+        stats = summarize(records)
+        print(f"📊 {session_path}: {stats['frames']} frames over {stats['duration_s']:.1f}s "
+              f"(loaded in {load_ms:.1f} ms)")
+        print(f"   analyzed {stats['analyzed']}, no face {stats['no_face']}, eyes closed {stats['eyes_closed']}, "
+              f"max drowsiness score {stats['max_drowsiness_score']:.1f}s")
+        print(f"   alarms: {stats['drowsiness_alarms']} drowsiness, {stats['absence_alarms']} absence")
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,11 @@ Real-time detection of drowsiness using webcam and CNN model
 import cv2
 import os
 from keras.models import load_model
-import numpy as np
 from pygame import mixer
 import time
+from eye_inference import make_batch_predictor, predict_first_eyes, EyeBatchBuffer
+from detection_pipeline import load_cascades, detect_eyes
+from face_tracker import FaceTracker
 
 def main():
     # Initialize pygame mixer for audio
@@ -23,10 +25,10 @@ def main():
         sound = None
 
     # Load Haar cascade classifiers
+    CAMERA_SETUP = 'default'  # Cascade settings from cascade_config.json (written by tune_cascades.py)
     try:
-        face = cv2.CascadeClassifier('haar cascade files/haarcascade_frontalface_alt.xml')
-        leye = cv2.CascadeClassifier('haar cascade files/haarcascade_lefteye_2splits.xml')
-        reye = cv2.CascadeClassifier('haar cascade files/haarcascade_righteye_2splits.xml')
+        cascades = load_cascades(CAMERA_SETUP)
+        face, leye, reye = cascades['face'], cascades['leye'], cascades['reye']
         print("✓ Haar cascade classifiers loaded successfully")
     except Exception as e:
         print(f"❌ Error loading Haar cascades: {e}")
@@ -52,10 +54,17 @@ def main():
         cap.release()
         return
 
+    # Compile a batched inference path once instead of calling predict per eye
+    predict_batch = make_batch_predictor(model)
+    eye_buffer = EyeBatchBuffer()  # Eye crops are preprocessed into this batch every frame
+
     # Initialize variables
     score = 0
     absence_counter = 0
     ABSENCE_THRESHOLD = 30  # Frames without eyes before alarm
+    FULL_FRAME_EYES = False  # Scan the whole frame for eyes instead of only the face region
+    FACE_TRACKER = 'none'      # Face tracker between detections: 'template', 'flow' or 'none' (off)
+    FACE_DETECT_INTERVAL = 5  # Run a full face detection every N frames
     font = cv2.FONT_HERSHEY_TRIPLEX
     last_alarm_time = 0
     alarm_cooldown = 3  # seconds between alarms
@@ -68,6 +77,8 @@ def main():
     print("🔴 Press 'q' to quit")
     print("-" * 50)
 
+    face_tracker = FaceTracker(FACE_DETECT_INTERVAL, FACE_TRACKER)
+
     try:
         while True:
             ret, frame = cap.read()
@@ -86,9 +97,9 @@ def main():
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
             # Detect faces and eyes
-            faces = face.detectMultiScale(gray, minNeighbors=5, scaleFactor=1.1, minSize=(25, 25))
-            left_eye = leye.detectMultiScale(gray)
-            right_eye = reye.detectMultiScale(gray)
+            faces = face_tracker.update(gray, face, cascades['params']['face'])
+            left_eye, right_eye = detect_eyes(gray, faces, leye, reye, full_frame=FULL_FRAME_EYES,
+                                              params=cascades['params']['eyes'])
 
             # Create black rectangle for score display
             cv2.rectangle(frame, (0, height - 80), (250, height), (0, 0, 0), thickness=cv2.FILLED)
@@ -107,27 +118,15 @@ def main():
                 # Reset absence counter when eyes are detected
                 absence_counter = max(0, absence_counter - 2)
 
-                # Process right eye
+                # Classify both eyes in a single batched forward pass
+                rpred, lpred = predict_first_eyes(predict_batch, gray, right_eye, left_eye, rpred, eye_buffer)
+
+                # Draw rectangles around the classified eyes
                 for (x, y, w, h) in right_eye:
-                    r_eye = frame[y:y+h, x:x+w]
-                    r_eye = cv2.cvtColor(r_eye, cv2.COLOR_BGR2GRAY)
-                    r_eye = cv2.resize(r_eye, (24, 24))
-                    r_eye = r_eye / 255
-                    r_eye = r_eye.reshape(24, 24, -1)
-                    r_eye = np.expand_dims(r_eye, axis=0)
-                    rpred = model.predict(r_eye, verbose=0)
                     cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
                     break
 
-                # Process left eye
                 for (x, y, w, h) in left_eye:
-                    l_eye = frame[y:y+h, x:x+w]
-                    l_eye = cv2.cvtColor(l_eye, cv2.COLOR_BGR2GRAY)
-                    l_eye = cv2.resize(l_eye, (24, 24))
-                    l_eye = l_eye / 255
-                    l_eye = l_eye.reshape(24, 24, -1)
-                    l_eye = np.expand_dims(l_eye, axis=0)
-                    lpred = model.predict(l_eye, verbose=0)
                     cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
                     break
 
@@ -216,6 +215,7 @@ def main():
         # Clean up
         cap.release()
         cv2.destroyAllWindows()
+        print(f"⏱ {face_tracker.report()}")
         print("🏁 Sleep detection system stopped")
 
 if __name__ == "__main__":
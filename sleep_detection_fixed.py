@@ -1,26 +1,11 @@
 #libraries
 import cv2
 import os
-import numpy as np
 from pygame import mixer
 import time
-
-def load_model_safe(model_path):
-    try:
-        import tensorflow as tf
-        return tf.keras.models.load_model(model_path)
-    except Exception as e1:
-        #t2
-        try:
-            from keras.models import load_model
-            return load_model(model_path, compile=False)
-        except Exception as e2:
-            try:
-                import tensorflow as tf
-                return tf.keras.models.load_model(model_path, compile=False)
-            except Exception as e3:
-                print(f"Failed to load model {model_path}: {e3}")
-                return None
+from eye_inference import predict_first_eyes, EyeBatchBuffer
+from detection_pipeline import load_cascades, detect_eyes, load_eye_predictor
+from face_tracker import FaceTracker
 
 def main():
     mixer.init()
@@ -32,10 +17,10 @@ def main():
         print(f"⚠ Warning: Could not load alarm sound - {e}")
         sound = None
 
+    CAMERA_SETUP = 'default'  # Cascade settings from cascade_config.json (written by tune_cascades.py)
     try:
-        face = cv2.CascadeClassifier('haar cascade files/haarcascade_frontalface_alt.xml')
-        leye = cv2.CascadeClassifier('haar cascade files/haarcascade_lefteye_2splits.xml')
-        reye = cv2.CascadeClassifier('haar cascade files/haarcascade_righteye_2splits.xml')
+        cascades = load_cascades(CAMERA_SETUP)
+        face, leye, reye = cascades['face'], cascades['leye'], cascades['reye']
         print("✓ Haar cascade classifiers loaded successfully")
     except Exception as e:
         print(f"❌ Error loading Haar cascades: {e}")
@@ -51,27 +36,24 @@ def main():
         print(f"❌ Error initializing webcam: {e}")
         return
 
-    model = None
+    # An exported .npz model runs without TensorFlow
+    MODEL_BACKEND = 'auto'  # CNN runtime: 'keras', 'numpy' (exported .npz), 'int8' or 'auto'
     model_paths = ['models/cnn.h5', 'models/cnn_eye_classification.h5']
-    
-    for model_path in model_paths:
-        if os.path.exists(model_path):
-            print(f"Trying to load model: {model_path}")
-            model = load_model_safe(model_path)
-            if model is not None:
-                print(f"✓ Model loaded successfully: {model_path}")
-                break
-            else:
-                print(f"❌ Failed to load model: {model_path}")
-    
-    if model is None:
+    predict_batch, model_path = load_eye_predictor(model_paths, backend=MODEL_BACKEND)
+    eye_buffer = EyeBatchBuffer()  # Eye crops are preprocessed into this batch every frame
+
+    if predict_batch is None:
         print("❌ No models could be loaded. Using simple eye detection without ML.")
         use_ml = False
     else:
+        print(f"✓ Model loaded successfully: {model_path}")
         use_ml = True
 
     score = 0
     font = cv2.FONT_HERSHEY_TRIPLEX
+    FULL_FRAME_EYES = False  # Scan the whole frame for eyes instead of only the face region
+    FACE_TRACKER = 'none'      # Face tracker between detections: 'template', 'flow' or 'none' (off)
+    FACE_DETECT_INTERVAL = 5  # Run a full face detection every N frames
     
     print("\n🚀 Starting sleep detection...")
     print("📷 Make sure you're visible in the webcam")
@@ -83,6 +65,8 @@ def main():
     print("🔴 Press 'q' to quit")
     print("-" * 50)
 
+    face_tracker = FaceTracker(FACE_DETECT_INTERVAL, FACE_TRACKER)
+
     try:
         while True:
             ret, frame = cap.read()
@@ -98,9 +82,9 @@ def main():
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
             # Detect faces and eyes
-            faces = face.detectMultiScale(gray, minNeighbors=5, scaleFactor=1.1, minSize=(25, 25))
-            left_eye = leye.detectMultiScale(gray)
-            right_eye = reye.detectMultiScale(gray)
+            faces = face_tracker.update(gray, face, cascades['params']['face'])
+            left_eye, right_eye = detect_eyes(gray, faces, leye, reye, full_frame=FULL_FRAME_EYES,
+                                              params=cascades['params']['eyes'])
 
             # Create black rectangle for score display
             cv2.rectangle(frame, (0, height - 80), (300, height), (0, 0, 0), thickness=cv2.FILLED)
@@ -111,38 +95,23 @@ def main():
 
             eyes_detected = len(left_eye) > 0 or len(right_eye) > 0
             
-            if use_ml and model is not None:
+            if use_ml:
                 # Use ML model for prediction
                 rpred = [0.5, 0.5]  
                 lpred = [0.5, 0.5]
 
-                # Process right eye
+                # Classify both eyes in a single batched forward pass
+                try:
+                    rpred, lpred = predict_first_eyes(predict_batch, gray, right_eye, left_eye, rpred, eye_buffer)
+                except:
+                    rpred, lpred = [0.5, 0.5], [0.5, 0.5]
+
+                # Draw the classified eyes
                 for (x, y, w, h) in right_eye:
-                    r_eye = frame[y:y+h, x:x+w]
-                    r_eye = cv2.cvtColor(r_eye, cv2.COLOR_BGR2GRAY)
-                    r_eye = cv2.resize(r_eye, (24, 24))
-                    r_eye = r_eye / 255
-                    r_eye = r_eye.reshape(24, 24, -1)
-                    r_eye = np.expand_dims(r_eye, axis=0)
-                    try:
-                        rpred = model.predict(r_eye, verbose=0)
-                    except:
-                        rpred = [0.5, 0.5]
                     cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
                     break
 
-                # Process left eye
                 for (x, y, w, h) in left_eye:
-                    l_eye = frame[y:y+h, x:x+w]
-                    l_eye = cv2.cvtColor(l_eye, cv2.COLOR_BGR2GRAY)
-                    l_eye = cv2.resize(l_eye, (24, 24))
-                    l_eye = l_eye / 255
-                    l_eye = l_eye.reshape(24, 24, -1)
-                    l_eye = np.expand_dims(l_eye, axis=0)
-                    try:
-                        lpred = model.predict(l_eye, verbose=0)
-                    except:
-                        lpred = [0.5, 0.5]
                     cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
                     break
 
@@ -251,6 +220,7 @@ def main():
         # Clean up
         cap.release()
         cv2.destroyAllWindows()
+        print(f"⏱ {face_tracker.report()}")
         print("🏁 Sleep detection system stopped")
 
 if __name__ == "__main__":
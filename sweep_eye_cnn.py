@@ -0,0 +1,209 @@
+"""
+Architecture sweep for the eye CNN
+- Trains a grid of notebook-style CNN variants (filters, dense width,
+  pooling, input size) in parallel worker processes on the CPU
+- Evaluates every variant on data/valid
+- Measures single-crop and batched inference latency one model at a time,
+  so the timings don't compete with training
+- Prints a Pareto table of accuracy vs. latency vs. size and saves the
+  winner where the detector scripts load it from
+
+Usage:
+    python sweep_eye_cnn.py --filters 32,32,64 16,32,32 --dense 128 32 --pool 1 2 --workers 4
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from eye_inference import EYE_SIZE
+from train_eye_cnn import DEFAULT_OUTPUTS
+
+BATCH_SIZES = (1, 32)  # Single crop as in one-face monitoring, and a multi-stream batch
+
+def variant_name(filters, dense, pool, input_size):
+    return f"f{'-'.join(map(str, filters))}_d{dense}_p{pool}_s{input_size}"
+
+def init_worker(threads):
+    """Split the cores between the worker processes instead of oversubscribing them"""
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+def train_variant(job):
+    """Worker entry point: train, evaluate and save one variant, returns its result dict"""
+    from train_eye_cnn import build_model, train, evaluate
+
+    name, filters, dense, pool, input_size, args, run_dir = job
+    start = time.perf_counter()
+    try:
+        model = build_model(filters, dense, pool, input_size)
+        _, epoch_times = train(model, args['train'], args['valid'], args['epochs'], args['batch_size'],
+                               input_size, seed=args['seed'], verbose=0)
+        path = os.path.join(run_dir, f"{name}.h5")
+        model.save(path)
+        return {
+            'name': name, 'filters': list(filters), 'dense': dense, 'pool': pool, 'input_size': input_size,
+            'accuracy': evaluate(model, args['valid'], input_size),
+            'params': int(model.count_params()),
+            'size_kb': os.path.getsize(path) / 1024,
+            'epoch_s': sum(epoch_times) / len(epoch_times),
+            'train_s': time.perf_counter() - start,
+            'path': path,
+        }
+    except Exception as e:
+        return {'name': name, 'error': str(e)}
+
+def measure_latency(result):
+    """Add median ms per predict call for every BATCH_SIZES entry"""
+    import numpy as np
+    from eye_inference import load_model_safe, make_batch_predictor
+    from quantize_cnn import median_ms
+
+    model = load_model_safe(result['path'])
+    predict_batch = make_batch_predictor(model)
+    size = result['input_size']
+    for batch_size in BATCH_SIZES:
+        batch = np.random.default_rng(0).random((batch_size, size, size, 1), dtype=np.float32)
+        result[f'latency_{batch_size}_ms'] = median_ms(predict_batch, batch)
+
+def pareto_front(results):
+    """Names of the variants no other variant beats on accuracy, latency and size at once"""
+    def key(r):
+        return (-r['accuracy'], r[f'latency_{BATCH_SIZES[0]}_ms'], r['size_kb'])
+
+    front = set()
+    for r in results:
+        dominated = any(all(a <= b for a, b in zip(key(o), key(r))) and key(o) != key(r) for o in results)
+        if not dominated:
+            front.add(r['name'])
+    return front
+
+def pick_winner(results, tolerance):
+    """Fastest variant within `tolerance` of the best accuracy that the detectors can feed"""
+    usable = [r for r in results if r['input_size'] == EYE_SIZE]
+    if not usable:
+        return None
+    best = max(r['accuracy'] for r in usable)
+    close = [r for r in usable if r['accuracy'] >= best - tolerance]
+    return min(close, key=lambda r: (r[f'latency_{BATCH_SIZES[0]}_ms'], r['size_kb']))
+
+def print_table(results, front, winner):
+    latency_headers = ''.join(f" {f'lat b{b}':>10}" for b in BATCH_SIZES)
+    print(f"\n📊 {'variant':<26} {'accuracy':>9}{latency_headers} {'params':>9} {'size':>10} {'epoch':>7}")
+    for r in sorted(results, key=lambda r: -r['accuracy']):
+        latencies = ''.join(f" {r[f'latency_{b}_ms']:8.2f}ms" for b in BATCH_SIZES)
+        marks = ('*' if r['name'] in front else ' ') + ('🏆' if winner is r else '')
+        print(f"   {r['name']:<26} {r['accuracy']:8.2%}{latencies} {r['params']:9,} {r['size_kb']:7.0f}KiB "
+              f"{r['epoch_s']:6.2f}s {marks}")
+    print("   * = Pareto optimal (accuracy vs. single-crop latency vs. size)")
+
+def save_winner(winner, output, valid_dir='data/valid', force=False):
+    """Copy the winner to output (and its NumPy export) unless the current model there is more accurate"""
+    from eye_inference import load_model_safe
+    from train_eye_cnn import evaluate, save_model
+
+    model = load_model_safe(winner['path'])
+    if os.path.exists(output) and not force:
+        current = load_model_safe(output)
+        if current is not None:
+            current_accuracy = evaluate(current, valid_dir)
+            if current_accuracy > winner['accuracy']:
+                print(f"⚠ {output} is more accurate ({current_accuracy:.2%} vs {winner['accuracy']:.2%}), "
+                      f"not replaced (use --force)")
+                return False
+
+    save_model(model, output)
+    print(f"✓ Saved {winner['name']} to {output}")
+    warn_if_shadowed(output)
+    return True
+
+def warn_if_shadowed(output):
+    """Warn when the detectors load another model before output (they try MODEL_PATHS in order)"""
+    from detection_pipeline import MODEL_PATHS
+
+    model_paths = [os.path.normpath(path) for path in MODEL_PATHS]
+    output = os.path.normpath(output)
+    if output not in model_paths:
+        print(f"⚠ The detectors don't load {output}, they look for {', '.join(MODEL_PATHS)}")
+        return
+    shadowing = [path for path in model_paths[:model_paths.index(output)] if os.path.exists(path)]
+    if shadowing:
+        print(f"⚠ The detectors load {shadowing[0]} before {output}, move or remove it to use the winner")
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a grid of eye CNN variants and compare accuracy vs. latency")
+    parser.add_argument('--filters', nargs='+', default=['32,32,64', '16,32,32', '8,16,32'],
+                        help="Conv filter counts per variant, comma separated")
+    parser.add_argument('--dense', type=int, nargs='+', default=[128, 32], help="Dense layer widths")
+    parser.add_argument('--pool', type=int, nargs='+', default=[1, 2], help="Max pooling sizes (1 = none)")
+    parser.add_argument('--input-size', type=int, nargs='+', default=[EYE_SIZE], help="Eye crop side lengths")
+    parser.add_argument('--epochs', type=int, default=15)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=0, help="Shuffle seed shared by all variants")
+    parser.add_argument('--train', default='data/train')
+    parser.add_argument('--valid', default='data/valid')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Variants trained in parallel")
+    parser.add_argument('--tolerance', type=float, default=0.005,
+                        help="Accuracy the winner may give up for speed (0.005 = half a point)")
+    # The sweep varies the notebook architecture, so the winner replaces the notebook model
+    parser.add_argument('--output', default=DEFAULT_OUTPUTS['notebook'], help="Where the winner is saved")
+    parser.add_argument('--no-save', action='store_true', help="Only report, keep the current model")
+    parser.add_argument('--force', action='store_true', help="Save the winner even if the current model is more accurate")
+    parser.add_argument('--results', default='sweep_results', help="Directory for the variant models and JSON")
+    args = parser.parse_args()
+
+    from eye_dataset import load_dataset
+
+    # Build the caches once up front instead of racing in every worker
+    for size in args.input_size:
+        load_dataset(args.train, size=size)
+        load_dataset(args.valid, size=size)
+
+    run_dir = os.path.join(args.results, time.strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(run_dir, exist_ok=True)
+    settings = {'train': args.train, 'valid': args.valid, 'epochs': args.epochs,
+                'batch_size': args.batch_size, 'seed': args.seed}
+    grid = itertools.product([tuple(int(n) for n in f.split(',')) for f in args.filters],
+                             args.dense, args.pool, args.input_size)
+    jobs = [(variant_name(*variant), *variant, settings, run_dir) for variant in grid]
+
+    print(f"🚀 Training {len(jobs)} variant(s) for {args.epochs} epochs with {args.workers} worker(s)")
+    print("-" * 50)
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    results = []
+    # Spawn keeps TensorFlow from being forked into the workers
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=get_context('spawn'),
+                             initializer=init_worker, initargs=(threads,)) as pool:
+        for result in pool.map(train_variant, jobs):
+            if 'error' in result:
+                print(f"❌ {result['name']}: {result['error']}")
+                continue
+            print(f"✓ {result['name']}: {result['accuracy']:.2%} after {result['train_s']:.0f}s")
+            results.append(result)
+    if not results:
+        return
+
+    for result in results:
+        measure_latency(result)
+    front = pareto_front(results)
+    winner = pick_winner(results, args.tolerance)
+    print_table(results, front, winner)
+
+    with open(os.path.join(run_dir, 'results.json'), 'w') as f:
+        json.dump({'settings': settings, 'results': results, 'pareto': sorted(front),
+                   'winner': winner and winner['name']}, f, indent=2)
+    print(f"\n✓ Results saved to {run_dir}")
+
+    if winner is None:
+        print(f"⚠ No variant uses the {EYE_SIZE}x{EYE_SIZE} input the detectors feed, nothing saved")
+    elif not args.no_save:
+        save_winner(winner, args.output, args.valid, args.force)
+
+if __name__ == "__main__":
+    main()
@@ -81,6 +81,20 @@ def test_system():
             
     except Exception as e:
         print(f"❌ Model loading error: {e}")
+
+    # NumPy exports run without TensorFlow (create them with numpy_cnn.py)
+    try:
+        from numpy_cnn import NumpyCNN
+
+        for npz_path in ['models/cnn.npz', 'models/cnn_eye_classification.npz']:
+            if os.path.exists(npz_path):
+                engine = NumpyCNN.load(npz_path)
+                engine.predict(np.zeros((1, 24, 24, 1), dtype=np.float32))
+                print(f"✅ NumPy model {npz_path}: Loaded successfully")
+            else:
+                print(f"ℹ NumPy model {npz_path}: Not exported (optional)")
+    except Exception as e:
+        print(f"❌ NumPy model loading error: {e}")
     
     # Test 5: Check Haar cascades
     print(f"\n👁 Testing Haar cascade classifiers...")
@@ -113,5 +127,260 @@ def test_system():
     else:
         print(f"⚠ {len(missing_files)} files are missing. Please ensure all required files are present.")
 
+# Behaviour checks: synthetic inputs only, no webcam, model or sound needed
+
+class FakeCascade:
+    """Stands in for a Haar cascade, always finding the same boxes"""
+
+    def __init__(self, boxes):
+        self.boxes = np.array(boxes, dtype=np.int32).reshape(-1, 4)
+        self.calls = 0
+
+    def detectMultiScale(self, gray, **kwargs):
+        self.calls += 1
+        return self.boxes
+
+def textured_frame(textures, boxes, size=(240, 320)):
+    """Gray frame with each (smooth random) texture pasted at its (x, y, w, h) box"""
+    gray = np.full(size, 128, dtype=np.uint8)
+    for texture, (x, y, w, h) in zip(textures, boxes):
+        gray[y:y+h, x:x+w] = texture
+    return gray
+
+def test_face_tracker():
+    from face_tracker import FaceTracker
+
+    rng = np.random.default_rng(0)
+    a, b = [cv2.GaussianBlur(rng.integers(0, 255, (60, 60), dtype=np.uint8), (0, 0), 3) for _ in range(2)]
+    box_a, box_b, moved_a = (40, 40, 60, 60), (200, 120, 60, 60), (40, 44, 60, 60)
+
+    # A lost face is dropped and the other one keeps being tracked until the next detection
+    cascade = FakeCascade([box_a, box_b])
+    tracker = FaceTracker(3, 'template', drop_lost=True)
+    tracker.update(textured_frame([a, b], [box_a, box_b]), cascade)
+    faces = tracker.update(textured_frame([a, b], [moved_a, box_b]), cascade)
+    assert faces.tolist() == [list(moved_a), list(box_b)] and cascade.calls == 1
+    faces = tracker.update(textured_frame([a], [moved_a]), cascade)
+    assert faces.tolist() == [list(moved_a)] and cascade.calls == 1
+    faces = tracker.update(textured_frame([a, b], [moved_a, box_b]), cascade)
+    assert len(faces) == 2 and cascade.calls == 2
+
+    # Without drop_lost any lost face forces a full detection at once
+    cascade = FakeCascade([box_a, box_b])
+    tracker = FaceTracker(3, 'template')
+    tracker.update(textured_frame([a, b], [box_a, box_b]), cascade)
+    tracker.update(textured_frame([a], [moved_a]), cascade)
+    assert cascade.calls == 2 and tracker.costs['track'][0] == 0
+
+    # 'none' detects on every frame
+    cascade = FakeCascade([box_a])
+    tracker = FaceTracker(3, 'none')
+    for _ in range(3):
+        tracker.update(textured_frame([a], [box_a]), cascade)
+    assert cascade.calls == 3
+
+def test_analysis_scheduler():
+    from analysis_scheduler import AnalysisScheduler
+    from detection_pipeline import FrameResult, MAX_FRAME_GAP
+
+    def state(score=0.0, absence=0.0):
+        return {'drowsiness_score': score, 'drowsiness_threshold': 10.0,
+                'absence_counter': absence, 'absence_threshold': 10.0}
+    calm = FrameResult([(0, 0, 80, 80)], [(10, 10, 20, 20)], [(50, 10, 20, 20)], False, False,
+                       "Eyes Open (AI)", 0.0, 0.0, None)
+    closed = FrameResult([(0, 0, 80, 80)], [(10, 10, 20, 20)], [(50, 10, 20, 20)], True, True,
+                         "Eyes Closed (AI)", 0.0, 0.0, None)
+
+    scheduler = AnalysisScheduler(idle_interval=4)
+    assert scheduler.interval(state(), None) == 1
+    assert scheduler.interval(state(), calm) == 4
+    assert scheduler.interval(state(score=4.0), calm) == 2     # Watch level halves the interval
+    assert scheduler.interval(state(absence=7.0), calm) == 1   # Urgent level analyzes every frame
+    assert scheduler.interval(state(), closed) == 1
+
+    # 30 calm frames at 30 FPS: the first is analyzed, then every 4th
+    decisions = [scheduler.should_analyze(i / 30, state(), calm) for i in range(30)]
+    assert decisions[:9] == [True, False, False, False, True, False, False, False, True]
+    assert scheduler.analyzed == 8 and scheduler.skipped == 22
+
+    # The CPU budget stretches the calm interval, but never past MAX_FRAME_GAP or for urgent frames
+    scheduler = AnalysisScheduler(idle_interval=2, cpu_budget=0.5)
+    for i in range(10):
+        scheduler.should_analyze(i / 30, state(), calm)
+    scheduler.record(0.1)
+    assert scheduler.interval(state(), calm) == 6
+    scheduler.cost = 10.0
+    assert scheduler.interval(state(), calm) * scheduler.period <= MAX_FRAME_GAP
+    assert scheduler.interval(state(), closed) == 1
+
+def test_prediction_cache():
+    from prediction_cache import PredictionCache
+
+    calls = []
+    def predict_batch(batch):
+        calls.append(len(batch))
+        return np.stack([batch.mean(axis=(1, 2, 3)), 1 - batch.mean(axis=(1, 2, 3))], axis=1)
+
+    rng = np.random.default_rng(0)
+    crops = rng.random((2, 24, 24, 1)).astype(np.float32)
+    cache = PredictionCache(capacity=2)
+    first = cache.predict(predict_batch, crops)
+    assert calls == [2] and cache.misses == 2 and cache.hits == 0
+
+    # Small noise stays within the tolerance and reuses the cached rows without a CNN call
+    again = cache.predict(predict_batch, np.clip(crops + 0.002, 0, 1))
+    assert calls == [2] and cache.hits == 2 and cache.saved_calls == 1
+    assert np.array_equal(again, first)
+
+    # A clearly different crop misses, and only that crop goes through the CNN
+    changed = crops.copy()
+    changed[1] = 1 - changed[1]
+    cache.predict(predict_batch, changed)
+    assert calls == [2, 1] and cache.hits == 3 and cache.misses == 3
+
+    # The least recently used crop was evicted to stay within capacity
+    assert len(cache.entries) == 2
+    cache.predict(predict_batch, crops[1:])
+    assert calls == [2, 1, 1]
+
+    # A new predictor (e.g. the background model swap) starts from an empty cache
+    cache.predict(lambda batch: predict_batch(batch), changed[:1])
+    assert calls == [2, 1, 1, 1] and len(cache.entries) == 1
+
+def test_alerts():
+    from alerts import AlertSink, AlertDispatcher, alert_event
+
+    class RecordingSink(AlertSink):
+        name = 'recording'
+
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.batches = []
+
+        def send(self, events):
+            self.batches.append([(event['stream'], event['kind']) for event in events])
+
+    def event(stream, kind, t):
+        return {'kind': kind, 'stream': stream, 'time': t}
+
+    # A full queue drops its oldest event instead of blocking the frame loop
+    sink = RecordingSink(queue_size=2)
+    for t in range(3):
+        sink.offer(event('cam0', 'absence', t))
+    assert sink.counts['dropped'] == 1 and sink.queue.get_nowait()['time'] == 1
+
+    # The cooldown is kept per (stream, kind)
+    sink = RecordingSink(cooldown=10.0)
+    assert sink._admit(event('cam0', 'drowsiness', 100.0))
+    assert not sink._admit(event('cam0', 'drowsiness', 105.0))
+    assert sink._admit(event('cam0', 'absence', 105.0))
+    assert sink._admit(event('cam1', 'drowsiness', 105.0))
+    assert sink._admit(event('cam0', 'drowsiness', 111.0))
+    assert sink.counts['suppressed'] == 1
+
+    # Events arriving within the batch window go out in one send, repeats inside the cooldown are left out
+    sink = RecordingSink(cooldown=10.0, batch_window=0.5)
+    dispatcher = AlertDispatcher([sink])
+    for stream, kind in [('cam0', 'drowsiness'), ('cam1', 'absence'), ('cam0', 'drowsiness')]:
+        dispatcher.dispatch(alert_event(kind, stream))
+    assert dispatcher.close() == []
+    assert sink.batches == [[('cam0', 'drowsiness'), ('cam1', 'absence')]]
+    assert sink.counts == {'sent': 2, 'suppressed': 1, 'dropped': 0, 'failed': 0}
+
+def test_session_recorder():
+    import tempfile
+    from detection_pipeline import FrameResult
+    from session_recorder import (SessionRecorder, RECORD_DTYPE, FLAG_ANALYZED, FLAG_ABSENCE_ALARM,
+                                  load_part, load_session, part_path)
+
+    def result(i):
+        alarm = 'absence' if i == 7 else None
+        return FrameResult([(10, 20, 80, 80)] if i % 2 else [], [], [], False, False, "Eyes Open (AI)",
+                           0.5 * i, float(i), alarm)
+
+    with tempfile.TemporaryDirectory() as root:
+        # Parts roll over at max_bytes and load back as one session
+        recorder = SessionRecorder(root, 'cam0', max_bytes=10 * RECORD_DTYPE.itemsize, session='test')
+        for i in range(25):
+            recorder.record(result(i), 1000.0 + i)
+        recorder.close()
+        assert recorder.parts == 3
+        assert len(np.load(part_path(recorder.path, 2), mmap_mode='r')) == 5  # Closing truncates the last part
+        records = load_session(recorder.path)
+        assert len(records) == 25
+        assert np.array_equal(records['timestamp'], 1000.0 + np.arange(25))
+        assert records['faces'].tolist() == [i % 2 for i in range(25)]
+        assert records['face_box'][1].tolist() == [10, 20, 80, 80] and records['face_box'][0].tolist() == [-1] * 4
+        assert np.flatnonzero(records['flags'] & FLAG_ABSENCE_ALARM).tolist() == [7]
+        assert (records['flags'] & FLAG_ANALYZED).all()
+
+        # A part that was never closed (crash) keeps its preallocated size, the empty rows are trimmed on load
+        crashed = SessionRecorder(root, 'cam1', max_bytes=10 * RECORD_DTYPE.itemsize, session='test')
+        for i in range(4):
+            crashed.record(result(i), 2000.0 + i)
+        crashed.records.flush()
+        assert len(np.load(part_path(crashed.path, 0), mmap_mode='r')) == 10
+        records = load_part(part_path(crashed.path, 0))
+        assert np.array_equal(records['timestamp'], 2000.0 + np.arange(4))
+        crashed.close()
+
+def test_classroom_monitor():
+    from classroom_monitor import ClassroomDetector, StudentAlarm, match_boxes, assign_eyes, pick_eye_per_face
+    from alerts import alert_event
+
+    # Faces keep the student with the most overlap, far away faces stay unmatched
+    previous = [(0, 0, 100, 100), (200, 0, 100, 100)]
+    boxes = [(210, 5, 100, 100), (500, 500, 50, 50), (5, 0, 100, 100)]
+    rows, cols = match_boxes(previous, boxes, 0.3)
+    assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 2), (1, 0)]
+    assert len(match_boxes([], boxes)[0]) == 0
+
+    # Eyes go to the smallest face that contains their center, the largest eye per face is picked
+    faces = [(0, 0, 200, 200), (50, 50, 60, 60)]
+    eyes = [(60, 60, 20, 20), (150, 150, 20, 20), (300, 300, 20, 20), (55, 55, 30, 30)]
+    owner = assign_eyes(faces, eyes)
+    assert owner.tolist() == [1, 0, -1, 1]
+    assert pick_eye_per_face(2, eyes, owner).tolist() == [1, 3]
+
+    # One absence alarm per absence, re-armed once the absence counter recovered below the threshold
+    detector = ClassroomDetector(cascades={}, absence_threshold=2.0, alarm_cooldown=0.0, confirm_after=1.0)
+    slot = detector._add_student((0, 0, 100, 100), 0.0)
+    slots = np.array([slot])
+    timeline = [2] * 3 + [0] * 8 + [2] * 3 + [0] * 6   # Eyes found per frame, one frame every 0.5 s
+    alarms = []
+    for i, eye_count in enumerate(timeline):
+        raised = detector._update(slots, np.array([eye_count]), np.full((1, 2), np.nan, dtype=np.float32), 0.5 * i)
+        alarms += [(i, alarm) for alarm in raised]
+    assert [i for i, _ in alarms] == [6, 15]
+    i, alarm = alarms[0]
+    assert isinstance(alarm, StudentAlarm) and alarm.kind == 'absence' and alarm.student == 1
+    assert alarm.absence_counter == 2.0
+    event = alert_event(alarm.kind, f"student {alarm.student}", alarm)
+    assert event['absence_seconds'] == 2.0 and event['drowsiness_score'] == 0.0
+
+def test_behaviour():
+    print("🔍 Running behaviour checks...")
+    print("=" * 60)
+    checks = [
+        ("Face tracker drops lost faces and re-detects", test_face_tracker),
+        ("Analysis scheduler interval and CPU budget", test_analysis_scheduler),
+        ("Prediction cache hits, misses and tolerance", test_prediction_cache),
+        ("Alert cooldown, batching and drop-oldest queue", test_alerts),
+        ("Session recorder rollover and crash recovery", test_session_recorder),
+        ("Classroom matching, eye assignment and absence alarms", test_classroom_monitor),
+    ]
+    failed = 0
+    for description, check in checks:
+        try:
+            check()
+            print(f"✅ {description}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {description}: {type(e).__name__} {e}")
+    print(f"\n📋 {len(checks) - failed} of {len(checks)} behaviour checks passed")
+    assert not failed
+
 if __name__ == "__main__":
     test_system()
+    print()
+    test_behaviour()
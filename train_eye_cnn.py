@@ -0,0 +1,184 @@
+"""
+Train the eye CNN from the memory-mapped dataset cache
+- Same optimizer and data as model.ipynb, with its architecture or a
+  compute-efficient one (real downsampling, depthwise-separable convs)
+- Images are decoded once by eye_dataset.py instead of every epoch
+- Batches are shuffled and prefetched on a background thread
+- Prints the time per epoch so it can be compared with the notebook
+- Optionally compares accuracy, size and latency with an existing model
+
+Usage:
+    python train_eye_cnn.py --epochs 15 --output models/cnn_eye_classification.h5
+    python train_eye_cnn.py --architecture efficient --baseline models/cnn_eye_classification.h5
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from eye_dataset import load_dataset, stream_batches, steps_per_epoch
+from eye_inference import CLASS_NAMES, EYE_SIZE
+
+def build_model(filters=(32, 32, 64), dense=128, pool=1, input_size=EYE_SIZE):
+    """Notebook-style CNN: one 3x3 conv + max pooling per filter count, then a dense layer
+
+    The defaults are the model.ipynb network (its pool_size=(1, 1) layers
+    don't downsample); pool=2 halves the feature map after every conv.
+    """
+    from keras.models import Sequential
+    from keras.layers import Input, Dropout, Conv2D, Flatten, Dense, MaxPooling2D
+
+    layers = [Input(shape=(input_size, input_size, 1))]
+    for count in filters:
+        layers += [Conv2D(count, (3, 3), activation='relu'), MaxPooling2D(pool_size=(pool, pool))]
+    layers += [
+        Dropout(0.25),
+        Flatten(),
+        Dense(dense, activation='relu'),
+        Dropout(0.5),
+        Dense(len(CLASS_NAMES), activation='softmax'),
+    ]
+    return Sequential(layers)
+
+def build_efficient_model(input_size=EYE_SIZE):
+    """Eye CNN that downsamples for real: ~22k weights instead of the notebook's ~2.7M
+
+    A plain 3x3 conv, then depthwise-separable convs, each followed by 2x2
+    max pooling, so Flatten only sees 3x3x64 features.
+    """
+    from keras.models import Sequential
+    from keras.layers import Input, Dropout, Conv2D, SeparableConv2D, Flatten, Dense, MaxPooling2D
+
+    return Sequential([
+        Input(shape=(input_size, input_size, 1)),
+        Conv2D(16, (3, 3), padding='same', activation='relu'),
+        MaxPooling2D(pool_size=(2, 2)),
+        SeparableConv2D(32, (3, 3), padding='same', activation='relu'),
+        MaxPooling2D(pool_size=(2, 2)),
+        SeparableConv2D(64, (3, 3), padding='same', activation='relu'),
+        MaxPooling2D(pool_size=(2, 2)),
+        Dropout(0.25),
+        Flatten(),
+        Dense(32, activation='relu'),
+        Dropout(0.5),
+        Dense(len(CLASS_NAMES), activation='softmax'),
+    ])
+
+ARCHITECTURES = {'notebook': build_model, 'efficient': build_efficient_model}
+DEFAULT_OUTPUTS = {'notebook': 'models/cnn_eye_classification.h5', 'efficient': 'models/cnn_eye_efficient.h5'}
+DEFAULT_EPOCHS = {'notebook': 15, 'efficient': 30}  # The small model needs more, but much cheaper, epochs
+
+def evaluate(model, data_dir='data/valid', input_size=EYE_SIZE):
+    """Accuracy of a model on a cached eye dataset"""
+    images, labels = load_dataset(data_dir, size=input_size)
+    predictions = model.predict(images.astype(np.float32) / 255, batch_size=256, verbose=0)
+    return float((predictions.argmax(axis=1) == labels).mean())
+
+def train(model, train_dir='data/train', valid_dir='data/valid', epochs=15, batch_size=32, input_size=EYE_SIZE,
+          seed=None, verbose=2):
+    """Compile and fit a model on the cached datasets, returns (history, seconds per epoch)"""
+    import keras
+
+    train_images, train_labels = load_dataset(train_dir, size=input_size)
+    valid_images, valid_labels = load_dataset(valid_dir, size=input_size)
+
+    class EpochTimer(keras.callbacks.Callback):
+        def on_train_begin(self, logs=None):
+            self.times = []
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self.start = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.times.append(time.perf_counter() - self.start)
+
+    timer = EpochTimer()
+    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    history = model.fit(
+        stream_batches(train_images, train_labels, batch_size, seed=seed),
+        steps_per_epoch=steps_per_epoch(train_images, batch_size),
+        validation_data=stream_batches(valid_images, valid_labels, batch_size, shuffle=False),
+        validation_steps=steps_per_epoch(valid_images, batch_size),
+        epochs=epochs,
+        shuffle=False,  # stream_batches reshuffles every pass itself
+        callbacks=[timer],
+        verbose=verbose,
+    )
+    return history, timer.times
+
+def save_model(model, output):
+    """Save a model, refresh the NumPy export the detectors prefer and drop an int8 export of the old weights"""
+    from numpy_cnn import export_npz, npz_path_for
+    from quantize_cnn import int8_path_for
+
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    model.save(output, overwrite=True)
+    try:
+        export_npz(model, npz_path_for(output))
+    except Exception as e:
+        print(f"⚠ Warning: Could not export {npz_path_for(output)} - {e}")
+    stale = int8_path_for(output)
+    if os.path.exists(stale):
+        os.remove(stale)
+        print(f"⚠ Removed the stale {stale}, re-run quantize_cnn.py for an int8 version")
+
+def describe(model, path, valid_dir='data/valid'):
+    """Accuracy, size and Keras/NumPy latency for two eye crops (one face) of a saved model"""
+    from eye_inference import make_batch_predictor
+    from numpy_cnn import from_keras
+    from quantize_cnn import median_ms
+
+    batch = np.random.default_rng(0).random((2, EYE_SIZE, EYE_SIZE, 1), dtype=np.float32)
+    return {
+        'accuracy': evaluate(model, valid_dir),
+        'params': model.count_params(),
+        'size_kb': os.path.getsize(path) / 1024,
+        'keras_ms': median_ms(make_batch_predictor(model), batch),
+        'numpy_ms': median_ms(from_keras(model).predict, batch),
+    }
+
+def print_comparison(rows):
+    """Print describe() results side by side, {label: stats}"""
+    print(f"\n📊 {'model':<34} {'accuracy':>9} {'params':>10} {'size':>10} {'keras b2':>9} {'numpy b2':>9}")
+    for label, stats in rows.items():
+        print(f"   {label:<34} {stats['accuracy']:8.2%} {stats['params']:10,} {stats['size_kb']:7.0f}KiB "
+              f"{stats['keras_ms']:7.2f}ms {stats['numpy_ms']:7.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the eye CNN from the cached datasets")
+    parser.add_argument('--train', default='data/train', help="Training images (closed/ and open/)")
+    parser.add_argument('--valid', default='data/valid', help="Validation images (closed/ and open/)")
+    parser.add_argument('--epochs', type=int, help="Training epochs (default: 15 notebook, 30 efficient)")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--seed', type=int, help="Shuffle seed")
+    parser.add_argument('--architecture', choices=ARCHITECTURES, default='notebook')
+    parser.add_argument('-o', '--output', help="Where the model is saved (default depends on the architecture)")
+    parser.add_argument('--baseline', metavar='MODEL', help="Compare accuracy, size and latency with this model")
+    args = parser.parse_args()
+    output = args.output or DEFAULT_OUTPUTS[args.architecture]
+    epochs = args.epochs or DEFAULT_EPOCHS[args.architecture]
+
+    model = ARCHITECTURES[args.architecture]()
+    history, epoch_times = train(model, args.train, args.valid, epochs, args.batch_size, seed=args.seed)
+
+    # The first epoch includes tracing the training step
+    steady = epoch_times[1:] or epoch_times
+    print(f"⏱ Epoch time: first {epoch_times[0]:.2f}s, then {sum(steady) / len(steady):.2f}s on average")
+    print(f"📊 Validation accuracy: {history.history['val_accuracy'][-1]:.2%}")
+
+    save_model(model, output)
+    print(f"✓ Model saved to {output}")
+
+    if args.baseline:
+        from eye_inference import load_model_safe
+
+        baseline = load_model_safe(args.baseline)
+        if baseline is None:
+            print(f"❌ Could not load {args.baseline}")
+            raise SystemExit(1)
+        print_comparison({args.baseline: describe(baseline, args.baseline, args.valid),
+                          output: describe(model, output, args.valid)})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Auto-tuner for the Haar cascade detectMultiScale settings
+- Replays recorded clips whose frames are labeled with face and eye presence
+- Searches the face settings (scaleFactor, minNeighbors, minSize) first,
+  then the eye settings (scaleFactor, minNeighbors) on top of the best face
+  settings, evaluating the candidates in parallel worker processes
+- Reports detection recall and false detections against CPU time per frame
+- Saves the best settings per camera setup to cascade_config.json, which
+  load_cascades() applies at startup
+
+Labels live next to each clip in <clip>.labels.csv, one range per row:
+start_frame,end_frame,face,eyes (end exclusive, face/eyes 1 = visible).
+Unlabeled frames are skipped. --bootstrap-labels writes a draft from the
+current settings to correct by hand.
+
+Usage:
+    python tune_cascades.py lecture1.mp4 lecture2.mp4 --camera classroom --workers 4
+    python tune_cascades.py lecture1.mp4 --bootstrap-labels
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import cv2
+import numpy as np
+from detection_pipeline import (
+    load_cascades, load_cascade_config, detect_faces_and_eyes, CASCADE_CONFIG, DEFAULT_CAMERA_SETUP,
+)
+from npy_files import truncate_npy
+
+MAX_CACHED_FRAMES = 20000  # Per clip, ~6 GB of 640x480 frames
+
+def labels_path_for(clip_path):
+    return os.path.splitext(clip_path)[0] + '.labels.csv'
+
+def read_labels(path, frame_count):
+    """(frame_count, 2) int8 array of [face, eyes] per frame, -1 for unlabeled frames"""
+    labels = np.full((frame_count, 2), -1, dtype=np.int8)
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            labels[int(row['start_frame']):int(row['end_frame'])] = (int(row['face']), int(row['eyes']))
+    return labels
+
+def write_labels(path, labels):
+    """Write per-frame [face, eyes] labels as ranges"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['start_frame', 'end_frame', 'face', 'eyes'])
+        start = 0
+        for i in range(1, len(labels) + 1):
+            if i == len(labels) or (labels[i] != labels[start]).any():
+                writer.writerow([start, i, int(labels[start][0]), int(labels[start][1])])
+                start = i
+
+def cache_frames(clip_path, output_dir, frame_step=1, max_frames=MAX_CACHED_FRAMES):
+    """Decode every frame_step-th frame of a clip into a grayscale .npy, returns (path, frame indices, frames)
+
+    Frames are written straight into a memory-mapped file, at most max_frames of them.
+    """
+    cap = cv2.VideoCapture(clip_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {clip_path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    capacity = min(max_frames, -(-total // frame_step)) if total > 0 else max_frames
+    path = os.path.join(output_dir, os.path.splitext(os.path.basename(clip_path))[0] + '_frames.npy')
+    frames, indices = None, []
+    index = 0
+    while len(indices) < capacity:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index % frame_step == 0:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if frames is None:
+                frames = np.lib.format.open_memmap(path, mode='w+', dtype=gray.dtype,
+                                                   shape=(capacity,) + gray.shape)
+            frames[len(indices)] = gray
+            indices.append(index)
+        index += 1
+    if len(indices) == capacity:
+        # Only a frame the step would have cached counts as left out
+        while cap.grab():
+            if index % frame_step == 0:
+                print(f"⚠ {clip_path}: only the first {capacity} frames are cached (--max-frames)")
+                break
+            index += 1
+    cap.release()
+    if frames is None:
+        raise IOError(f"No frames in video {clip_path}")
+
+    frames.flush()
+    # The mapping has to be gone before the unused rows can be cut off (Windows)
+    frames = None
+    truncate_npy(path, len(indices))
+    return path, np.array(indices), index
+
+def init_worker():
+    """One OpenCV thread per worker, so CPU times are comparable between candidates"""
+    cv2.setNumThreads(1)
+
+def evaluate(job):
+    """Worker entry point: replay the clips with one candidate, returns its result dict"""
+    name, face_params, eye_params, clips = job
+    cascades = load_cascades(params={'face': face_params, 'eyes': eye_params})
+
+    # Labeled frames with a detection (hits, false) out of those with (positives) and without (negatives)
+    face_hits = face_positives = face_false = face_negatives = 0
+    eye_hits = eye_positives = eye_false = eye_negatives = 0
+    cpu = 0.0
+    frames_run = 0
+    for frames_path, labels in clips:
+        frames = np.load(frames_path, mmap_mode='r')
+        for gray, (face, eyes) in zip(frames, labels):
+            if face < 0:
+                continue
+            gray = np.ascontiguousarray(gray)
+            start = time.process_time()
+            faces, left_eye, right_eye = detect_faces_and_eyes(gray, cascades)
+            cpu += time.process_time() - start
+            frames_run += 1
+
+            found_face = len(faces) > 0
+            found_eyes = len(left_eye) + len(right_eye) > 0
+            if face:
+                face_positives += 1
+                face_hits += found_face
+                # Eye labels only count where a face is visible
+                if eyes:
+                    eye_positives += 1
+                    eye_hits += found_eyes
+                else:
+                    eye_negatives += 1
+                    eye_false += found_eyes
+            else:
+                face_negatives += 1
+                face_false += found_face
+
+    return {
+        'name': name, 'face': face_params, 'eyes': eye_params,
+        'face_recall': face_hits / face_positives if face_positives else 1.0,
+        'face_false': face_false / face_negatives if face_negatives else 0.0,
+        'eye_recall': eye_hits / eye_positives if eye_positives else 1.0,
+        'eye_false': eye_false / eye_negatives if eye_negatives else 0.0,
+        'ms_per_frame': 1000 * cpu / max(frames_run, 1),
+    }
+
+def face_grid(scale_factors, neighbors, min_sizes):
+    return [{'scaleFactor': sf, 'minNeighbors': n, 'minSize': size}
+            for sf, n, size in itertools.product(scale_factors, neighbors, min_sizes)]
+
+def eye_grid(scale_factors, neighbors):
+    return [{'scaleFactor': sf, 'minNeighbors': n} for sf, n in itertools.product(scale_factors, neighbors)]
+
+def candidate_name(params):
+    return ' '.join(f"{key}={value}" for key, value in params.items())
+
+def pick_best(results, kind, tolerance, max_false):
+    """Cheapest candidate within `tolerance` of the best recall and at most `max_false` false detections"""
+    allowed = [r for r in results if r[f'{kind}_false'] <= max_false]
+    if not allowed:
+        print(f"⚠ No {kind} settings stay within --max-false {max_false:.1%}, picking among all of them")
+        allowed = results
+    best = max(r[f'{kind}_recall'] for r in allowed)
+    close = [r for r in allowed if r[f'{kind}_recall'] >= best - tolerance]
+    return min(close, key=lambda r: r['ms_per_frame'])
+
+def pareto_front(results, kind):
+    """Names of the candidates no other one beats on recall, false detections and CPU time at once"""
+    def key(r):
+        return (-r[f'{kind}_recall'], r[f'{kind}_false'], r['ms_per_frame'])
+
+    return {r['name'] for r in results
+            if not any(all(a <= b for a, b in zip(key(o), key(r))) and key(o) != key(r) for o in results)}
+
+def print_table(results, kind, winner, baseline):
+    front = pareto_front(results, kind)
+    print(f"\n📊 {kind + ' settings':<46} {'recall':>7} {'false':>7} {'cpu/frame':>10}")
+    for r in sorted(results, key=lambda r: r['ms_per_frame']):
+        marks = ('*' if r['name'] in front else ' ') + ('🏆' if r is winner else '') + \
+                (' (current)' if r['name'] == baseline else '')
+        print(f"   {r['name']:<46} {r[f'{kind}_recall']:6.1%} {r[f'{kind}_false']:6.1%} "
+              f"{r['ms_per_frame']:8.2f}ms {marks}")
+    print("   * = Pareto optimal (recall vs. false detections vs. CPU time)")
+
+def run_stage(pool, candidates, clips):
+    jobs = [(name, face, eyes, clips) for name, face, eyes in candidates]
+    return list(pool.map(evaluate, jobs))
+
+def save_config(path, camera, entry):
+    """Merge one camera setup into the config file"""
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        config = {}
+    config[camera] = entry
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the Haar cascade settings against labeled clips")
+    parser.add_argument('clips', nargs='+', help="Recorded clips with a <clip>.labels.csv next to them")
+    parser.add_argument('--camera', default=DEFAULT_CAMERA_SETUP,
+                        help="Camera setup name the settings are saved under")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Candidates evaluated in parallel")
+    parser.add_argument('--frame-step', type=int, default=1, help="Replay only every Nth frame")
+    parser.add_argument('--max-frames', type=int, default=MAX_CACHED_FRAMES, help="Frames cached per clip")
+    parser.add_argument('--face-scale-factors', type=float, nargs='+', default=[1.05, 1.1, 1.2, 1.3])
+    parser.add_argument('--face-neighbors', type=int, nargs='+', default=[3, 5, 7])
+    parser.add_argument('--face-min-sizes', type=int, nargs='+', default=[25, 40, 60])
+    parser.add_argument('--eye-scale-factors', type=float, nargs='+', default=[1.05, 1.1, 1.2, 1.3])
+    parser.add_argument('--eye-neighbors', type=int, nargs='+', default=[2, 3, 5])
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help="Recall the winner may give up for speed (0.01 = one point)")
+    parser.add_argument('--max-false', type=float, default=0.05,
+                        help="Largest share of frames with a detection where none is labeled")
+    parser.add_argument('--config', default=CASCADE_CONFIG, help="Where the tuned settings are saved")
+    parser.add_argument('--results', default='tuning_results', help="Directory for the frame cache and JSON")
+    parser.add_argument('--bootstrap-labels', action='store_true',
+                        help="Write draft labels from the current settings instead of tuning")
+    args = parser.parse_args()
+
+    run_dir = os.path.join(args.results, time.strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(run_dir, exist_ok=True)
+    # "Current" is what the detectors would use for this camera setup today
+    current = load_cascade_config(args.camera, args.config)
+    current_face, current_eyes = current['face'], current['eyes']
+
+    clips = []
+    for clip_path in args.clips:
+        try:
+            frames_path, indices, frame_count = cache_frames(clip_path, run_dir, args.frame_step, args.max_frames)
+        except IOError as e:
+            print(f"❌ {e}")
+            continue
+
+        labels_path = labels_path_for(clip_path)
+        if args.bootstrap_labels:
+            cascades = load_cascades(params=current)
+            labels = np.zeros((frame_count, 2), dtype=np.int8)
+            for index, gray in zip(indices, np.load(frames_path)):
+                faces, left_eye, right_eye = detect_faces_and_eyes(gray, cascades)
+                labels[index:index + args.frame_step] = (len(faces) > 0, len(left_eye) + len(right_eye) > 0)
+            write_labels(labels_path, labels)
+            print(f"✓ Draft labels written to {labels_path}, check them before tuning")
+            continue
+        if not os.path.exists(labels_path):
+            print(f"❌ {clip_path}: no {labels_path} (use --bootstrap-labels for a draft)")
+            continue
+        labels = read_labels(labels_path, frame_count)[indices]
+        print(f"✓ {clip_path}: {int((labels[:, 0] >= 0).sum())} labeled frames")
+        clips.append((frames_path, labels))
+    if not clips:
+        return
+
+    # Recall is meaningless without labeled detections, it would just pick the cheapest settings
+    face_positives = sum(int((labels[:, 0] == 1).sum()) for _, labels in clips)
+    eye_positives = sum(int(((labels[:, 0] == 1) & (labels[:, 1] == 1)).sum()) for _, labels in clips)
+    if not face_positives:
+        print("❌ No labeled frames with a face, nothing to tune")
+        return
+    if not eye_positives:
+        print("⚠ No labeled frames with open eyes, keeping the current eye settings")
+
+    face_candidates = face_grid(args.face_scale_factors, args.face_neighbors, args.face_min_sizes)
+    if current_face not in face_candidates:
+        face_candidates.append(current_face)
+    print(f"\n🚀 Stage 1: {len(face_candidates)} face settings with {args.workers} worker(s)")
+    start = time.perf_counter()
+    # Spawn gives every candidate a fresh process state, like the sweep
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=get_context('spawn'),
+                             initializer=init_worker) as pool:
+        face_results = run_stage(pool, [(candidate_name(face), face, current_eyes) for face in face_candidates],
+                                 clips)
+        face_winner = pick_best(face_results, 'face', args.tolerance, args.max_false)
+        print_table(face_results, 'face', face_winner, candidate_name(current_face))
+
+        # Without eye labels the face winner, which ran with the current eye settings, stands
+        eye_results, eye_winner = [], face_winner
+        if eye_positives:
+            eye_candidates = eye_grid(args.eye_scale_factors, args.eye_neighbors)
+            if current_eyes not in eye_candidates:
+                eye_candidates.append(current_eyes)
+            print(f"\n🚀 Stage 2: {len(eye_candidates)} eye settings with {face_winner['name']}")
+            eye_results = run_stage(pool, [(candidate_name(eyes), face_winner['face'], eyes)
+                                           for eyes in eye_candidates], clips)
+            eye_winner = pick_best(eye_results, 'eye', args.tolerance, args.max_false)
+            print_table(eye_results, 'eye', eye_winner, candidate_name(current_eyes))
+    print(f"\n⏱ Tuning took {time.perf_counter() - start:.0f}s")
+
+    baseline = next(r for r in face_results if r['face'] == current_face)
+    with open(os.path.join(run_dir, 'results.json'), 'w') as f:
+        json.dump({'clips': args.clips, 'face': face_results, 'eyes': eye_results}, f, indent=2)
+
+    entry = {
+        'face': face_winner['face'],
+        'eyes': eye_winner['eyes'],
+        'face_recall': face_winner['face_recall'],
+        'eye_recall': eye_winner['eye_recall'] if eye_positives else None,
+        'ms_per_frame': eye_winner['ms_per_frame'],
+        'clips': args.clips,
+        'tuned': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    save_config(args.config, args.camera, entry)
+    def eye_recall(result):
+        return f"{result['eye_recall']:.1%}" if eye_positives else "n/a"
+
+    print(f"📊 Current settings: face recall {baseline['face_recall']:.1%}, "
+          f"eye recall {eye_recall(baseline)}, {baseline['ms_per_frame']:.2f} ms/frame")
+    print(f"📊 Tuned settings:   face recall {face_winner['face_recall']:.1%}, "
+          f"eye recall {eye_recall(eye_winner)}, {eye_winner['ms_per_frame']:.2f} ms/frame")
+    print(f"✓ Saved the '{args.camera}' setup to {args.config}")
+
+if __name__ == "__main__":
+    main()